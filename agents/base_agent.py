@@ -1,14 +1,16 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 from models.schemas import ChatMessage, ChatResponse
-#from utils.huggingface_client import hf_client
+from models.llm_backends import PRIORITY_BACKGROUND
 
 class BaseAgent(ABC):
     """Classe base para todos os agentes"""
 
-    def __init__(self, name: str, description: str):
+    def __init__(self, name: str, description: str, llm_client=None):
         self.name = name
         self.description = description
+        # Cliente de geração compartilhado (por padrão, o do registro de recursos)
+        self.llm_client = llm_client
 
     @abstractmethod
     async def can_handle(self, message: str, context: Optional[Dict[str, Any]] = None) -> float:
@@ -31,14 +33,19 @@ class BaseAgent(ABC):
         self, 
         prompt: str, 
         max_length: int = 512,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        priority: int = PRIORITY_BACKGROUND
     ) -> str:
-        """Gerar resposta usando Hugging Face"""
+        """Gerar resposta usando o backend LLM configurado (por padrão, atrás das conversas do usuário)"""
         try:
-            response = await hf_client.generate_text(
-                prompt=prompt,
-                max_length=max_length,
-                temperature=temperature
+            if self.llm_client is None:
+                from services.resource_registry import resource_registry
+                self.llm_client = resource_registry.get_llm_client()
+            response = await self.llm_client.agenerate(
+                prompt,
+                max_tokens=max_length,
+                temperature=temperature,
+                priority=priority
             )
             return response.strip()
         except Exception as e:
@@ -1,20 +1,32 @@
-from typing import Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from agents.router_agent import RouterAgent
 from agents.journey_agent import JourneyAgent
 from agents.human_agent import HumanHandoffAgent
 from agents.hf_agent import HFAgent
+from agents.semantic_router import SemanticRouter
 from models.schemas import ChatResponse, AgentDecision
+from rag.embeddings_manager import normalize_query
+from utils.singleflight import SingleFlight
+from config.settings import settings
+from utils.metrics import span, record_event
+import asyncio
+import time
 import uuid
 
 class AgentCoordinator:
     """Coordenador central do sistema multi-agentes"""
 
-    def __init__(self):
-        # Inicializar agentes
-        self.router = RouterAgent()
+    def __init__(self, hf_agent: Optional[HFAgent] = None):
+        # Inicializar agentes (dependências pesadas injetadas pelo registro de recursos)
         self.journey_agent = JourneyAgent()
         self.human_handoff_agent = HumanHandoffAgent()
-        self.hf_agent = HFAgent()
+        self.hf_agent = hf_agent or HFAgent()
+
+        # Roteador semântico reutiliza o modelo de embeddings da base de conhecimento
+        semantic_router = None
+        if settings.ROUTER_MODE == "semantic":
+            semantic_router = SemanticRouter(self.hf_agent.rag_engine.embeddings_manager)
+        self.router = RouterAgent(semantic_router=semantic_router)
 
         # Mapeamento de agentes
         self.agents = {            
@@ -23,6 +35,8 @@ class AgentCoordinator:
             "hf_llama3": self.hf_agent
         }
 
+        self.single_flight = SingleFlight()
+
     async def process_message(
         self, 
         message: str, 
@@ -37,9 +51,63 @@ class AgentCoordinator:
         if 'session_id' not in context:
             context['session_id'] = str(uuid.uuid4())
 
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await self._route_and_process(message, context)
+
+        # Perguntas idênticas simultâneas compartilham roteamento, recuperação e geração
+        response, shared = await self.single_flight.do(
+            self._coalescing_key(message, context),
+            lambda: self._route_and_process(message, dict(context))
+        )
+
+        if isinstance(response, ChatResponse):
+            # Cada requisição recebe sua própria resposta, com seu session_id
+            response = response.copy(update={'session_id': context['session_id']})
+            if shared:
+                record_event("single_flight_shared")
+                # O turno foi registrado apenas na sessão que executou a requisição
+                self.hf_agent.session_store.add_turn(context['session_id'], message, response.response)
+
+        return response
+
+    def _coalescing_key(self, message: str, context: Dict[str, Any]) -> tuple:
+        """Mensagem normalizada mais as chaves de contexto relevantes"""
+        relevant = tuple((key, str(context.get(key))) for key in settings.COALESCING_CONTEXT_KEYS)
+        return normalize_query(message), relevant
+
+    async def _prepare_query_embedding(self, message: str, context: Dict[str, Any]) -> Optional[List[float]]:
+        """No modo semântico, calcula o embedding uma vez e o repassa via contexto (roteamento e busca)"""
+        if self.router.semantic_router is None:
+            return context.get('query_embedding')
+
+        if context.get('query_embedding') is None:
+            context['query_embedding'] = await self.hf_agent.rag_engine.aembed_query(message)
+        return context['query_embedding']
+
+    async def _route(self, message: str, context: Dict[str, Any]) -> AgentDecision:
+        """Decisão de roteamento: votação concorrente dos agentes (ROUTER_MODE="scoring") ou RouterAgent"""
+        if settings.ROUTER_MODE == "scoring":
+            with span("routing"):
+                scoring = await self.score_agents(message, context)
+            if scoring["best_agent"] is None:
+                return AgentDecision(agent_name="faq", confidence=0.8, reasoning="Nenhum agente respondeu a tempo")
+            return AgentDecision(
+                agent_name=scoring["best_agent"],
+                confidence=min(scoring["best_score"], 1.0),
+                reasoning=f"Votação dos agentes ({'decisiva' if scoring['decisive'] else 'melhor score'}: "
+                          f"{', '.join(f'{name}={score:.2f}' for name, score in scoring['scores'].items())})"
+            )
+
+        query_embedding = await self._prepare_query_embedding(message, context)
+        with span("routing"):
+            return await self.router.route_message(message, query_embedding)
+
+    async def _route_and_process(self, message: str, context: Dict[str, Any]) -> ChatResponse:
+        """Roteia e processa a mensagem com o agente selecionado"""
+
         try:
             # 1. Rotear mensagem
-            routing_decision = await self.router.route_message(message)
+            routing_decision = await self._route(message, context)
             
             # 2. Obter agente apropriado
             #selected_agent = self.agents.get(routing_decision.agent_name)
@@ -61,6 +129,7 @@ class AgentCoordinator:
 
         except Exception as e:
             # Fallback em caso de erro
+            record_event("coordinator_error_fallback")
             return ChatResponse(
                 response=f"Desculpe, ocorreu um erro inesperado: {str(e)}. Por favor, tente novamente.",
                 agent_used="error_handler",
@@ -69,20 +138,128 @@ class AgentCoordinator:
                 sources=[]
             )
 
-    async def health_check(self) -> Dict[str, bool]:
-        """Verificar saúde de todos os agentes"""
-        health_status = {}
+    async def process_message_stream(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Versão em streaming de process_message (eventos de fontes, tokens e métricas)"""
 
-        for agent_name, agent in self.agents.items():
-            try:
-                # Teste simples para verificar se o agente responde
-                test_response = await agent.can_handle("test message")
-                health_status[agent_name] = isinstance(test_response, (int, float))
-            except:
-                health_status[agent_name] = False
+        if not context:
+            context = {}
 
-        health_status["router"] = True  # Router é sempre saudável
-        return health_status
+        # Garantir session_id
+        if 'session_id' not in context:
+            context['session_id'] = str(uuid.uuid4())
+
+        try:
+            routing_decision = await self._route(message, context)
+            context['routing_decision'] = routing_decision.dict()
+            context['previous_agents_count'] = context.get('previous_agents_count', 0) + 1
+
+            # Apenas o agente de pesquisa suporta streaming
+            async for event in self.hf_agent.process_stream(message, context):
+                yield event
+
+        except Exception as e:
+            record_event("coordinator_error_fallback")
+            yield {
+                "event": "error",
+                "data": {
+                    "response": f"Desculpe, ocorreu um erro inesperado: {str(e)}. Por favor, tente novamente.",
+                    "agent_used": "error_handler",
+                    "session_id": context['session_id'],
+                    "escalated_to_human": True
+                }
+            }
+
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """Métricas de coalescência de requisições idênticas"""
+        return self.single_flight.get_stats()
+
+    async def _probe_agent(
+        self,
+        agent_name: str,
+        agent,
+        message: str,
+        context: Optional[Dict[str, Any]],
+        timeout: float
+    ) -> Dict[str, Any]:
+        """Executa can_handle com prazo e mede a latência"""
+        started = time.perf_counter()
+        score, error = None, None
+        try:
+            score = await asyncio.wait_for(agent.can_handle(message, context), timeout=timeout)
+        except asyncio.TimeoutError:
+            error = f"timeout após {timeout}s"
+        except Exception as e:
+            error = str(e)
+
+        return {
+            "agent": agent_name,
+            "score": score,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "error": error
+        }
 
-# Instância global do coordenador
-agent_coordinator = AgentCoordinator()
\ No newline at end of file
+    async def score_agents(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        timeout: float = settings.AGENT_SCORING_TIMEOUT,
+        decisive_score: float = settings.AGENT_DECISIVE_SCORE
+    ) -> Dict[str, Any]:
+        """Avalia todos os agentes em paralelo; encerra assim que um score decisivo chega"""
+        pending = {
+            asyncio.ensure_future(self._probe_agent(agent_name, agent, message, context, timeout))
+            for agent_name, agent in self.agents.items()
+        }
+        probes = {}
+        decisive = None
+
+        try:
+            while pending and decisive is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    probe = task.result()
+                    probes[probe["agent"]] = probe
+                    if probe["score"] is not None and probe["score"] >= decisive_score:
+                        decisive = probe["agent"]
+        finally:
+            # Agentes ainda em avaliação não afetam mais a decisão
+            for task in pending:
+                task.cancel()
+            # Aguarda o cancelamento para não deixar tarefas órfãs no event loop
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        scored = {name: probe["score"] for name, probe in probes.items() if probe["score"] is not None}
+        best_agent = decisive or (max(scored, key=scored.get) if scored else None)
+
+        return {
+            "best_agent": best_agent,
+            "best_score": scored.get(best_agent, 0.0) if best_agent else 0.0,
+            "decisive": decisive is not None,
+            "scores": scored,
+            "skipped": [name for name in self.agents if name not in probes],
+            "probes": probes
+        }
+
+    async def health_check(self, timeout: float = settings.HEALTH_CHECK_TIMEOUT) -> Dict[str, Dict[str, Any]]:
+        """Verificar saúde de todos os agentes (sondas em paralelo, com prazo e latência)"""
+        probes = await asyncio.gather(*(
+            self._probe_agent(agent_name, agent, "test message", None, timeout)
+            for agent_name, agent in self.agents.items()
+        ))
+
+        health_status = {
+            probe["agent"]: {
+                "healthy": isinstance(probe["score"], (int, float)),
+                "latency_ms": probe["latency_ms"],
+                "error": probe["error"]
+            }
+            for probe in probes
+        }
+
+        # Router é sempre saudável
+        health_status["router"] = {"healthy": True, "latency_ms": 0.0, "error": None}
+        return health_status
@@ -1,21 +1,51 @@
 from langchain.agents import AgentType, initialize_agent
 from langchain.tools import Tool
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
 from models.llama3_client import Llama3Client
-from typing import List, Dict, Any, Optional
+from models.llm_backends import PRIORITY_INTERACTIVE
+from models.resilience import LLMUnavailableError
+from typing import List, Dict, Any, Optional, AsyncIterator
+import time
 from models.schemas import ChatResponse
 from rag.rag_knowledge_base import KnowledgeBaseRAG
+from rag.semantic_cache import SemanticAnswerCache
+from rag.context_packer import ContextPacker
+from utils.executors import run_in_retrieval_pool
+from utils.metrics import span, record_event
+from utils.logger import get_logger, Truncated
+from utils.session_store import session_store
+from config.settings import settings
+
+logger = get_logger("agents.hf")
+prompt_logger = get_logger("llm.prompt")
 
 class HFAgent:
     """Agente especializado em pesquisa e análise usando LLAMA3"""
     
-    def __init__(self):
-        self.llama_client = Llama3Client()
-        self.conversation_history: List[BaseMessage] = []
-        self.rag_engine = KnowledgeBaseRAG()
+    def __init__(self, rag_engine: Optional[KnowledgeBaseRAG] = None, llama_client: Optional[Llama3Client] = None):
+        self.llama_client = llama_client or Llama3Client()
+        # Histórico por sessão (buffers limitados, com expiração e limite global de memória)
+        self.session_store = session_store
+        
+        # Base já configurada pelo registro de recursos, quando injetada
+        self.rag_engine = rag_engine
+        if self.rag_engine is None:
+            self.rag_engine = KnowledgeBaseRAG()
+            self.rag_engine.setup_knowledge_base()
+        
+        # Cache semântico de respostas, invalidado a cada re-ingestão da base
+        self.answer_cache = SemanticAnswerCache() if settings.SEMANTIC_CACHE_ENABLED else None
+        if self.answer_cache:
+            self.rag_engine.add_invalidation_listener(self.answer_cache.invalidate)
         
-        self.rag_engine.setup_knowledge_base()
+        # Montagem do contexto sob orçamento de tokens (tokenizer carregado na inicialização)
+        self.context_packer = ContextPacker() if settings.CONTEXT_PACKING_ENABLED else None
+        if self.context_packer:
+            self.context_packer.token_counter.count("")
         
+    async def can_handle(self, message: str, context: Optional[Dict[str, Any]] = None) -> float:
+        """Agente genérico: atende qualquer mensagem quando a base de conhecimento está carregada"""
+        return 0.5 if self.rag_engine.vector_store_manager.vector_store else 0.0
+
     def _create_prompt(self, query: str, context: str = '') -> str:
         """Cria prompt otimizado para pesquisa"""
         
@@ -35,13 +65,67 @@ Resposta:"""
         
         return research_prompt
 
-    def _query_knowledge_base(self, question: str) -> str:
+    def _query_knowledge_base(self, question: str, query_embedding: Optional[List[float]] = None) -> str:
         """Consulta a base de conhecimento"""
                 
-        result = self.rag_engine.query_knowledge_base(question)
+        result = self.rag_engine.query_knowledge_base(question, query_embedding=query_embedding)
         
-        # usar primeiro resultado
-        return result[0][0]['content']
+        return self._assemble_context(result[0])
+
+    async def _aquery_knowledge_base(
+        self,
+        question: str,
+        query_embedding: Optional[List[float]] = None,
+        plan: Optional[tuple] = None
+    ) -> str:
+        """Consulta a base de conhecimento sem bloquear o event loop"""
+        
+        result = await self.rag_engine.aquery_knowledge_base(question, query_embedding=query_embedding, plan=plan)
+        
+        return await run_in_retrieval_pool(self._assemble_context, result[0])
+
+    def _assemble_context(self, results: List[Dict[str, Any]]) -> str:
+        """Contexto do prompt: chunks fundidos e sem overlap, dentro do orçamento de tokens"""
+        if not results:
+            return ''
+        
+        if self.context_packer is None:
+            # usar primeiro resultado
+            return results[0]['content']
+        
+        with span("context_assembly"):
+            packed = self.context_packer.pack(results)
+        logger.debug("Contexto: %d/%d chunks, %d tokens", packed['chunks_used'], packed['chunks_retrieved'], packed['tokens'])
+        return packed['context']
+
+    async def _plan_query(self, message: str, context: Optional[Dict[str, Any]]) -> tuple:
+        """Planeja a recuperação antes do embedding: no atalho lexical não há embedding nem consulta ao cache
+
+        Retorna (plano, embedding); fora do atalho, reutiliza o embedding já calculado pelo
+        coordenador ou o calcula apenas se o cache precisar.
+        """
+        plan = await self.rag_engine.aplan_retrieval(message)
+        if plan[2] == "lexical":
+            return plan, None
+        
+        query_embedding = (context or {}).get('query_embedding')
+        if query_embedding is None and self.answer_cache:
+            query_embedding = await self.rag_engine.aembed_query(message)
+        return plan, query_embedding
+
+    def _lookup_answer_cache(self, query_embedding: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+        """Consulta o cache semântico de respostas, contabilizando acertos e erros"""
+        if not self.answer_cache or query_embedding is None:
+            return None
+        
+        cached = self.answer_cache.lookup(query_embedding)
+        record_event("answer_cache_hit" if cached else "answer_cache_miss")
+        return cached
+
+    @staticmethod
+    def _extract_sources(results: List[Dict[str, Any]]) -> List[str]:
+        """URLs distintas dos artigos recuperados, na ordem de relevância"""
+        return list(dict.fromkeys(result['article_url'] for result in results))
 
 
     def _format_response(self, response: str) -> str:
@@ -57,6 +141,17 @@ Resposta:"""
         formatted_response = f"**[Agente de Pesquisa]**\n\n{response}"
         
         return formatted_response
+
+    @staticmethod
+    def _retrieval_only_answer(kb_context: str) -> str:
+        """Resposta sem o LLM (indisponível ou circuito aberto): os trechos recuperados"""
+        record_event("llm_retrieval_only_fallback")
+        if not kb_context:
+            return "O serviço de respostas está indisponível no momento. Tente novamente em instantes."
+        return (
+            "Não consegui gerar uma resposta completa agora. "
+            f"Estes trechos da base de conhecimento podem ajudar:\n\n{kb_context}"
+        )
     
     async def process(
         self, 
@@ -65,49 +160,145 @@ Resposta:"""
     ) -> ChatResponse:      
                
         try:        
+            # Plano de recuperação primeiro; o embedding (se necessário) é reutilizado por cache e busca
+            plan, query_embedding = await self._plan_query(message, context)
+            
+            cached = self._lookup_answer_cache(query_embedding)
+            if cached:
+                with span("formatting"):
+                    return self._build_response(message, self._format_response(cached['answer']), context)
+            
             # Baseado na mensagem, executa RAG na base de conhecimento    
-            context = self._query_knowledge_base(message)
+            kb_context = await self._aquery_knowledge_base(message, query_embedding, plan)
 
             # Cria prompt especializado
-            prompt = self._create_prompt(message, context)
+            with span("prompt_build"):
+                prompt = self._create_prompt(message, kb_context)
 
-            print(f"LLM:     PROMPT: {prompt}")
+            prompt_logger.info("PROMPT: %s", Truncated(prompt))
             
             # Obtém resposta do LLAMA3
-            raw_response = self.llama_client._make_request(prompt)
+            try:
+                raw_response = await self.llama_client.agenerate(
+                    prompt,
+                    priority=(context or {}).get('priority', PRIORITY_INTERACTIVE),
+                    question=message
+                )
+            except LLMUnavailableError as e:
+                logger.warning("LLM indisponível, respondendo apenas com a recuperação: %s", e)
+                with span("formatting"):
+                    return self._build_response(message, self._format_response(self._retrieval_only_answer(kb_context)), context)
             
-            # Formata resposta
-            formatted_response = self._format_response(raw_response)
+            if self.answer_cache and query_embedding is not None:
+                self.answer_cache.store(message, query_embedding, kb_context, raw_response)
             
-            # Histórico de conversação do agente
-            self.conversation_history.extend([
-                HumanMessage(content=message),
-                AIMessage(content=formatted_response)
-            ])
-            
-            return ChatResponse(
-                response=formatted_response,
-                agent_used="llama3",
-                session_id="request.session_id"
-            )
+            # Formata resposta
+            with span("formatting"):
+                formatted_response = self._format_response(raw_response)
+                
+                return self._build_response(message, formatted_response, context)
                     
         except Exception as e:
+            record_event("hf_agent_error")
+            logger.error("Erro ao processar consulta: %s", e)
             error_message = f"🔬 **[Agente de Pesquisa]**\n\nErro ao processar consulta: {str(e)}"
             return error_message
     
     
-    def get_conversation_history(self) -> List[Dict[str, str]]:
-        """Retorna histórico de conversação formatado"""
+    async def process_stream(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Processa a mensagem emitindo eventos: fontes, tokens e métricas finais"""
         
-        history = []
-        for message in self.conversation_history:
-            if isinstance(message, HumanMessage):
-                history.append({"role": "user", "content": message.content})
-            elif isinstance(message, AIMessage):
-                history.append({"role": "assistant", "content": message.content})
+        context = context or {}
+        session_id = context.get('session_id', "request.session_id")
+        started = time.perf_counter()
+        first_token_at = None
+        token_count = 0
         
-        return history
+        plan, query_embedding = await self._plan_query(message, context)
+        
+        cached = self._lookup_answer_cache(query_embedding)
+        if cached:
+            yield {"event": "sources", "data": {"sources": [], "cached": True}}
+            first_token_at = time.perf_counter()
+            token_count = 1
+            raw_response = cached['answer']
+            yield {"event": "token", "data": {"text": raw_response}}
+        else:
+            # Fontes enviadas assim que a recuperação termina, antes da geração
+            results = (await self.rag_engine.aquery_knowledge_base(message, query_embedding=query_embedding, plan=plan))[0]
+            yield {"event": "sources", "data": {"sources": self._extract_sources(results), "cached": False}}
+            
+            kb_context = await run_in_retrieval_pool(self._assemble_context, results)
+            with span("prompt_build"):
+                prompt = self._create_prompt(message, kb_context)
+            
+            tokens = []
+            completed = True
+            try:
+                async for token in self.llama_client._astream_request(
+                    prompt,
+                    priority=context.get('priority', PRIORITY_INTERACTIVE),
+                    question=message
+                ):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    token_count += 1
+                    tokens.append(token)
+                    yield {"event": "token", "data": {"text": token}}
+            except LLMUnavailableError as e:
+                logger.warning("LLM indisponível durante o stream: %s", e)
+                completed = False
+                if not tokens:
+                    # Nada foi enviado ainda: responde apenas com a recuperação
+                    fallback = self._retrieval_only_answer(kb_context)
+                    first_token_at = time.perf_counter()
+                    token_count = 1
+                    tokens.append(fallback)
+                    yield {"event": "token", "data": {"text": fallback}}
+            
+            raw_response = "".join(tokens)
+            if self.answer_cache and query_embedding is not None and raw_response and completed:
+                self.answer_cache.store(message, query_embedding, kb_context, raw_response)
+        
+        response = self._build_response(message, self._format_response(raw_response), context)
+        finished = time.perf_counter()
+        generation_seconds = finished - (first_token_at or finished)
+        timings = {
+            "agent_used": response.agent_used,
+            "session_id": session_id,
+            "time_to_first_token_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+            "total_ms": round((finished - started) * 1000, 1),
+            "tokens": token_count,
+            "tokens_per_second": round(token_count / generation_seconds, 2) if generation_seconds > 0 else None
+        }
+        logger.info("Stream concluído: %s", timings)
+        yield {"event": "done", "data": timings}
+    
+    def _build_response(
+        self,
+        message: str,
+        formatted_response: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> ChatResponse:
+        """Registra o turno no histórico da sessão e monta a resposta"""
+        
+        session_id = (context or {}).get('session_id', "request.session_id")
+        self.session_store.add_turn(session_id, message, formatted_response)
+        
+        return ChatResponse(
+            response=formatted_response,
+            agent_used="llama3",
+            session_id=session_id
+        )
+    
+    def get_conversation_history(self, session_id: str) -> List[Dict[str, str]]:
+        """Retorna histórico de conversação formatado da sessão"""
+        return self.session_store.get_history(session_id)
     
-    def clear_history(self):
-        """Limpa o histórico de conversação"""
-        self.conversation_history.clear()
+    def clear_history(self, session_id: Optional[str] = None):
+        """Limpa o histórico de uma sessão (ou de todas)"""
+        self.session_store.clear(session_id)
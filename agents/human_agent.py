@@ -1,6 +1,7 @@
 from typing import Dict, Any, Optional
 from agents.base_agent import BaseAgent
 from models.schemas import ChatResponse
+from agents.keyword_matcher import keyword_matcher
 import uuid
 
 class HumanHandoffAgent(BaseAgent):
@@ -14,38 +15,18 @@ class HumanHandoffAgent(BaseAgent):
 
     async def can_handle(self, message: str, context: Optional[Dict[str, Any]] = None) -> float:
         """Verificar se deve escalar para humano"""
-        escalation_indicators = [
-            "falar com humano", "atendente", "pessoa real",
-            "não consegui resolver", "problema complexo",
-            "cancelar", "reembolso", "reclamação"
-        ]
-
-        message_lower = message.lower()
-        score = 0.0
-
-        for indicator in escalation_indicators:
-            if indicator in message_lower:
-                score += 0.3
-
-        return min(score, 1.0)
+        return keyword_matcher.score(message)["human_handoff"]
 
     async def detect_escalation_needed(self, message: str, context: Optional[Dict[str, Any]] = None) -> bool:
         """Detectar se escalação é necessária"""
-        # Critérios para escalação
-        escalation_keywords = [
-            "urgente", "emergência", "bug crítico", "problema grave",
-            "não funciona", "erro", "quebrado", "perdeu dinheiro"
-        ]
-
-        message_lower = message.lower()
+        scores = keyword_matcher.score(message)
 
         # Verificar palavras-chave de escalação
-        for keyword in escalation_keywords:
-            if keyword in message_lower:
-                return True
+        if scores["escalation"] > 0:
+            return True
 
         # Verificar frustração (múltiplos pontos de interrogação/exclamação)
-        if "???" in message or "!!!" in message:
+        if scores["frustration"] > 0:
             return True
 
         # Verificar se já passou por múltiplos agentes sem resolução
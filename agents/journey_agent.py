@@ -1,6 +1,7 @@
 from typing import Dict, Any, Optional
 from agents.base_agent import BaseAgent
 from models.schemas import ChatResponse, JourneyInfo
+from agents.keyword_matcher import keyword_matcher
 #from database.user_system import user_system
 import uuid
 import json
@@ -16,15 +17,7 @@ class JourneyAgent(BaseAgent):
 
     async def can_handle(self, message: str, context: Optional[Dict[str, Any]] = None) -> float:
         """Verificar se a mensagem é sobre Journey"""
-        journey_keywords = ["journey", "stars", "legacy", "elegível", "benefícios", "tier"]
-        message_lower = message.lower()
-
-        score = 0.0
-        for keyword in journey_keywords:
-            if keyword in message_lower:
-                score += 0.2
-
-        return min(score, 1.0)
+        return keyword_matcher.score(message)["journey"]
 
     async def process(
         self, 
@@ -0,0 +1,182 @@
+import json
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Set, FrozenSet
+
+# Conjuntos de palavras-chave de todos os agentes: peso por palavra encontrada e score máximo
+DEFAULT_KEYWORD_SETS: Dict[str, Dict[str, Any]] = {
+    "router_journey": {
+        "keywords": [
+            "journey", "stars", "legacy", "hotmart journey",
+            "programa", "benefícios", "elegível", "elegibilidade",
+            "tier", "nível", "status", "faturamento"
+        ],
+        "weight": 0.2
+    },
+    "router_human_handoff": {
+        "keywords": [
+            "falar com humano", "atendente", "pessoa real", "não entendi",
+            "problema urgente", "reclamação", "cancelar", "reembolso",
+            "suporte técnico", "bug", "erro grave"
+        ],
+        "weight": 0.3
+    },
+    "frustration": {
+        "keywords": ["???", "!!!"],
+        "weight": 0.2,
+        "max_score": 0.2
+    },
+    "journey": {
+        "keywords": ["journey", "stars", "legacy", "elegível", "benefícios", "tier"],
+        "weight": 0.2
+    },
+    "human_handoff": {
+        "keywords": [
+            "falar com humano", "atendente", "pessoa real",
+            "não consegui resolver", "problema complexo",
+            "cancelar", "reembolso", "reclamação"
+        ],
+        "weight": 0.3
+    },
+    "escalation": {
+        "keywords": [
+            "urgente", "emergência", "bug crítico", "problema grave",
+            "não funciona", "erro", "quebrado", "perdeu dinheiro"
+        ],
+        "weight": 1.0
+    }
+}
+
+
+class KeywordMatcher:
+    """Expressão regular única (alternação em forma de trie) com as palavras-chave de todos os agentes
+
+    Mesma semântica de `keyword in text.lower()`: palavras-chave são subcadeias, inclusive
+    as sobrepostas ou contidas em outras ("erro" em "erros", "journey" em "hotmart journey").
+    Com poucas palavras-chave (os conjuntos padrão) o laço de `in` em C é mais rápido que
+    a expressão e é usado no lugar dela.
+    """
+
+    # Abaixo disso, laço de `in` sobre as palavras-chave únicas; acima, a expressão
+    REGEX_MIN_PATTERNS = 200
+
+    def __init__(self, keyword_sets: Optional[Dict[str, Dict[str, Any]]] = None, cache_size: int = 1024):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self.reload(keyword_sets if keyword_sets is not None else DEFAULT_KEYWORD_SETS)
+
+    def reload(self, keyword_sets: Dict[str, Dict[str, Any]]):
+        """Recompila a expressão e substitui a atual de forma atômica"""
+        patterns: List[str] = []
+        pattern_ids: Dict[str, int] = {}
+        groups: Dict[str, Dict[str, Any]] = {}
+
+        for group, config in keyword_sets.items():
+            ids = set()
+            for keyword in config["keywords"]:
+                keyword = keyword.lower()
+                if not keyword:
+                    continue
+                if keyword not in pattern_ids:
+                    pattern_ids[keyword] = len(patterns)
+                    patterns.append(keyword)
+                ids.add(pattern_ids[keyword])
+            groups[group] = {
+                "pattern_ids": frozenset(ids),
+                "weight": config.get("weight", 1.0),
+                "max_score": config.get("max_score", 1.0)
+            }
+
+        regex = self._compile(patterns) if len(patterns) >= self.REGEX_MIN_PATTERNS else None
+        prefixes = self._prefix_ids(patterns, pattern_ids)
+        score_cache = lru_cache(maxsize=self.cache_size)(self._score_uncached)
+
+        with self._lock:
+            self._regex = regex
+            self._prefixes = prefixes
+            self._patterns = patterns
+            self._groups = groups
+            self._score_cache = score_cache
+            self.keyword_sets = keyword_sets
+
+    def reload_from_file(self, path: str):
+        """Recarrega os conjuntos a partir de um JSON no mesmo formato de DEFAULT_KEYWORD_SETS"""
+        with open(path, "r", encoding="utf-8") as f:
+            self.reload(json.load(f))
+
+    @classmethod
+    def _compile(cls, patterns: List[str]) -> Optional[re.Pattern]:
+        """Alternação em forma de trie: prefixos comuns fatorados, mais longas primeiro
+
+        Cada alternativa começa por um literal: o re pula em C as posições que não
+        iniciam nenhuma palavra-chave.
+        """
+        if not patterns:
+            return None
+
+        trie: Dict[str, Any] = {}
+        for pattern in patterns:
+            node = trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        return re.compile(cls._trie_pattern(trie))
+
+    @classmethod
+    def _trie_pattern(cls, node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + cls._trie_pattern(node[char]) for char in sorted(c for c in node if c)]
+        if "" in node:
+            # Fim de palavra-chave por último: a ocorrência mais longa tem prioridade
+            branches.append("")
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    @staticmethod
+    def _prefix_ids(patterns: List[str], pattern_ids: Dict[str, int]) -> Dict[str, FrozenSet[int]]:
+        """Para cada palavra-chave, os IDs dela e das palavras-chave que são prefixo dela
+
+        Em cada posição a varredura devolve só a palavra-chave mais longa ("bug crítico");
+        as mais curtas que começam no mesmo ponto ("bug") vêm desta tabela.
+        """
+        return {
+            pattern: frozenset(pattern_ids[pattern[:end]] for end in range(1, len(pattern) + 1) if pattern[:end] in pattern_ids)
+            for pattern in patterns
+        }
+
+    def find_pattern_ids(self, text: str) -> Set[int]:
+        """IDs das palavras-chave presentes no texto (uma varredura)"""
+        regex, prefixes, patterns = self._regex, self._prefixes, self._patterns
+        text = text.lower()
+        if regex is None:
+            return {i for i, pattern in enumerate(patterns) if pattern in text}
+
+        found: Set[int] = set()
+        # Nova busca a partir do caractere seguinte ao início: ocorrências sobrepostas também contam
+        match = regex.search(text)
+        while match is not None:
+            found |= prefixes[match.group()]
+            match = regex.search(text, match.start() + 1)
+        return found
+
+    def find(self, text: str) -> Dict[str, List[str]]:
+        """Palavras-chave encontradas, por grupo"""
+        found = self.find_pattern_ids(text)
+        return {
+            group: [self._patterns[i] for i in sorted(config["pattern_ids"] & found)]
+            for group, config in self._groups.items()
+        }
+
+    def _score_uncached(self, text: str) -> Dict[str, float]:
+        found = self.find_pattern_ids(text)
+        return {
+            group: min(len(config["pattern_ids"] & found) * config["weight"], config["max_score"])
+            for group, config in self._groups.items()
+        }
+
+    def score(self, text: str) -> Dict[str, float]:
+        """Scores de todos os grupos a partir de uma única passagem (com cache por texto)"""
+        return dict(self._score_cache(text))
+
+
+# Instância compartilhada, compilada uma vez na inicialização
+keyword_matcher = KeywordMatcher()
@@ -1,35 +1,29 @@
 from typing import List, Dict, Any, Optional
 from agents.base_agent import BaseAgent
 from models.schemas import AgentDecision
+from agents.keyword_matcher import keyword_matcher
 import re
 
 class RouterAgent(BaseAgent):
     """Agente responsável por rotear mensagens para agentes especializados"""
 
-    def __init__(self):
+    def __init__(self, semantic_router=None):
         super().__init__(
             name="router", 
             description="Agente roteador que direciona mensagens para agentes especializados"
         )
 
-        # Palavras-chave para diferentes tipos de consulta
-        self.journey_keywords = [
-            "journey", "stars", "legacy", "hotmart journey", 
-            "programa", "benefícios", "elegível", "elegibilidade",
-            "tier", "nível", "status", "faturamento"
-        ]
+        # Palavras-chave compiladas no matcher compartilhado (agents/keyword_matcher.py)
+        self.keyword_matcher = keyword_matcher
 
-        self.human_handoff_keywords = [
-            "falar com humano", "atendente", "pessoa real", "não entendi",
-            "problema urgente", "reclamação", "cancelar", "reembolso",
-            "suporte técnico", "bug", "erro grave"
-        ]
+        # Roteamento por embeddings (ROUTER_MODE="semantic"); palavras-chave continuam como override
+        self.semantic_router = semantic_router
 
     async def can_handle(self, message: str, context: Optional[Dict[str, Any]] = None) -> float:
         """Router sempre pode lidar com mensagens"""
         return 1.0
 
-    async def route_message(self, message: str) -> AgentDecision:
+    async def route_message(self, message: str, query_embedding: Optional[List[float]] = None) -> AgentDecision:
         """Determinar qual agente deve processar a mensagem"""
         message_lower = message.lower()
 
@@ -51,6 +45,15 @@ class RouterAgent(BaseAgent):
                 reasoning="Mensagem relacionada ao Hotmart Journey"
             )
 
+        # Paráfrases não cobertas pelas palavras-chave: similaridade com os exemplos de cada agente
+        if self.semantic_router is not None and query_embedding is not None:
+            route, similarity, scores = self.semantic_router.route(query_embedding)
+            return AgentDecision(
+                agent_name=route,
+                confidence=max(similarity, 0.0),
+                reasoning=f"Roteamento semântico (similaridades: {', '.join(f'{name}={score:.2f}' for name, score in scores.items())})"
+            )
+
         # Por padrão, usar agente FAQ
         return AgentDecision(
             agent_name="faq",
@@ -60,24 +63,14 @@ class RouterAgent(BaseAgent):
 
     def _calculate_journey_score(self, message: str) -> float:
         """Calcular score para agente Journey"""
-        score = 0.0
-        for keyword in self.journey_keywords:
-            if keyword in message:
-                score += 0.2
-        return min(score, 1.0)
+        return self.keyword_matcher.score(message)["router_journey"]
 
     def _calculate_human_handoff_score(self, message: str) -> float:
         """Calcular score para escalação humana"""
-        score = 0.0
-        for keyword in self.human_handoff_keywords:
-            if keyword in message:
-                score += 0.3
+        scores = self.keyword_matcher.score(message)
 
         # Detectar frustração ou múltiplas perguntas
-        if "???" in message or "!!!" in message:
-            score += 0.2
-
-        return min(score, 1.0)
+        return min(scores["router_human_handoff"] + scores["frustration"], 1.0)
 
     async def process(
         self, 
@@ -85,4 +78,5 @@ class RouterAgent(BaseAgent):
         context: Optional[Dict[str, Any]] = None
     ) -> AgentDecision:
         """Processar roteamento"""
-        return await self.route_message(message)
\ No newline at end of file
+        query_embedding = (context or {}).get('query_embedding')
+        return await self.route_message(message, query_embedding)
\ No newline at end of file
@@ -0,0 +1,120 @@
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger("agents.router")
+
+# Frases de exemplo por agente (paráfrases típicas de cada intenção)
+DEFAULT_ROUTE_EXEMPLARS: Dict[str, List[str]] = {
+    "journey": [
+        "O que é o Hotmart Journey?",
+        "Como funciona o programa de benefícios para produtores?",
+        "Quais são os requisitos para ser Stars ou Legacy?",
+        "Quanto preciso faturar para subir de nível?",
+        "Sou elegível para o programa de reconhecimento?",
+        "Quais vantagens recebo ao atingir uma nova placa de faturamento?",
+        "Como acompanho meu status e meu tier no programa?"
+    ],
+    "human_handoff": [
+        "Quero falar com um atendente",
+        "Preciso de uma pessoa real para me ajudar",
+        "Isso não resolveu meu problema, quero falar com alguém",
+        "Quero fazer uma reclamação",
+        "Quero cancelar minha compra e pedir reembolso",
+        "Estou com um problema urgente na minha conta",
+        "Ninguém resolve meu caso, me transfira para o suporte"
+    ],
+    "faq": [
+        "Como faço para criar um produto?",
+        "Como altero os dados da minha conta?",
+        "Quais formas de pagamento estão disponíveis?",
+        "Como acesso o conteúdo que comprei?",
+        "Como configuro meu programa de afiliados?",
+        "Onde vejo o relatório das minhas vendas?",
+        "Como funciona o saque dos valores recebidos?"
+    ]
+}
+
+
+class SemanticRouter:
+    """Roteamento por similaridade entre o embedding da pergunta e exemplos de cada agente
+
+    Os exemplos são codificados uma única vez; cada consulta custa um produto matriz-vetor
+    sobre o mesmo embedding usado depois na busca vetorial.
+    """
+
+    STRATEGIES = ("centroid", "exemplar")
+
+    def __init__(
+        self,
+        embeddings_manager,
+        exemplars: Optional[Dict[str, List[str]]] = None,
+        strategy: str = settings.SEMANTIC_ROUTER_STRATEGY,
+        min_similarity: float = settings.SEMANTIC_ROUTER_MIN_SIMILARITY,
+        default_route: str = "faq"
+    ):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Estratégia do roteador deve ser uma de: {self.STRATEGIES}")
+
+        self.embeddings_manager = embeddings_manager
+        self.exemplars = exemplars if exemplars is not None else DEFAULT_ROUTE_EXEMPLARS
+        self.strategy = strategy
+        self.min_similarity = min_similarity
+        self.default_route = default_route
+
+        self.routes: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        # Rota de cada linha da matriz (índice em self.routes)
+        self._row_routes: Optional[np.ndarray] = None
+
+        self._build()
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _build(self):
+        """Codifica os exemplos em um único lote e monta a matriz de rotas"""
+        self.routes = list(self.exemplars.keys())
+        texts, row_routes = [], []
+        for route_index, route in enumerate(self.routes):
+            texts.extend(self.exemplars[route])
+            row_routes.extend([route_index] * len(self.exemplars[route]))
+
+        vectors = self._normalize(self.embeddings_manager.get_embeddings().embed_documents(texts))
+        row_routes = np.asarray(row_routes)
+
+        if self.strategy == "centroid":
+            centroids = [vectors[row_routes == route_index].mean(axis=0) for route_index in range(len(self.routes))]
+            self._matrix = self._normalize(centroids)
+            self._row_routes = np.arange(len(self.routes))
+        else:
+            self._matrix = vectors
+            self._row_routes = row_routes
+
+        logger.info("Roteador semântico pronto (%s, %d exemplos, %d rotas)", self.strategy, len(texts), len(self.routes))
+
+    def scores(self, query_embedding) -> Dict[str, float]:
+        """Similaridade de cosseno da pergunta com cada rota (melhor exemplo ou centroide)"""
+        similarities = self._matrix @ self._normalize(query_embedding)[0]
+        best = np.full(len(self.routes), -1.0, dtype=np.float32)
+        np.maximum.at(best, self._row_routes, similarities)
+        return {route: float(best[i]) for i, route in enumerate(self.routes)}
+
+    def route(self, query_embedding) -> Tuple[str, float, Dict[str, float]]:
+        """Retorna (rota, similaridade, scores); rota padrão quando nada passa do limiar"""
+        scores = self.scores(query_embedding)
+        route = max(scores, key=scores.get)
+        if scores[route] < self.min_similarity:
+            return self.default_route, scores[route], scores
+        return route, scores[route], scores
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "routes": self.routes,
+            "exemplars": {route: len(texts) for route, texts in self.exemplars.items()},
+            "min_similarity": self.min_similarity
+        }
@@ -1,10 +1,23 @@
 # /api/endpoints/chat.py
+import json
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from models.schemas import ChatRequest, ChatResponse 
-from agents.coordinator import AgentCoordinator 
+from models.llm_backends import PRIORITY_BACKGROUND
+from services.resource_registry import resource_registry
 
 router = APIRouter()
-agent_coordinator = AgentCoordinator()
+
+def _build_context(request: ChatRequest) -> dict:
+    """Monta o contexto do coordenador a partir da requisição"""
+    context = {}
+    if request.session_id:
+        context["session_id"] = request.session_id
+    if request.user_id:
+        context["user_id"] = request.user_id
+    if request.background:
+        context["priority"] = PRIORITY_BACKGROUND
+    return context
 
 @router.post("/chat", response_model=ChatResponse)
 async def handle_chat_message(request: ChatRequest):
@@ -16,14 +29,48 @@ async def handle_chat_message(request: ChatRequest):
     try:
         
         # A lógica de negócio é delegada ao coordenador de agentes
-        response_message, source_agent = await agent_coordinator.process_message(
-            #user_id=request.user_id,
-            #session_id=request.session_id,
-            message=request.message            
+        return await resource_registry.get_coordinator().process_message(
+            message=request.message,
+            context=_build_context(request)
         )
-        return {"resposta": response_message,
-                "agente": source_agent}
     
     except Exception as e:
         # Tratamento de erro para a camada de API
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/chat/stream")
+async def handle_chat_stream(request: ChatRequest):
+    """
+    Endpoint de conversação em streaming (server-sent events).
+    Envia as fontes assim que a recuperação termina e, em seguida,
+    os tokens à medida que o modelo os gera.
+    """
+    agent_coordinator = resource_registry.get_coordinator()
+
+    async def event_stream():
+        async for event in agent_coordinator.process_message_stream(
+            message=request.message,
+            context=_build_context(request)
+        ):
+            payload = json.dumps(event["data"], ensure_ascii=False)
+            yield f"event: {event['event']}\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/agents/health")
+async def handle_agents_health():
+    """
+    Saúde de cada agente: sondas executadas em paralelo,
+    com prazo individual e latência de cada uma.
+    """
+    health = await resource_registry.get_coordinator().health_check()
+    return {
+        "status": "ok" if all(probe["healthy"] for probe in health.values()) else "degraded",
+        "agents": health
+    }
@@ -1,6 +1,8 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, List, Dict
+
+_CPU_COUNT = os.cpu_count() or 1
 
 class Settings(BaseSettings):
     """Configurações da aplicação Hotmart AI System"""
@@ -14,16 +16,136 @@ class Settings(BaseSettings):
     # Hugging Face Configuration
     HUGGINGFACE_API_KEY: Optional[str] = os.getenv("HF_TOKEN")
     HUGGINGFACE_MODEL: str = "meta-llama/Llama-3.3-70B-Instruct"    
+    HUGGINGFACE_BASE_URL: str = "https://api-inference.huggingface.co"
+
+    # LLM Generation Backend
+    LLM_BACKEND: str = "huggingface"  # "huggingface" (API hospedada), "openai" (servidor compatível) ou "stub"
+    # Servidor compatível com OpenAI (/v1/chat/completions) do backend "openai",
+    # ex.: llama.cpp/vLLM local ou o stub de tests/load_benchmark.py
+    LLM_ENDPOINT_URL: Optional[str] = None
+    LLM_ENDPOINT_MODEL: str = "local"  # Nome do modelo enviado ao servidor compatível
+    LLM_API_KEY: Optional[str] = None  # Chave do servidor compatível, se exigida
+    LLM_MAX_TOKENS: int = 50
+    LLM_TEMPERATURE: float = 0.01
+    LLM_MAX_CONCURRENCY: int = 16  # Chamadas simultâneas por backend; as demais aguardam na fila
+    LLM_MAX_QUEUE: int = 256  # Chamadas em espera por backend; acima disso são recusadas
+    LLM_QUEUE_TIMEOUT: float = 10.0  # Espera máxima (s) na fila
+    LLM_SMALL_MODEL: Optional[str] = None  # Modelo menor, no mesmo backend, para perguntas simples
+    LLM_SMALL_MODEL_MAX_CONCURRENCY: int = 32
+    LLM_CHEAP_QUERY_MAX_WORDS: int = 8  # Perguntas com até N palavras vão para o modelo menor
+    LLM_STUB_LATENCY_MS: float = 200.0  # Backend "stub": tempo até o primeiro token
+    LLM_STUB_TOKENS_PER_SECOND: float = 50.0
+
+    # Hugging Face HTTP Connection Pool (sessão compartilhada pelos backends "huggingface" e "openai")
+    HF_HTTP_POOL_LIMIT: int = 100  # Conexões simultâneas no total
+    HF_HTTP_POOL_LIMIT_PER_HOST: int = 32
+    HF_HTTP_KEEPALIVE_TIMEOUT: float = 30.0  # Segundos que uma conexão ociosa é mantida
+    HF_HTTP_DNS_CACHE_TTL: int = 300
+    HF_HTTP_CONNECT_TIMEOUT: float = 5.0
+    HF_HTTP_READ_TIMEOUT: float = 60.0
+
+    # Semantic Answer Cache
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Similaridade de cosseno mínima para reutilizar resposta
+    SEMANTIC_CACHE_SIZE: int = 1000
+    SEMANTIC_CACHE_TTL: Optional[float] = 3600.0
 
     # ChromaDB Configuration
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
     CHROMA_COLLECTION_NAME: str = "project_faq"
 
+    # Vector Store Backend
+    VECTOR_STORE_BACKEND: str = "chroma"  # "chroma" ou "numpy" (matriz em memória mapeada)
+    NUMPY_INDEX_DIRECTORY: str = "./chroma_db/numpy_index"
+    NUMPY_INDEX_DTYPE: str = "float32"  # "float32" ou "float16"
+
+    # Hybrid Retrieval (BM25 + vetorial)
+    HYBRID_SEARCH_ENABLED: bool = True
+    BM25_INDEX_PATH: str = "./chroma_db/bm25_index.pkl"
+    HYBRID_CANDIDATES: int = 20  # Candidatos de cada ranking antes da fusão
+    HYBRID_RRF_K: int = 60
+    LEXICAL_SHORT_CIRCUIT_ENABLED: bool = True
+    LEXICAL_SHORT_CIRCUIT_MAX_TERMS: int = 4  # Apenas consultas curtas (ex.: nomes de produto)
+    LEXICAL_SHORT_CIRCUIT_MIN_SCORE: float = 5.0
+    LEXICAL_SHORT_CIRCUIT_MARGIN: float = 1.5  # Razão mínima entre o 1º e o 2º score BM25
+
     # Embedding Configuration
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"  # "torch", "onnx" (grafo exportado) ou "int8" (quantização dinâmica)
+    EMBEDDING_ONNX_FILE: Optional[str] = None  # Ex.: "onnx/model_qint8_avx512_vnni.onnx"
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
 
+    # Prompt Context Assembly
+    CONTEXT_PACKING_ENABLED: bool = True  # Junta e deduplica os chunks recuperados sob um orçamento de tokens
+    CONTEXT_TOKEN_BUDGET: int = 1024  # Tokens de contexto no prompt (o prefill domina a latência do 70B)
+    CONTEXT_TOKENIZER: str = "meta-llama/Llama-3.3-70B-Instruct"  # Tokenizer usado na contagem
+
+    # Knowledge Base Ingestion
+    KNOWLEDGE_BASE_CSV: str = "./data/data.csv"
+    INGESTION_BATCH_SIZE: int = 256
+    CSV_READ_CHUNKSIZE: int = 1000  # Linhas lidas por bloco no modo streaming
+    INGESTION_PARALLEL: bool = True  # Usa o pipeline multi-processo em reconstruções completas
+    # Os dois estágios rodam ao mesmo tempo: a divisão (leve) fica com ~1/4 dos núcleos e o encode com o resto
+    INGESTION_SPLIT_WORKERS: int = max(1, _CPU_COUNT // 4)  # Processos de divisão em chunks
+    INGESTION_EMBED_WORKERS: int = max(1, _CPU_COUNT - max(1, _CPU_COUNT // 4))  # Processos de encode do SentenceTransformer
+    INGESTION_ARTICLES_PER_TASK: int = 64
+    INGESTION_EMBED_BATCH_SIZE: int = 1024  # Chunks por chamada ao pool de encode
+    INGESTION_QUEUE_SIZE: int = 8  # Lotes em espera entre estágios (backpressure)
+
+    # Query Embedding Cache Configuration
+    EMBEDDING_CACHE_SIZE: int = 4096  # Máximo de consultas em memória (0 desativa)
+    EMBEDDING_CACHE_TTL: Optional[float] = 3600.0  # Segundos; None desativa expiração
+    EMBEDDING_CACHE_DIR: Optional[str] = None  # Diretório do cache em disco (opcional)
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES: int = 100000
+    EMBEDDING_CACHE_DISK_COMMIT_EVERY: int = 64  # Gravações agrupadas por transação na camada em disco
+    EMBEDDING_CACHE_DISK_COMMIT_INTERVAL: float = 5.0  # Segundos máximos com gravações em lote pendentes
+
+    # Query Embedding Micro-batching
+    EMBEDDING_BATCHING_ENABLED: bool = True
+    EMBEDDING_BATCH_WINDOW_MS: float = 5.0  # Janela máxima de espera para formar um lote
+    EMBEDDING_MAX_BATCH_SIZE: int = 32
+
+    # Request Path Concurrency
+    RETRIEVAL_WORKERS: int = 8  # Threads para embedding/busca fora do event loop
+    SINGLE_FLIGHT_ENABLED: bool = True  # Compartilha o processamento de perguntas idênticas simultâneas
+    COALESCING_CONTEXT_KEYS: List[str] = []  # Chaves do contexto que também diferenciam requisições
+
+    # Agent Routing
+    ROUTER_MODE: str = "keyword"  # "keyword", "semantic" (palavras-chave continuam como override) ou "scoring" (can_handle concorrente)
+    SEMANTIC_ROUTER_STRATEGY: str = "centroid"  # "centroid" ou "exemplar" (melhor exemplo por agente)
+    SEMANTIC_ROUTER_MIN_SIMILARITY: float = 0.35  # Abaixo disso a mensagem vai para o FAQ
+    AGENT_SCORING_TIMEOUT: float = 0.5  # Prazo (s) de cada can_handle na avaliação concorrente
+    AGENT_DECISIVE_SCORE: float = 0.9  # Score que encerra a avaliação antes dos demais agentes
+    HEALTH_CHECK_TIMEOUT: float = 2.0  # Prazo (s) de cada sonda do health check
+
+    # Conversation Sessions
+    SESSION_MAX_TURNS: int = 20  # Turnos (pergunta + resposta) mantidos por sessão
+    SESSION_MAX_BYTES: int = 32768  # Limite de texto por sessão
+    SESSION_IDLE_TTL: Optional[float] = 1800.0  # Segundos sem atividade até a sessão expirar
+    SESSION_STORE_MAX_BYTES: int = 64 * 1024 * 1024  # Limite global; acima dele remove as sessões menos usadas
+    SESSION_SPILL_DIR: Optional[str] = None  # Diretório SQLite para sessões removidas da memória (opcional)
+
+    # LLM Call Resilience
+    LLM_ATTEMPT_TIMEOUT: float = 20.0  # Prazo (s) de cada tentativa
+    LLM_CALL_DEADLINE: float = 45.0  # Prazo (s) total da chamada, somando tentativas e esperas
+    LLM_MAX_RETRIES: int = 2  # Novas tentativas após erros transitórios (timeout, 429, 5xx, conexão)
+    LLM_RETRY_BACKOFF_BASE: float = 0.25  # Espera (s) da primeira nova tentativa; dobra a cada uma, com jitter
+    LLM_RETRY_BACKOFF_MAX: float = 2.0
+    LLM_HEDGING_ENABLED: bool = False  # Requisição duplicada quando a primeira passa do p95 recente
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Latências observadas antes de começar a duplicar
+    LLM_HEDGE_MIN_DELAY: float = 0.5  # Espera mínima (s) antes da duplicata
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Falhas consecutivas que abrem o circuito
+    LLM_CIRCUIT_RECOVERY_TIMEOUT: float = 30.0  # Segundos com o circuito aberto até a chamada de teste
+
+    # Observability
+    SERVER_TIMING_HEADER: bool = False  # Adiciona o cabeçalho Server-Timing com a duração de cada etapa
+
+    # Startup
+    STARTUP_WARMUP: bool = True  # Executa uma consulta de aquecimento (embedding, busca e tokenizer)
+    STARTUP_WARMUP_QUERY: str = "O que é o Hotmart Journey?"
+
     # Journey Agent Configuration
     JOURNEY_ELIGIBILITY_THRESHOLD: float = 1000.0  # Valor mínimo para elegibilidade
     JOURNEY_PREMIUM_THRESHOLD: float = 5000.0  # Valor para benefícios premium
@@ -35,6 +157,9 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
+    LOG_QUEUE_SIZE: int = 10000  # Registros em espera para a thread de escrita (excedentes são descartados)
+    LOG_MAX_PAYLOAD_CHARS: int = 500  # Limite de caracteres de prompts/respostas nos logs (0 desativa)
+    LOG_SAMPLE_RATES: Dict[str, float] = {"llm.prompt": 0.05, "llm.response": 0.1}  # Fração registrada por categoria
 
     # Testing
     TESTING: bool = False
@@ -1,11 +1,17 @@
 # /main.py
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 
 # Importa as configurações e os roteadores dos endpoints
 from api.endpoints import chat #, knowledge_base
 from config.settings import settings # Supõe um arquivo de configurações
-#from services.knowledge_base_manager import initialize_knowledge_base # Função para carregar modelos/dados
+from services.resource_registry import resource_registry # Modelos, banco vetorial, clientes LLM e coordenador
+from utils.metrics import metrics, start_trace
+from utils.logger import get_logger, shutdown_logging
+
+logger = get_logger("app")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -13,14 +19,17 @@ async def lifespan(app: FastAPI):
     Gerencia o ciclo de vida da aplicação para carregar recursos na inicialização
     e liberá-los no desligamento. É a forma moderna de lidar com eventos de startup/shutdown.
     """
-    print("INFO:     Iniciando a aplicação...")
+    logger.info("Iniciando a aplicação...")
     # Tarefa de inicialização: carregar a base de conhecimento, modelos de embedding, etc.
     # Isso evita o carregamento a cada requisição, otimizando a performance.
-    #await initialize_knowledge_base()
-    print("INFO:     Aplicação iniciada e recursos carregados.")
+    await resource_registry.initialize()
+    logger.info("Aplicação iniciada e recursos carregados.")
     yield
     # Tarefas de desligamento (se necessário)
-    print("INFO:     Encerrando a aplicação...")
+    logger.info("Encerrando a aplicação...")
+    await resource_registry.shutdown()
+    # Esvazia a fila de logs antes de encerrar o processo
+    shutdown_logging()
 
 # Cria a instância principal da aplicação FastAPI
 app = FastAPI(
@@ -30,12 +39,47 @@ app = FastAPI(
     lifespan=lifespan  # Associa o gerenciador de ciclo de vida
 )
 
+async def _observe_when_sent(body_iterator, started: float, labels: dict):
+    """Repassa o corpo e registra a duração quando o último pedaço é enviado (ou o cliente desiste)"""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        metrics.request_seconds.observe(time.perf_counter() - started, **labels)
+
+# Trace por requisição: histograma de duração e, opcionalmente, cabeçalho Server-Timing
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace = start_trace()
+    started = time.perf_counter()
+    # call_next retorna assim que os cabeçalhos ficam prontos; o corpo ainda não foi enviado
+    response = await call_next(request)
+    
+    route = request.scope.get("route")
+    labels = {
+        "method": request.method,
+        "path": getattr(route, "path", "unmatched"),
+        "status": response.status_code
+    }
+    # Em SSE os cabeçalhos saem antes da geração: não há Server-Timing que reflita as etapas
+    streaming = response.headers.get("content-type", "").startswith("text/event-stream")
+    if settings.SERVER_TIMING_HEADER and not streaming:
+        response.headers["Server-Timing"] = trace.server_timing()
+    response.body_iterator = _observe_when_sent(response.body_iterator, started, labels)
+    return response
+
 # Endpoint global para verificação de saúde (health check)
 @app.get("/health", tags=["Monitoring"])
 async def health_check():
     """Verifica se a API está online e operacional."""
     return {"status": "ok", "message": "Service is running"}
 
+# Métricas no formato texto do Prometheus
+@app.get("/metrics", tags=["Monitoring"])
+async def metrics_endpoint():
+    """Histogramas por etapa, contadores de eventos e estatísticas de caches/pools."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Inclui os roteadores dos diferentes módulos da API
 # Cada roteador agrupa endpoints relacionados sob um prefixo comum.
 api_prefix = f"/api/{settings.API_VERSION}"
@@ -47,4 +91,4 @@ app.include_router(chat.router, prefix=api_prefix, tags=["Chat"])
 # from api.endpoints import agents_router
 # app.include_router(agents_router, prefix=f"{api_prefix}/agents", tags=["Agents"])
 
-print(f"INFO:     Documentação da API disponível em: http://{settings.API_HOST}:{settings.API_PORT}/docs")
+logger.info("Documentação da API disponível em: http://%s:%s/docs", settings.API_HOST, settings.API_PORT)
@@ -1,38 +1,105 @@
-import requests
-import time
-import json
-import os
-from huggingface_hub import InferenceClient
-from huggingface_hub import login
+from typing import List, Dict, Any, Optional, AsyncIterator
+from config.settings import settings
+from models.llm_backends import LLMRouter, PRIORITY_INTERACTIVE
+from models.resilience import LLMUnavailableError
+from utils.metrics import span, record_event
+from utils.logger import get_logger, Truncated
 
-from typing import Dict, Any, Optional
-from config.settings import settings 
+logger = get_logger("llm")
+response_logger = get_logger("llm.response")
 
 class Llama3Client:
-    """Cliente para comunicação com o modelo LLAMA3 via API HuggingFace"""
-    
-    def __init__(self):
-        self.api_key = settings.HUGGINGFACE_API_KEY        
-        self.model_client = InferenceClient(model= "meta-llama/Llama-3.3-70B-Instruct")
-        
-        login(token=os.getenv("HF_TOKEN"))        
-        
+    """Cliente de geração: encaminha cada chamada ao backend configurado
+    (API hospedada do HF, servidor compatível com OpenAI ou stub em processo)"""
+
+    # Compatibilidade: retorno de _make_request/_amake_request quando o LLM está indisponível
+    FAILURE_MESSAGE = "Falha na comunicação após múltiplas tentativas"
+
+    def __init__(self, router: Optional[LLMRouter] = None):
+        self.router = router or LLMRouter.from_settings()
+        self.max_tokens = settings.LLM_MAX_TOKENS
+        self.temperature = settings.LLM_TEMPERATURE
+
+    @property
+    def resilience(self):
+        """Políticas de resiliência do backend principal"""
+        return self.router.primary.resilience
+
+    @staticmethod
+    def _messages(prompt: str) -> List[Dict[str, str]]:
+        return [{"role": "user", "content": prompt}]
+
+    def generate(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        question: Optional[str] = None
+    ) -> str:
+        """Gera a resposta; levanta LLMUnavailableError se o LLM não responder"""
+        backend = self.router.select(question)
+        with span("llm_call"):
+            text = backend.generate(
+                self._messages(prompt),
+                self.max_tokens if max_tokens is None else max_tokens,
+                self.temperature if temperature is None else temperature
+            )
+        response_logger.info("Response %s", Truncated(text))
+        return text
+
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        question: Optional[str] = None
+    ) -> str:
+        """Versão assíncrona de generate; `question` permite rotear perguntas simples ao modelo menor"""
+        backend = self.router.select(question)
+        with span("llm_call"):
+            text = await backend.agenerate(
+                self._messages(prompt),
+                self.max_tokens if max_tokens is None else max_tokens,
+                self.temperature if temperature is None else temperature,
+                priority
+            )
+        response_logger.info("Response %s", Truncated(text))
+        return text
+
     def _make_request(self, prompt: str) -> str:
-        """Faz requisição para a API com retry automático"""
-                
-        try:            
-            prompt_messages = [{"role": "user", "content": prompt}]
-            response = self.model_client.chat_completion(prompt_messages, max_tokens=50, temperature=0.01, logprobs=True, stream=False)
-
-            print("INFO:     Response", str(response.choices[0].message))
-            return(str(response.choices[0].message))
-        
-        except requests.exceptions.RequestException as e:
-            print(f"Erro de conexão: {e}")
-            
-        return "Falha na comunicação após múltiplas tentativas"
-    
-    
+        """Como generate, mas devolve FAILURE_MESSAGE em caso de falha"""
+        try:
+            return self.generate(prompt)
+        except LLMUnavailableError as e:
+            logger.error("LLM indisponível: %s", e)
+            record_event("llm_failure_fallback")
+            return self.FAILURE_MESSAGE
+
+    async def _amake_request(self, prompt: str) -> str:
+        """Versão assíncrona de _make_request"""
+        try:
+            return await self.agenerate(prompt)
+        except LLMUnavailableError as e:
+            logger.error("LLM indisponível: %s", e)
+            record_event("llm_failure_fallback")
+            return self.FAILURE_MESSAGE
+
+    async def _astream_request(
+        self,
+        prompt: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        question: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Gera os tokens da resposta à medida que o modelo os emite"""
+        backend = self.router.select(question)
+        with span("llm_stream"):
+            async for token in backend.astream(self._messages(prompt), self.max_tokens, self.temperature, priority):
+                yield token
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.router.get_stats()
+
     def test_connection(self) -> bool:
         """Testa a conexão com a API"""
         test_response = ""
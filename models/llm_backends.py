@@ -0,0 +1,354 @@
+import asyncio
+import heapq
+import itertools
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator
+from huggingface_hub import InferenceClient
+from config.settings import settings
+from models.resilience import ResilientCaller, LLMUnavailableError, LLMOverloadedError, is_retryable
+from utils.hf_client import hf_client
+from utils.metrics import metrics, record_event
+from utils.logger import get_logger
+
+logger = get_logger("llm.backends")
+
+# Prioridades da fila de cada backend (menor valor é atendido primeiro)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+SUPPORTED_BACKENDS = ("huggingface", "openai", "stub")
+
+
+class PriorityLimiter:
+    """Limite de chamadas simultâneas com fila de prioridade (FIFO entre prioridades iguais)
+
+    Quando uma chamada termina, a vaga é transferida diretamente para a próxima da fila.
+    Fila cheia ou espera acima de queue_timeout levantam LLMOverloadedError.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        max_queue: int = settings.LLM_MAX_QUEUE,
+        queue_timeout: float = settings.LLM_QUEUE_TIMEOUT
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+
+        self.max_queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.queue_wait = metrics.histogram(
+            "llm_queue_wait_seconds", "Espera na fila do backend LLM", ("backend",)
+        )
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        if self.in_flight < self.max_concurrency and self.queued == 0:
+            self.in_flight += 1
+            return
+
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            record_event("llm_queue_rejected")
+            raise LLMOverloadedError(f"Fila do backend {self.name} cheia")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                self.release()
+            self.timed_out += 1
+            record_event("llm_queue_timeout")
+            raise LLMOverloadedError(f"Espera na fila do backend {self.name} acima de {self.queue_timeout}s")
+        except asyncio.CancelledError:
+            # A vaga pode ter sido transferida no mesmo instante do cancelamento
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self.queued -= 1
+            self.queue_wait.observe(time.perf_counter() - started, backend=self.name)
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Vaga transferida: in_flight não muda
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+
+
+class LLMBackend(ABC):
+    """Backend de geração: fila com prioridade e limite de concorrência, mais as políticas
+    de resiliência (prazos, novas tentativas, disjuntor) próprios de cada backend
+    """
+
+    kind = "base"
+
+    def __init__(self, name: str, model: str, max_concurrency: int = settings.LLM_MAX_CONCURRENCY):
+        self.name = name
+        self.model = model
+        self.limiter = PriorityLimiter(name, max_concurrency)
+        self.resilience = ResilientCaller(name)
+
+    @abstractmethod
+    def _complete(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        """Chamada síncrona ao modelo"""
+        pass
+
+    @abstractmethod
+    async def _acomplete(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        """Chamada assíncrona ao modelo"""
+        pass
+
+    @abstractmethod
+    async def _aopen_stream(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> AsyncIterator[str]:
+        """Abre o stream e devolve o iterador de tokens"""
+        pass
+
+    def generate(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        """Geração síncrona (caminho legado: não passa pela fila do backend)"""
+        return self.resilience.call_sync(lambda: self._complete(messages, max_tokens, temperature))
+
+    async def agenerate(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> str:
+        # A vaga é obtida uma vez por chamada; novas tentativas e a duplicata usam a mesma
+        async with self.limiter.slot(priority):
+            return await self.resilience.call(lambda: self._acomplete(messages, max_tokens, temperature))
+
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> AsyncIterator[str]:
+        """Tokens da resposta; uma falha depois do primeiro token não é repetida"""
+        async with self.limiter.slot(priority):
+            tokens = await self.resilience.call(
+                lambda: self._aopen_stream(messages, max_tokens, temperature),
+                hedge=False
+            )
+            try:
+                async for token in tokens:
+                    yield token
+            except Exception as e:
+                record_event("llm_stream_interrupted")
+                if is_retryable(e):
+                    self.resilience.breaker.record_failure()
+                raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "model": self.model,
+            "queue": self.limiter.get_stats(),
+            "resilience": self.resilience.get_stats()
+        }
+
+
+class HuggingFaceBackend(LLMBackend):
+    """API de inferência hospedada do Hugging Face (ou, com base_url, um servidor compatível)
+
+    As chamadas assíncronas usam a sessão HTTP compartilhada (hf_client, pool de conexões
+    aberto no lifespan); o caminho síncrono legado usa o InferenceClient.
+    """
+
+    kind = "huggingface"
+
+    def __init__(
+        self,
+        name: str,
+        model: str = settings.HUGGINGFACE_MODEL,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        api_key: Optional[str] = settings.HUGGINGFACE_API_KEY,
+        base_url: Optional[str] = None
+    ):
+        super().__init__(name, model, max_concurrency)
+        self.base_url = base_url
+        self.api_key = api_key
+        self.http = hf_client
+        self.url = self._chat_url(base_url, model)
+        if base_url:
+            client_kwargs = {"base_url": base_url, "api_key": api_key}
+        else:
+            client_kwargs = {"token": api_key}
+        self.client = InferenceClient(timeout=settings.LLM_ATTEMPT_TIMEOUT, **client_kwargs)
+
+    @staticmethod
+    def _chat_url(base_url: Optional[str], model: str) -> str:
+        """Endpoint /v1/chat/completions do servidor compatível ou do modelo na API hospedada"""
+        if not base_url:
+            return f"{settings.HUGGINGFACE_BASE_URL}/models/{model}/v1/chat/completions"
+        base_url = base_url.rstrip("/")
+        if base_url.endswith("/chat/completions"):
+            return base_url
+        if base_url.endswith("/v1"):
+            return f"{base_url}/chat/completions"
+        return f"{base_url}/v1/chat/completions"
+
+    def _payload(self, messages, max_tokens, temperature) -> Dict[str, Any]:
+        return {"model": self.model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+
+    def _complete(self, messages, max_tokens, temperature) -> str:
+        response = self.client.chat_completion(messages, model=self.model, max_tokens=max_tokens, temperature=temperature)
+        return response.choices[0].message.content or ""
+
+    async def _acomplete(self, messages, max_tokens, temperature) -> str:
+        return await self.http.chat_completion(self.url, self._payload(messages, max_tokens, temperature), self.api_key)
+
+    async def _aopen_stream(self, messages, max_tokens, temperature) -> AsyncIterator[str]:
+        return await self.http.open_chat_stream(self.url, self._payload(messages, max_tokens, temperature), self.api_key)
+
+
+class OpenAICompatibleBackend(HuggingFaceBackend):
+    """Servidor próprio compatível com OpenAI (/v1/chat/completions), ex.: llama.cpp ou vLLM"""
+
+    kind = "openai"
+
+    def __init__(
+        self,
+        name: str,
+        model: str = settings.LLM_ENDPOINT_MODEL,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        base_url: Optional[str] = settings.LLM_ENDPOINT_URL,
+        api_key: Optional[str] = settings.LLM_API_KEY
+    ):
+        if not base_url:
+            raise ValueError("LLM_ENDPOINT_URL é obrigatório para o backend 'openai'")
+        super().__init__(name, model, max_concurrency, api_key=api_key, base_url=base_url)
+
+
+class StubBackend(LLMBackend):
+    """Backend em processo, sem rede: latência e tokens/s configuráveis (testes e benchmarks)"""
+
+    kind = "stub"
+    WORDS = "Resposta simulada com base no contexto recuperado da central de ajuda".split()
+
+    def __init__(
+        self,
+        name: str,
+        model: str = "stub",
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        latency_ms: float = settings.LLM_STUB_LATENCY_MS,
+        tokens_per_second: float = settings.LLM_STUB_TOKENS_PER_SECOND
+    ):
+        super().__init__(name, model, max_concurrency)
+        self.latency = latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+
+    def _tokens_for(self, max_tokens: int) -> List[str]:
+        return [self.WORDS[i % len(self.WORDS)] + " " for i in range(max_tokens)]
+
+    def _complete(self, messages, max_tokens, temperature) -> str:
+        tokens = self._tokens_for(max_tokens)
+        time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return "".join(tokens).strip()
+
+    async def _acomplete(self, messages, max_tokens, temperature) -> str:
+        tokens = self._tokens_for(max_tokens)
+        await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return "".join(tokens).strip()
+
+    async def _aopen_stream(self, messages, max_tokens, temperature) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        return self._stream(self._tokens_for(max_tokens))
+
+    async def _stream(self, tokens: List[str]) -> AsyncIterator[str]:
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield token
+
+
+def create_backend(
+    name: str,
+    kind: str = settings.LLM_BACKEND,
+    model: Optional[str] = None,
+    max_concurrency: int = settings.LLM_MAX_CONCURRENCY
+) -> LLMBackend:
+    """Instancia o backend configurado (modelo padrão de cada tipo quando model é None)"""
+    if kind == "huggingface":
+        return HuggingFaceBackend(name, model or settings.HUGGINGFACE_MODEL, max_concurrency)
+    if kind == "openai":
+        return OpenAICompatibleBackend(name, model or settings.LLM_ENDPOINT_MODEL, max_concurrency)
+    if kind == "stub":
+        return StubBackend(name, model or "stub", max_concurrency)
+    raise ValueError(f"Backend LLM deve ser um de: {SUPPORTED_BACKENDS}")
+
+
+class LLMRouter:
+    """Escolhe o backend da chamada: perguntas simples vão para o modelo menor, se configurado"""
+
+    def __init__(
+        self,
+        primary: LLMBackend,
+        small: Optional[LLMBackend] = None,
+        cheap_query_max_words: int = settings.LLM_CHEAP_QUERY_MAX_WORDS
+    ):
+        self.primary = primary
+        self.small = small
+        self.cheap_query_max_words = cheap_query_max_words
+
+    @classmethod
+    def from_settings(cls) -> "LLMRouter":
+        primary = create_backend("primary")
+        small = None
+        if settings.LLM_SMALL_MODEL:
+            small = create_backend("small", model=settings.LLM_SMALL_MODEL, max_concurrency=settings.LLM_SMALL_MODEL_MAX_CONCURRENCY)
+        logger.info("Backend LLM: %s (%s)%s", primary.kind, primary.model, f", modelo menor: {small.model}" if small else "")
+        return cls(primary, small)
+
+    def is_cheap(self, question: Optional[str]) -> bool:
+        return bool(question) and len(question.split()) <= self.cheap_query_max_words
+
+    def select(self, question: Optional[str] = None) -> LLMBackend:
+        # Com o circuito do modelo menor aberto, tudo vai para o principal
+        if self.small is not None and not self.small.resilience.breaker.is_open and self.is_cheap(question):
+            record_event("llm_routed_small")
+            return self.small
+        return self.primary
+
+    @property
+    def backends(self) -> List[LLMBackend]:
+        return [self.primary] + ([self.small] if self.small is not None else [])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {backend.name: backend.get_stats() for backend in self.backends}
@@ -0,0 +1,358 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar
+from config.settings import settings
+from utils.metrics import metrics, record_event
+from utils.logger import get_logger
+
+logger = get_logger("llm.resilience")
+
+T = TypeVar("T")
+
+# Respostas HTTP que indicam falha transitória do endpoint
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Erros de conexão do aiohttp/httpx, reconhecidos pelo nome para não depender das bibliotecas
+_RETRYABLE_ERROR_NAMES = frozenset({
+    "ClientConnectionError", "ServerDisconnectedError", "ClientPayloadError",
+    "ConnectError", "ReadTimeout", "ReadError", "RemoteProtocolError"
+})
+
+
+class LLMUnavailableError(Exception):
+    """O LLM não respondeu dentro das políticas de prazo, novas tentativas e circuito"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Chamada recusada sem tentativa: o circuito está aberto"""
+
+
+class LLMOverloadedError(LLMUnavailableError):
+    """Chamada recusada pelo backend: fila cheia ou espera acima do limite"""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for candidate in (error, getattr(error, "response", None)):
+        status = getattr(candidate, "status_code", None) or getattr(candidate, "status", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, falhas de conexão, 429 e 5xx; erros de requisição (4xx) não são repetidos"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, OSError) or type(error).__name__ in _RETRYABLE_ERROR_NAMES
+
+
+class CircuitBreaker:
+    """Disjuntor: após falhas consecutivas recusa chamadas até o tempo de recuperação
+
+    Passado esse tempo, uma única chamada de teste é liberada (meio aberto): sucesso
+    fecha o circuito, falha o reabre.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = settings.LLM_CIRCUIT_RECOVERY_TIMEOUT
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def admit(self) -> Optional[bool]:
+        """None se a chamada for recusada; senão, se ela é a chamada de teste do meio aberto"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                logger.info("Circuito do LLM meio aberto: liberando chamada de teste")
+
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+
+            self.rejected += 1
+            return None
+
+    def record_success(self, trial: bool = False):
+        with self._lock:
+            if self.state != self.CLOSED:
+                record_event("llm_circuit_closed")
+                logger.info("Circuito do LLM fechado")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            if trial:
+                self._trial_in_flight = False
+
+    def record_failure(self, trial: bool = False):
+        """Falha do endpoint (timeout, conexão, 429/5xx); erros da requisição não contam"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if trial:
+                self._trial_in_flight = False
+            should_open = self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold
+            if should_open and self.state != self.OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                record_event("llm_circuit_opened")
+                logger.warning("Circuito do LLM aberto após %d falhas consecutivas", self.consecutive_failures)
+
+    def release(self):
+        """Libera a vaga de teste de uma chamada sem resultado conclusivo (cancelada ou erro 4xx)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "open": self.state == self.OPEN,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class LatencyTracker:
+    """Janela das latências recentes bem-sucedidas, para o atraso das requisições duplicadas"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self._samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+
+class ResilientCaller:
+    """Executa chamadas ao LLM com prazo, novas tentativas, duplicação e disjuntor
+
+    - cada tentativa tem prazo próprio, e a chamada inteira um prazo total;
+    - erros transitórios são repetidos com espera exponencial e jitter;
+    - com duplicação ativa, se a tentativa passa do p95 recente uma segunda é
+      disparada e vale a primeira que responder;
+    - com o circuito aberto a chamada falha na hora (CircuitOpenError).
+    """
+
+    def __init__(
+        self,
+        name: str = "llm",
+        attempt_timeout: float = settings.LLM_ATTEMPT_TIMEOUT,
+        deadline: float = settings.LLM_CALL_DEADLINE,
+        max_retries: int = settings.LLM_MAX_RETRIES,
+        backoff_base: float = settings.LLM_RETRY_BACKOFF_BASE,
+        backoff_max: float = settings.LLM_RETRY_BACKOFF_MAX,
+        hedging: bool = settings.LLM_HEDGING_ENABLED,
+        hedge_percentile: float = settings.LLM_HEDGE_PERCENTILE,
+        hedge_min_samples: int = settings.LLM_HEDGE_MIN_SAMPLES,
+        hedge_min_delay: float = settings.LLM_HEDGE_MIN_DELAY,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyTracker()
+
+        self.attempt_seconds = metrics.histogram(
+            "llm_attempt_duration_seconds", "Duração de cada tentativa de chamada ao LLM", ("backend", "outcome")
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        """Espera exponencial com jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Atraso da requisição duplicada (p95 recente); None enquanto há poucas amostras"""
+        if len(self.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.latencies.percentile(self.hedge_percentile), self.hedge_min_delay)
+
+    async def _timed(self, factory: Callable[[], Awaitable[T]], timeout: float) -> T:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(factory(), timeout)
+        except asyncio.TimeoutError:
+            self.attempt_seconds.observe(time.perf_counter() - started, backend=self.name, outcome="timeout")
+            record_event("llm_attempt_timeout")
+            raise
+        except Exception:
+            self.attempt_seconds.observe(time.perf_counter() - started, backend=self.name, outcome="error")
+            record_event("llm_attempt_error")
+            raise
+
+        elapsed = time.perf_counter() - started
+        self.attempt_seconds.observe(elapsed, backend=self.name, outcome="success")
+        self.latencies.add(elapsed)
+        return result
+
+    async def _attempt(self, factory: Callable[[], Awaitable[T]], timeout: float, hedge: bool) -> T:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None or delay >= timeout:
+            return await self._timed(factory, timeout)
+
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(self._timed(factory, timeout))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+
+            record_event("llm_hedge_sent")
+            tasks.append(asyncio.ensure_future(self._timed(factory, timeout - (time.monotonic() - started))))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            record_event("llm_hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # A requisição que perdeu (ou ficou pendente) é cancelada
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _admit(self) -> bool:
+        trial = self.breaker.admit()
+        if trial is None:
+            record_event("llm_circuit_rejected")
+            raise CircuitOpenError("Circuito do LLM aberto: chamada recusada")
+        return trial
+
+    async def call(self, factory: Callable[[], Awaitable[T]], hedge: Optional[bool] = None) -> T:
+        """Executa factory() (que cria a corrotina da chamada) sob as políticas de resiliência"""
+        trial = self._admit()
+        hedge = self.hedging if hedge is None else hedge
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        resolved = False
+        try:
+            while True:
+                timeout = min(self.attempt_timeout, deadline_at - time.monotonic())
+                try:
+                    result = await self._attempt(factory, timeout, hedge)
+                except Exception as e:
+                    retryable = is_retryable(e)
+                    if retryable:
+                        # Só falhas do endpoint contam para o disjuntor
+                        self.breaker.record_failure(trial)
+                        resolved = trial
+                    backoff = self._backoff(attempt)
+                    if (
+                        not retryable
+                        or attempt >= self.max_retries
+                        or self.breaker.is_open
+                        or deadline_at - time.monotonic() <= backoff
+                    ):
+                        record_event("llm_call_failed")
+                        raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+
+                    attempt += 1
+                    record_event("llm_retry")
+                    logger.warning("Tentativa %d ao LLM %s falhou (%s); repetindo em %.2fs", attempt, self.name, type(e).__name__, backoff)
+                    await asyncio.sleep(backoff)
+                    continue
+
+                self.breaker.record_success(trial)
+                resolved = trial
+                return result
+        finally:
+            # A vaga de teste só é devolvida por quem a recebeu e ainda não registrou o resultado
+            if trial and not resolved:
+                self.breaker.release()
+
+    def call_sync(self, func: Callable[[], T]) -> T:
+        """Versão síncrona (sem duplicação): o prazo de cada tentativa fica a cargo do cliente HTTP"""
+        trial = self._admit()
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        resolved = False
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    result = func()
+                except Exception as e:
+                    self.attempt_seconds.observe(time.perf_counter() - started, backend=self.name, outcome="error")
+                    record_event("llm_attempt_error")
+                    retryable = is_retryable(e)
+                    if retryable:
+                        self.breaker.record_failure(trial)
+                        resolved = trial
+                    backoff = self._backoff(attempt)
+                    if (
+                        not retryable
+                        or attempt >= self.max_retries
+                        or self.breaker.is_open
+                        or deadline_at - time.monotonic() <= backoff
+                    ):
+                        record_event("llm_call_failed")
+                        raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+
+                    attempt += 1
+                    record_event("llm_retry")
+                    time.sleep(backoff)
+                    continue
+
+                elapsed = time.perf_counter() - started
+                self.attempt_seconds.observe(elapsed, backend=self.name, outcome="success")
+                self.latencies.add(elapsed)
+                self.breaker.record_success(trial)
+                resolved = trial
+                return result
+        finally:
+            if trial and not resolved:
+                self.breaker.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            "circuit": self.breaker.get_stats(),
+            "hedging": self.hedging,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else 0.0,
+            "latency_samples": len(self.latencies),
+            "latency_p95_ms": round(self.latencies.percentile(95) * 1000, 1)
+        }
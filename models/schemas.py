@@ -20,6 +20,7 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=1000)
     session_id: Optional[str] = None
     user_id: Optional[str] = None
+    background: bool = False  # Chamadas não interativas cedem a vez no LLM às conversas
 
 class ChatResponse(BaseModel):
     """Modelo para respostas de chat"""
@@ -0,0 +1,150 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from config.settings import settings
+
+
+class AsyncBatchEmbedder:
+    """Agrupa consultas concorrentes em uma única chamada de encode (micro-batching)"""
+
+    HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+    def __init__(
+        self,
+        embeddings_manager,
+        batch_window_ms: float = settings.EMBEDDING_BATCH_WINDOW_MS,
+        max_batch_size: int = settings.EMBEDDING_MAX_BATCH_SIZE
+    ):
+        self.embeddings_manager = embeddings_manager
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Um único thread de encode: enquanto um lote é processado, o próximo é formado
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-batch")
+
+        self.total_batches = 0
+        self.total_items = 0
+        self.batch_size_histogram: Dict[str, int] = {str(b): 0 for b in self.HISTOGRAM_BUCKETS}
+        self.batch_size_histogram["+Inf"] = 0
+
+    async def start(self):
+        """Inicia a tarefa de processamento de lotes no loop atual"""
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._loop is loop:
+            return
+
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._worker = loop.create_task(self._run())
+
+    async def stop(self):
+        """Encerra a tarefa de processamento de lotes"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        self._queue = None
+
+    async def embed(self, text: str) -> List[float]:
+        """Retorna o embedding da consulta, agrupando-a com outras requisições concorrentes"""
+        # Só a camada em memória no event loop; a em disco é consultada no thread do lote
+        vector = self.embeddings_manager.query_cache.get_memory(self.embeddings_manager.model_name, text)
+        if vector is not None:
+            return vector
+
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Retorna embeddings de várias consultas"""
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    async def _collect_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        """Aguarda o primeiro item e acumula outros até a janela ou o tamanho máximo"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect_batch()
+            pending = [(text, future) for text, future in batch if not future.cancelled()]
+            if not pending:
+                continue
+
+            # Textos repetidos no mesmo lote são codificados uma única vez
+            unique_texts = list(dict.fromkeys(text for text, _ in pending))
+
+            try:
+                by_text, encoded = await loop.run_in_executor(self._executor, self._embed_batch, unique_texts)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            if encoded:
+                self._record_batch(encoded)
+
+            for text, future in pending:
+                if not future.done():
+                    future.set_result(by_text[text])
+
+    def _embed_batch(self, texts: List[str]) -> Tuple[Dict[str, List[float]], int]:
+        """No thread do lote: camada em disco do cache, encode das ausências e gravação no cache"""
+        cache = self.embeddings_manager.query_cache
+        model_name = self.embeddings_manager.model_name
+        by_text = {}
+        for text in texts:
+            vector = cache.get_disk(model_name, text)
+            if vector is not None:
+                by_text[text] = vector
+
+        missing = [text for text in texts if text not in by_text]
+        if missing:
+            vectors = self.embeddings_manager.base_embeddings.embed_documents(missing)
+            for text, vector in zip(missing, vectors):
+                cache.put(model_name, text, vector)
+                by_text[text] = vector
+        return by_text, len(missing)
+
+    def _record_batch(self, size: int):
+        self.total_batches += 1
+        self.total_items += size
+        for bucket in self.HISTOGRAM_BUCKETS:
+            if size <= bucket:
+                self.batch_size_histogram[str(bucket)] += 1
+                return
+        self.batch_size_histogram["+Inf"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna histograma de tamanhos de lote e contadores"""
+        return {
+            'batch_window_ms': self.batch_window * 1000.0,
+            'max_batch_size': self.max_batch_size,
+            'total_batches': self.total_batches,
+            'total_items': self.total_items,
+            'avg_batch_size': self.total_items / self.total_batches if self.total_batches else 0.0,
+            'batch_size_histogram': dict(self.batch_size_histogram),
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0
+        }
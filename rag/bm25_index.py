@@ -0,0 +1,128 @@
+import heapq
+import math
+import os
+import pickle
+import re
+import tempfile
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Iterable, Tuple
+from langchain.schema import Document
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# Stopwords mais frequentes do português (não ajudam a discriminar artigos)
+STOPWORDS = frozenset("""
+a à ao aos as às com como da das de do dos e é em entre na nas no nos o os ou para pela pelas pelo pelos
+por qual que se sem seu sua são um uma uns umas meu minha eu você ele ela isso este esta esse essa
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sem acentos e sem stopwords"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [token for token in _TOKEN_PATTERN.findall(text) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Tuple[str, Any]]], k: int = 60) -> List[Tuple[str, float]]:
+    """Combina rankings (listas de (chave, item)) somando 1 / (k + posição)"""
+    scores: Dict[str, float] = defaultdict(float)
+    for results in result_lists:
+        for rank, (key, _) in enumerate(results, 1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """Índice invertido BM25 sobre os chunks da base de conhecimento"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.doc_lengths = array("I")
+        self.avg_doc_length = 0.0
+        # termo -> (posições dos documentos, frequências no documento)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.idf: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, Document]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Constrói o índice a partir de pares (id, Document)"""
+        index = cls(k1=k1, b=b)
+        postings = defaultdict(lambda: (array("I"), array("I")))
+
+        for position, (chunk_id, doc) in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            index.ids.append(chunk_id)
+            index.texts.append(doc.page_content)
+            index.metadatas.append(doc.metadata)
+            index.doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                doc_positions, frequencies = postings[term]
+                doc_positions.append(position)
+                frequencies.append(frequency)
+
+        total = len(index.ids)
+        index.postings = dict(postings)
+        index.avg_doc_length = sum(index.doc_lengths) / total if total else 0.0
+        index.idf = {
+            term: math.log(1.0 + (total - len(doc_positions) + 0.5) / (len(doc_positions) + 0.5))
+            for term, (doc_positions, _) in index.postings.items()
+        }
+        return index
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float, float]]:
+        """Retorna (posição, score BM25, fração dos termos da consulta encontrados)"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.ids:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        k1, b, avg_length = self.k1, self.b, self.avg_doc_length or 1.0
+
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            idf = self.idf[term]
+            for position, frequency in zip(*entry):
+                length_norm = k1 * (1.0 - b + b * self.doc_lengths[position] / avg_length)
+                scores[position] += idf * frequency * (k1 + 1.0) / (frequency + length_norm)
+                matched[position] += 1
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(position, score, matched[position] / len(terms)) for position, score in top]
+
+    def get_document(self, position: int) -> Document:
+        return Document(page_content=self.texts[position], metadata=self.metadatas[position])
+
+    def save(self, path: str):
+        """Persiste o índice (escrita atômica)"""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Arquivo temporário único: reconstruções simultâneas não escrevem no mesmo arquivo
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".build-", suffix=".pickle")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        index = cls()
+        with open(path, "rb") as f:
+            index.__dict__.update(pickle.load(f))
+        return index
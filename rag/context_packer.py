@@ -0,0 +1,181 @@
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger("rag.context")
+
+
+class TokenCounter:
+    """Conta tokens com o tokenizer do modelo gerador (carregado uma única vez)
+
+    Se o tokenizer não puder ser carregado (ex.: sem acesso ao repositório do modelo),
+    usa a aproximação de ~4 caracteres por token.
+    """
+
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, tokenizer_name: str = settings.CONTEXT_TOKENIZER):
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_tokenizer(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        from transformers import AutoTokenizer
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                    except Exception as e:
+                        logger.warning("Tokenizer %s indisponível, usando aproximação: %s", self.tokenizer_name, e)
+                    self._loaded = True
+        return self._tokenizer
+
+    @property
+    def is_exact(self) -> bool:
+        return self._get_tokenizer() is not None
+
+    def count(self, text: str) -> int:
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return -(-len(text) // self.CHARS_PER_TOKEN)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Corta o texto para caber em max_tokens"""
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return text[:max_tokens * self.CHARS_PER_TOKEN]
+        token_ids = tokenizer.encode(text, add_special_tokens=False)
+        return tokenizer.decode(token_ids[:max_tokens])
+
+
+class ContextPacker:
+    """Monta o contexto do prompt a partir dos chunks recuperados
+
+    Seleciona chunks pela ordem de relevância até o orçamento de tokens, junta chunks
+    vizinhos do mesmo artigo (chunk_index consecutivos) e remove o texto repetido pelo
+    overlap do divisor.
+    """
+
+    SECTION_SEPARATOR = "\n\n"
+    GAP_MARKER = "\n[...]\n"
+
+    def __init__(
+        self,
+        token_budget: int = settings.CONTEXT_TOKEN_BUDGET,
+        token_counter: Optional[TokenCounter] = None,
+        max_overlap: int = settings.CHUNK_OVERLAP * 2,
+        min_overlap: int = 16
+    ):
+        self.token_budget = token_budget
+        self.token_counter = token_counter or TokenCounter()
+        self.max_overlap = max_overlap
+        self.min_overlap = min_overlap
+
+    def overlap_length(self, previous: str, current: str) -> int:
+        """Maior sufixo de `previous` que também é prefixo de `current`"""
+        limit = min(len(previous), len(current), self.max_overlap)
+        for size in range(limit, self.min_overlap - 1, -1):
+            if previous.endswith(current[:size]):
+                return size
+        return 0
+
+    def _merge_article(self, chunks: List[Tuple[int, str]]) -> Tuple[str, int, int]:
+        """Junta os chunks de um artigo em ordem; retorna (texto, chunks fundidos, caracteres removidos)"""
+        chunks = sorted(chunks)
+        text = chunks[0][1]
+        merged = 0
+        removed = 0
+
+        for (previous_index, previous_text), (index, chunk) in zip(chunks, chunks[1:]):
+            if index == previous_index + 1:
+                overlap = self.overlap_length(previous_text, chunk)
+                text += ("" if overlap else " ") + chunk[overlap:]
+                merged += 1
+                removed += overlap
+            else:
+                text += self.GAP_MARKER + chunk
+
+        return text, merged, removed
+
+    @staticmethod
+    def _article_key(result: Dict[str, Any]) -> Tuple[str, str]:
+        return result.get("article_name", "N/A"), result.get("article_url", "N/A")
+
+    @staticmethod
+    def _header(article_name: str) -> str:
+        return f"Fonte: {article_name}\n"
+
+    def _render(self, articles: Dict[Tuple[str, str], List[Tuple[int, str]]]) -> Tuple[List[str], int, int]:
+        sections, merged, removed = [], 0, 0
+        for (article_name, _), chunks in articles.items():
+            text, article_merged, article_removed = self._merge_article(chunks)
+            sections.append(self._header(article_name) + text)
+            merged += article_merged
+            removed += article_removed
+        return sections, merged, removed
+
+    def pack(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Contexto mais relevante no menor número de tokens, dentro do orçamento"""
+        # Artigos na ordem do seu melhor chunk; chunks de cada artigo por chunk_index
+        articles: Dict[Tuple[str, str], List[Tuple[int, str]]] = {}
+        section_tokens: Dict[Tuple[str, str], int] = {}
+        separator_tokens = self.token_counter.count(self.SECTION_SEPARATOR)
+        total_tokens = 0
+        used = 0
+        seen = set()
+
+        for result in results:
+            key = self._article_key(result)
+            chunk_index = int(result.get("chunk_index", 0))
+            if (key, chunk_index) in seen:
+                continue
+            seen.add((key, chunk_index))
+
+            candidate = articles.get(key, []) + [(chunk_index, result["content"])]
+            text, _, _ = self._merge_article(candidate)
+            tokens = self.token_counter.count(self._header(key[0]) + text)
+            delta = tokens - section_tokens.get(key, 0)
+            if key not in articles and articles:
+                delta += separator_tokens
+
+            if total_tokens + delta > self.token_budget:
+                if not articles:
+                    # Nem o chunk mais relevante cabe inteiro: usa o início dele, descontando o cabeçalho
+                    header = self._header(key[0])
+                    truncated = self.token_counter.truncate(
+                        result["content"], max(self.token_budget - self.token_counter.count(header), 0)
+                    )
+                    # Tokenizers podem juntar tokens na fronteira: corta mais até caber de fato
+                    tokens = self.token_counter.count(header + truncated)
+                    while tokens > self.token_budget and truncated:
+                        excess = tokens - self.token_budget
+                        truncated = self.token_counter.truncate(truncated, max(self.token_counter.count(truncated) - excess, 0))
+                        tokens = self.token_counter.count(header + truncated)
+                    articles[key] = [(chunk_index, truncated)]
+                    section_tokens[key] = tokens
+                    total_tokens = tokens
+                    used += 1
+                continue
+
+            articles[key] = candidate
+            section_tokens[key] = tokens
+            total_tokens += delta
+            used += 1
+
+        sections, merged, removed = self._render(articles)
+
+        return {
+            "context": self.SECTION_SEPARATOR.join(sections),
+            "tokens": total_tokens,
+            "token_budget": self.token_budget,
+            "exact_tokens": self.token_counter.is_exact,
+            "chunks_retrieved": len(results),
+            "chunks_used": used,
+            "chunks_merged": merged,
+            "overlap_chars_removed": removed,
+            "sources": [url for _, url in articles]
+        }
@@ -1,9 +1,39 @@
+import hashlib
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config.settings import settings 
 
+REQUIRED_COLUMNS = ['article_name', 'article_url', 'article_content']
+
+
+class DocumentStatistics:
+    """Acumula estatísticas dos documentos durante uma única passagem pelo CSV"""
+
+    def __init__(self):
+        self.total_articles = 0
+        self.total_chunks = 0
+        self.total_content_length = 0
+        self.articles_with_multiple_chunks = 0
+
+    def add_article(self, article_content: str, documents: List[Document]):
+        self.total_articles += 1
+        self.total_chunks += len(documents)
+        self.total_content_length += len(article_content)
+        if len(documents) > 1:
+            # Mantém a contagem original: chunks pertencentes a artigos com múltiplos chunks
+            self.articles_with_multiple_chunks += len(documents)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_articles': self.total_articles,
+            'total_chunks': self.total_chunks,
+            'avg_content_length': self.total_content_length / self.total_articles if self.total_articles else 0.0,
+            'articles_with_multiple_chunks': self.articles_with_multiple_chunks
+        }
+
+
 class CSVDocumentProcessor:
     """Processa arquivo CSV e converte em documentos LangChain"""
     
@@ -15,63 +45,164 @@ class CSVDocumentProcessor:
             length_function=len,
             separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
         )
+        # Artigos repetidos (mesmo título e URL) descartados na última leitura
+        self.duplicate_articles = 0
     
     def load_csv_data(self) -> pd.DataFrame:
         """Carrega dados do CSV"""
         try:
             df = pd.read_csv(self.csv_path)
-            required_columns = ['article_name', 'article_url', 'article_content']
-            
-            if not all(col in df.columns for col in required_columns):
-                raise ValueError(f"CSV deve conter as colunas: {required_columns}")
-            
-            # Remove linhas com conteúdo vazio
-            df = df.dropna(subset=['article_content'])
-            df = df[df['article_content'].str.strip() != '']
-            
-            return df
+            return self._clean_frame(df)
+        except Exception as e:
+            raise Exception(f"Erro ao carregar CSV: {str(e)}")
+
+    @staticmethod
+    def _clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """Valida colunas e remove linhas com conteúdo vazio"""
+        if not all(col in df.columns for col in REQUIRED_COLUMNS):
+            raise ValueError(f"CSV deve conter as colunas: {REQUIRED_COLUMNS}")
+        
+        df = df.dropna(subset=['article_content'])
+        df = df[df['article_content'].str.strip() != '']
+        
+        return df
+
+    def iter_articles(self, chunksize: int = settings.CSV_READ_CHUNKSIZE) -> Iterator[Dict[str, Any]]:
+        """Lê o CSV em blocos de linhas, mantendo a memória constante
+
+        Artigo repetido no CSV: prevalece a primeira ocorrência (mesma regra em construções
+        completas, no pipeline de ingestão e na sincronização incremental).
+        """
+        self.duplicate_articles = 0
+        seen_articles = set()
+        try:
+            reader = pd.read_csv(
+                self.csv_path,
+                chunksize=chunksize,
+                usecols=lambda column: column in REQUIRED_COLUMNS
+            )
+            for frame in reader:
+                frame = self._clean_frame(frame)
+                for row in frame.itertuples(index=False):
+                    article_id = self.article_id(row.article_name, row.article_url)
+                    if article_id in seen_articles:
+                        self.duplicate_articles += 1
+                        continue
+                    seen_articles.add(article_id)
+                    yield {
+                        'article_name': row.article_name,
+                        'article_url': row.article_url,
+                        'article_content': row.article_content
+                    }
         except Exception as e:
             raise Exception(f"Erro ao carregar CSV: {str(e)}")
     
+    @staticmethod
+    def article_id(article_name: str, article_url: str) -> str:
+        """Identificador estável do artigo (derivado de título e URL)"""
+        return hashlib.sha1(f"{article_name}\x00{article_url}".encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Hash de conteúdo usado para detectar alterações"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    @classmethod
+    def article_hash(cls, article_name: str, article_url: str, article_content: str) -> str:
+        """Hash do artigo completo; permite pular artigos inalterados sem dividi-los"""
+        return cls.content_hash(f"{article_name}\x00{article_url}\x00{article_content}")
+
+    @staticmethod
+    def chunk_id(metadata: Dict[str, Any]) -> str:
+        """Identificador estável do chunk (artigo + posição)"""
+        return f"{metadata['article_id']}-{metadata['chunk_index']}"
+
+    @classmethod
+    def unique_chunk_positions(cls, documents: List[Document]) -> Dict[str, int]:
+        """Posição da primeira ocorrência de cada chunk_id (mesma regra de iter_articles)"""
+        positions: Dict[str, int] = {}
+        for position, doc in enumerate(documents):
+            positions.setdefault(cls.chunk_id(doc.metadata), position)
+        return positions
+
+    def create_article_documents(self, article_name: str, article_url: str, article_content: str) -> List[Document]:
+        """Divide um artigo em chunks e cria os documentos LangChain correspondentes"""
+        # Cria conteúdo principal combinando título e conteúdo
+        main_content = f"Título: {article_name}\n\nConteúdo: {article_content}"
+        
+        # Divide o conteúdo em chunks se necessário
+        chunks = self.text_splitter.split_text(main_content)
+        article_id = self.article_id(article_name, article_url)
+        article_hash = self.article_hash(article_name, article_url, article_content)
+        documents = []
+        
+        for i, chunk in enumerate(chunks):
+            # Metadados para cada chunk
+            metadata = {
+                'article_name': article_name,
+                'article_url': article_url,
+                'chunk_index': i,
+                'total_chunks': len(chunks),
+                'source': 'knowledge_base_csv',
+                'article_id': article_id,
+                'article_hash': article_hash,
+                'chunk_hash': self.content_hash(chunk)
+            }
+            
+            # Cria documento LangChain
+            doc = Document(
+                page_content=chunk,
+                metadata=metadata
+            )
+            documents.append(doc)
+        
+        return documents
+
     def create_documents(self) -> List[Document]:
         """Converte dados CSV em documentos LangChain"""
         df = self.load_csv_data()
+        # Artigo repetido: prevalece a primeira ocorrência, como em iter_articles
+        unique = ~df.duplicated(subset=['article_name', 'article_url'], keep='first')
+        self.duplicate_articles = int((~unique).sum())
+        df = df[unique]
         documents = []
         
         for index, row in df.iterrows():
-            # Cria conteúdo principal combinando título e conteúdo
-            main_content = f"Título: {row['article_name']}\n\nConteúdo: {row['article_content']}"
-            
-            # Divide o conteúdo em chunks se necessário
-            chunks = self.text_splitter.split_text(main_content)
-            
-            for i, chunk in enumerate(chunks):
-                # Metadados para cada chunk
-                metadata = {
-                    'article_name': row['article_name'],
-                    'article_url': row['article_url'],
-                    'chunk_index': i,
-                    'total_chunks': len(chunks),
-                    'source': 'knowledge_base_csv'
-                }
-                
-                # Cria documento LangChain
-                doc = Document(
-                    page_content=chunk,
-                    metadata=metadata
-                )
-                documents.append(doc)
+            documents.extend(
+                self.create_article_documents(row['article_name'], row['article_url'], row['article_content'])
+            )
         
         return documents
     
+    def iter_documents(self, statistics: Optional[DocumentStatistics] = None) -> Iterator[Document]:
+        """Gera documentos em chunks sob demanda, acumulando estatísticas na mesma passagem"""
+        for article in self.iter_articles():
+            documents = self.create_article_documents(
+                article['article_name'], article['article_url'], article['article_content']
+            )
+            if statistics is not None:
+                statistics.add_article(article['article_content'], documents)
+            yield from documents
+    
+    def iter_document_batches(
+        self,
+        batch_size: int = settings.INGESTION_BATCH_SIZE,
+        statistics: Optional[DocumentStatistics] = None
+    ) -> Iterator[List[Document]]:
+        """Agrupa os documentos gerados em lotes de tamanho fixo"""
+        batch = []
+        for doc in self.iter_documents(statistics):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
     def get_statistics(self) -> Dict[str, Any]:
-        """Retorna estatísticas dos dados processados"""
-        df = self.load_csv_data()
-        documents = self.create_documents()
+        """Retorna estatísticas dos dados processados (passagem única, em streaming)"""
+        statistics = DocumentStatistics()
+        for _ in self.iter_documents(statistics):
+            pass
         
-        return {
-            'total_articles': len(df),
-            'total_chunks': len(documents),
-            'avg_content_length': df['article_content'].str.len().mean(),
-            'articles_with_multiple_chunks': len([doc for doc in documents if doc.metadata['total_chunks'] > 1])
-        }
+        return statistics.to_dict()
@@ -1,38 +1,331 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from sentence_transformers import SentenceTransformer
-from typing import List
+from collections import OrderedDict
+from array import array
+from typing import List, Optional, Dict, Any, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
 import torch
 from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger("embeddings")
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza texto de consulta para uso como chave de cache (NFC, caixa e espaços)"""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Cache LRU de embeddings de consulta com TTL e camada opcional em disco"""
+
+    def __init__(
+        self,
+        max_size: int = settings.EMBEDDING_CACHE_SIZE,
+        ttl: Optional[float] = settings.EMBEDDING_CACHE_TTL,
+        cache_dir: Optional[str] = settings.EMBEDDING_CACHE_DIR,
+        disk_max_entries: int = settings.EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+        disk_commit_every: int = settings.EMBEDDING_CACHE_DISK_COMMIT_EVERY,
+        disk_commit_interval: float = settings.EMBEDDING_CACHE_DISK_COMMIT_INTERVAL
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.disk_commit_every = max(1, disk_commit_every)
+        self.disk_commit_interval = disk_commit_interval
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Camada em disco tem lock próprio: acertos em memória não esperam por I/O
+        self._disk_lock = threading.Lock()
+        self._disk = None
+        self._disk_writes = 0
+        # Gravações acumuladas em memória e enviadas em lote (uma transação por lote)
+        self._disk_buffer: List[Tuple[str, str, bytes, float]] = []
+        self._disk_last_commit = time.monotonic()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if cache_dir:
+            self._open_disk_tier(cache_dir)
+
+    def _open_disk_tier(self, cache_dir: str):
+        """Abre (ou cria) o arquivo SQLite usado como camada persistente"""
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk = sqlite3.connect(
+            os.path.join(cache_dir, "query_embeddings.sqlite"),
+            check_same_thread=False
+        )
+        # WAL com synchronous=NORMAL: leitores não esperam o escritor e commits não fazem fsync
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute("PRAGMA synchronous=NORMAL")
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT, vector BLOB, created REAL)"
+        )
+        self._disk.execute("CREATE INDEX IF NOT EXISTS idx_created ON embeddings (created)")
+        self._disk.commit()
+        self._prune_disk()
+
+    @staticmethod
+    def _disk_key(model_name: str, normalized: str) -> str:
+        return hashlib.sha1(f"{model_name}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, model_name: str, text: str) -> Optional[List[float]]:
+        """Retorna embedding em cache ou None"""
+        vector = self.get_memory(model_name, text)
+        if vector is None:
+            vector = self.get_disk(model_name, text)
+        return vector
+
+    def get_memory(self, model_name: str, text: str) -> Optional[List[float]]:
+        """Consulta só a camada em memória (sem I/O: pode ser chamada no event loop)
+
+        Uma ausência não é contada aqui, e sim em get_disk.
+        """
+        key = (model_name, normalize_query(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, created = entry
+                if not self._is_expired(created, time.time()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+                self.expirations += 1
+        return None
+
+    def get_disk(self, model_name: str, text: str) -> Optional[List[float]]:
+        """Consulta a camada em disco (bloqueante) após uma ausência em memória"""
+        normalized = normalize_query(text)
+        key = (model_name, normalized)
+        now = time.time()
+
+        if self._disk is not None:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT vector, created FROM embeddings WHERE key = ?",
+                    (self._disk_key(model_name, normalized),)
+                ).fetchone()
+            if row is not None and not self._is_expired(row[1], now):
+                vector = array("f", row[0]).tolist()
+                with self._lock:
+                    self._store_memory(key, vector, row[1])
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model_name: str, text: str, vector: List[float]):
+        """Armazena embedding nas camadas de memória e disco (pode gravar no disco: bloqueante)"""
+        normalized = normalize_query(text)
+        created = time.time()
+
+        with self._lock:
+            self._store_memory((model_name, normalized), vector, created)
+
+        if self._disk is None:
+            return
+
+        row = (self._disk_key(model_name, normalized), model_name, array("f", vector).tobytes(), created)
+        with self._disk_lock:
+            self._disk_buffer.append(row)
+            if (
+                len(self._disk_buffer) >= self.disk_commit_every
+                or time.monotonic() - self._disk_last_commit >= self.disk_commit_interval
+            ):
+                self._write_buffer()
+
+    def _store_memory(self, key: Tuple[str, str], vector: List[float], created: float):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (vector, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_disk(self):
+        """Remove entradas expiradas e excedentes da camada em disco"""
+        if self.ttl is not None:
+            self._disk.execute("DELETE FROM embeddings WHERE created < ?", (time.time() - self.ttl,))
+        self._disk.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        )
+        self._disk.commit()
+
+    def _write_buffer(self):
+        """Grava o lote pendente numa única transação (chamado com _disk_lock adquirido)"""
+        rows, self._disk_buffer = self._disk_buffer, []
+        self._disk_last_commit = time.monotonic()
+        if not rows:
+            return
+        self._disk.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, vector, created) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        self._disk.commit()
+
+        previous = self._disk_writes
+        self._disk_writes += len(rows)
+        if self._disk_writes // 1000 != previous // 1000:
+            self._prune_disk()
+
+    def flush(self):
+        """Grava no disco as entradas ainda pendentes no lote"""
+        if self._disk is not None:
+            with self._disk_lock:
+                self._write_buffer()
+
+    def clear(self):
+        """Limpa todas as camadas do cache"""
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk_buffer = []
+                self._disk.execute("DELETE FROM embeddings")
+                self._disk.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna contadores de acerto/erro do cache"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'disk_enabled': self._disk is not None,
+            'disk_pending_writes': len(self._disk_buffer)
+        }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wrapper LangChain que consulta o cache antes de gerar embeddings de consulta"""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: QueryEmbeddingCache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Documentos de ingestão não passam pelo cache de consultas
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model_name, text, vector)
+        return vector
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """Adaptador LangChain sobre uma instância compartilhada de SentenceTransformer"""
+
+    def __init__(self, model: SentenceTransformer, encode_kwargs: Optional[Dict[str, Any]] = None):
+        self.model = model
+        self.encode_kwargs = encode_kwargs or {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Mesmo pré-processamento do HuggingFaceEmbeddings, mantendo o índice existente compatível
+        texts = [text.replace("\n", " ") for text in texts]
+        embeddings = self.model.encode(texts, **self.encode_kwargs)
+        return embeddings.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
 
 class PortugueseEmbeddingsManager:
     """Gerencia embeddings em português usando sentence-transformers"""
     
-    def __init__(self, model_name: str = settings.EMBEDDING_MODEL):
+    SUPPORTED_BACKENDS = ("torch", "onnx", "int8")
+
+    def __init__(
+        self,
+        model_name: str = settings.EMBEDDING_MODEL,
+        cache: Optional[QueryEmbeddingCache] = None,
+        backend: str = settings.EMBEDDING_BACKEND
+    ):
+        if backend not in self.SUPPORTED_BACKENDS:
+            raise ValueError(f"Backend de embeddings deve ser um de: {self.SUPPORTED_BACKENDS}")
+
         self.model_name = model_name
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        print(f"Usando dispositivo: {self.device}")
-        
-        # Inicializa o modelo de embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs={'device': self.device},
+        self.backend = backend
+        # Backends ONNX e int8 são otimizados para inferência em CPU
+        self.device = 'cuda' if backend == "torch" and torch.cuda.is_available() else 'cpu'
+        logger.info("Usando dispositivo: %s (backend: %s)", self.device, self.backend)
+
+        # Modelo carregado uma única vez e compartilhado pelas APIs LangChain e sentence-transformers
+        self.sentence_model = self._load_sentence_model()
+        self.base_embeddings = SentenceTransformerEmbeddings(
+            self.sentence_model,
             encode_kwargs={'normalize_embeddings': True}
         )
-        
-        # Modelo sentence-transformer para testes
-        self.sentence_model = SentenceTransformer(model_name, device=self.device)
+
+        # Cache de embeddings de consulta (chave: texto normalizado + modelo)
+        self.query_cache = cache or QueryEmbeddingCache()
+        self.embeddings = CachedQueryEmbeddings(self.base_embeddings, model_name, self.query_cache)
+
+    def _load_sentence_model(self) -> SentenceTransformer:
+        """Carrega o modelo conforme o backend configurado"""
+        if self.backend == "onnx":
+            model_kwargs = {"file_name": settings.EMBEDDING_ONNX_FILE} if settings.EMBEDDING_ONNX_FILE else None
+            return SentenceTransformer(
+                self.model_name,
+                device=self.device,
+                backend="onnx",
+                model_kwargs=model_kwargs
+            )
+
+        model = SentenceTransformer(self.model_name, device=self.device)
+
+        if self.backend == "int8":
+            # Quantização dinâmica das camadas lineares (pesos int8, ativações quantizadas em tempo de execução)
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+
+        return model
     
     def get_embeddings(self):
         """Retorna instância do modelo de embeddings"""
         return self.embeddings
     
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do cache de embeddings de consulta"""
+        return self.query_cache.get_stats()
+    
     def test_embedding(self, text: str = "Este é um teste de embedding em português"):
         """Testa o modelo de embedding"""
         try:
             # Testa com LangChain
             embedding_vector = self.embeddings.embed_query(text)
             
-            # Testa com sentence-transformers
+            # Testa com sentence-transformers (mesma instância do modelo)
             st_embedding = self.sentence_model.encode([text])
             
             return {
@@ -60,6 +353,7 @@ class PortugueseEmbeddingsManager:
         return {
             'model_name': self.model_name,
             'device': self.device,
+            'backend': self.backend,
             'max_seq_length': getattr(self.sentence_model, 'max_seq_length', 'N/A'),
             'embedding_dimension': self.sentence_model.get_sentence_embedding_dimension()
         }
@@ -0,0 +1,251 @@
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, Tuple
+from langchain.schema import Document
+from rag.document_processor import CSVDocumentProcessor, DocumentStatistics
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger("ingestion")
+
+_STOP = object()
+_WORKER_PROCESSOR = None
+
+
+def _init_split_worker():
+    """Inicializa o divisor de texto uma única vez por processo"""
+    global _WORKER_PROCESSOR
+    _WORKER_PROCESSOR = CSVDocumentProcessor(csv_path="")
+
+
+def _split_articles(articles: List[Dict[str, Any]]) -> Tuple[List[List[Document]], float]:
+    """Divide um lote de artigos em chunks (executado no pool de processos)
+
+    Retorna também o tempo de trabalho do processo, somado em stage_seconds['split'].
+    """
+    started = time.perf_counter()
+    documents = [
+        _WORKER_PROCESSOR.create_article_documents(
+            article['article_name'], article['article_url'], article['article_content']
+        )
+        for article in articles
+    ]
+    return documents, time.perf_counter() - started
+
+
+class IngestionPipeline:
+    """Ingestão em pipeline: divisão multi-processo, encode multi-processo e escrita sobrepostos"""
+
+    def __init__(
+        self,
+        vector_store_manager,
+        split_workers: int = settings.INGESTION_SPLIT_WORKERS,
+        embed_workers: int = settings.INGESTION_EMBED_WORKERS,
+        articles_per_task: int = settings.INGESTION_ARTICLES_PER_TASK,
+        embed_batch_size: int = settings.INGESTION_EMBED_BATCH_SIZE,
+        queue_size: int = settings.INGESTION_QUEUE_SIZE,
+        encode_batch_size: int = 64
+    ):
+        self.vector_store_manager = vector_store_manager
+        self.split_workers = max(1, split_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.articles_per_task = articles_per_task
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.encode_batch_size = encode_batch_size
+
+        self._errors: List[BaseException] = []
+        self._stage_seconds: Dict[str, float] = {}
+
+    def run(self, csv_path: str) -> Dict[str, Any]:
+        """Executa a ingestão completa do CSV e retorna o relatório de throughput"""
+        start_time = time.time()
+        self._errors = []
+        # split: tempo de trabalho somado dos processos; split_wait: orquestrador bloqueado à espera deles
+        self._stage_seconds = {'split': 0.0, 'split_wait': 0.0, 'embed': 0.0, 'write': 0.0}
+
+        if not self.vector_store_manager.vector_store:
+            self.vector_store_manager.load_vector_store()
+
+        processor = CSVDocumentProcessor(csv_path)
+        statistics = DocumentStatistics()
+        model = self.vector_store_manager.embeddings_manager.sentence_model
+        collection = self.vector_store_manager.vector_store._collection
+
+        # Filas limitadas entre estágios aplicam backpressure ao leitor
+        chunk_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        write_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        embed_thread = threading.Thread(
+            target=self._embed_stage, args=(model, chunk_queue, write_queue), name="ingest-embed", daemon=True
+        )
+        write_thread = threading.Thread(
+            target=self._write_stage, args=(collection, write_queue), name="ingest-write", daemon=True
+        )
+        embed_thread.start()
+        write_thread.start()
+
+        try:
+            self._split_stage(processor, chunk_queue, statistics)
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            self._put(chunk_queue, _STOP)
+            embed_thread.join()
+            write_thread.join()
+
+        if self._errors:
+            raise Exception(f"Erro na ingestão em pipeline: {str(self._errors[0])}")
+
+        elapsed = time.time() - start_time
+        report = statistics.to_dict()
+        report.update({
+            'elapsed_seconds': round(elapsed, 3),
+            'docs_per_second': round(report['total_chunks'] / elapsed, 2) if elapsed else 0.0,
+            'articles_per_second': round(report['total_articles'] / elapsed, 2) if elapsed else 0.0,
+            'articles_duplicated': processor.duplicate_articles,
+            'split_workers': self.split_workers,
+            'embed_workers': self.embed_workers,
+            'stage_seconds': {stage: round(value, 3) for stage, value in self._stage_seconds.items()}
+        })
+        logger.info("Ingestão concluída: %d chunks, %s docs/s", report['total_chunks'], report['docs_per_second'])
+        return report
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Enfileira respeitando o backpressure; desiste se outro estágio falhou"""
+        while True:
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if self._errors:
+                    return False
+
+    def _article_batches(self, processor: CSVDocumentProcessor) -> Iterator[List[Dict[str, Any]]]:
+        batch = []
+        for article in processor.iter_articles():
+            batch.append(article)
+            if len(batch) >= self.articles_per_task:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _split_stage(self, processor: CSVDocumentProcessor, chunk_queue: queue.Queue, statistics: DocumentStatistics):
+        """Distribui lotes de artigos entre processos e encaminha os chunks em ordem"""
+        pending = deque()
+        max_in_flight = self.split_workers * 2
+
+        # spawn: o processo principal já tem threads e o torch carregados, o que torna fork inseguro
+        with ProcessPoolExecutor(
+            max_workers=self.split_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_split_worker
+        ) as pool:
+            for articles in self._article_batches(processor):
+                pending.append((pool.submit(_split_articles, articles), articles))
+                if len(pending) >= max_in_flight and not self._forward_split(pending.popleft(), chunk_queue, statistics):
+                    return
+
+            while pending:
+                if not self._forward_split(pending.popleft(), chunk_queue, statistics):
+                    return
+
+    def _forward_split(self, task, chunk_queue: queue.Queue, statistics: DocumentStatistics) -> bool:
+        future, articles = task
+        started = time.time()
+        documents_per_article, busy_seconds = future.result()
+        self._stage_seconds['split_wait'] += time.time() - started
+        self._stage_seconds['split'] += busy_seconds
+
+        documents = []
+        for article, article_documents in zip(articles, documents_per_article):
+            statistics.add_article(article['article_content'], article_documents)
+            documents.extend(article_documents)
+
+        return self._put(chunk_queue, documents)
+
+    def _embed_stage(self, model, chunk_queue: queue.Queue, write_queue: queue.Queue):
+        """Acumula chunks em lotes grandes e os codifica no pool multi-processo"""
+        pool = None
+        buffer: List[Document] = []
+
+        try:
+            if self.embed_workers > 1:
+                pool = model.start_multi_process_pool(target_devices=["cpu"] * self.embed_workers)
+
+            while True:
+                try:
+                    item = chunk_queue.get(timeout=0.5)
+                except queue.Empty:
+                    if self._errors:
+                        return
+                    continue
+                if item is _STOP:
+                    break
+                buffer.extend(item)
+
+                while len(buffer) >= self.embed_batch_size:
+                    batch, buffer = buffer[:self.embed_batch_size], buffer[self.embed_batch_size:]
+                    if not self._put(write_queue, self._embed_batch(model, pool, batch)):
+                        return
+
+            if buffer:
+                self._put(write_queue, self._embed_batch(model, pool, buffer))
+
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            if pool is not None:
+                model.stop_multi_process_pool(pool)
+            # O escritor sempre consome a fila, então o bloqueio aqui é seguro
+            write_queue.put(_STOP)
+
+    def _embed_batch(self, model, pool, documents: List[Document]):
+        started = time.time()
+        # Mesmo pré-processamento das consultas (SentenceTransformerEmbeddings)
+        texts = [doc.page_content.replace("\n", " ") for doc in documents]
+
+        if pool is not None:
+            embeddings = model.encode_multi_process(
+                texts, pool, batch_size=self.encode_batch_size, normalize_embeddings=True
+            )
+        else:
+            embeddings = model.encode(texts, batch_size=self.encode_batch_size, normalize_embeddings=True)
+
+        self._stage_seconds['embed'] += time.time() - started
+        return documents, embeddings
+
+    def _write_stage(self, collection, write_queue: queue.Queue):
+        """Grava os lotes na coleção à medida que os embeddings ficam prontos"""
+        while True:
+            item = write_queue.get()
+            if item is _STOP:
+                return
+            if self._errors:
+                # Drena a fila para não bloquear os estágios anteriores
+                continue
+
+            documents, embeddings = item
+            started = time.time()
+            try:
+                # IDs repetidos no mesmo upsert são rejeitados: prevalece a primeira ocorrência
+                positions = CSVDocumentProcessor.unique_chunk_positions(documents)
+                if len(positions) < len(documents):
+                    logger.warning("%d chunks com ID repetido descartados", len(documents) - len(positions))
+                    documents = [documents[position] for position in positions.values()]
+                    embeddings = embeddings[list(positions.values())]
+
+                collection.upsert(
+                    ids=list(positions),
+                    embeddings=embeddings.tolist(),
+                    documents=[doc.page_content for doc in documents],
+                    metadatas=[doc.metadata for doc in documents]
+                )
+            except Exception as e:
+                self._errors.append(e)
+            self._stage_seconds['write'] += time.time() - started
@@ -0,0 +1,114 @@
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Set
+from langchain.schema import Document
+from rag.document_processor import CSVDocumentProcessor
+from rag.vector_store import VectorStoreManager
+from config.settings import settings
+
+
+class KnowledgeBaseSync:
+    """Sincroniza incrementalmente o banco vetorial com um CSV de artigos (upsert por hash)"""
+
+    def __init__(self, vector_store_manager: VectorStoreManager):
+        self.vector_store_manager = vector_store_manager
+
+    def sync(self, csv_path: str) -> Dict[str, Any]:
+        """Aplica somente as diferenças entre o CSV e o índice, retornando o relatório de mudanças"""
+        start_time = time.time()
+        processor = CSVDocumentProcessor(csv_path)
+
+        # Estado atual do índice: hash por artigo e por chunk
+        indexed = self.vector_store_manager.get_chunk_metadata()
+        indexed_article_hash: Dict[str, str] = {}
+        indexed_ids_by_article: Dict[str, List[str]] = defaultdict(list)
+        for chunk_id, metadata in indexed.items():
+            article_id = metadata.get('article_id')
+            if article_id:
+                indexed_article_hash[article_id] = metadata.get('article_hash')
+                indexed_ids_by_article[article_id].append(chunk_id)
+
+        seen_ids: Set[str] = set()
+        seen_articles: Set[str] = set()
+        upsert_docs: List[Document] = []
+        upsert_ids: List[str] = []
+        metadata_ids: List[str] = []
+        metadata_updates: List[Dict[str, Any]] = []
+        report = {
+            'articles_total': 0,
+            'articles_added': 0,
+            'articles_updated': 0,
+            'articles_unchanged': 0,
+            'articles_removed': 0,
+            'articles_duplicated': 0,
+            'chunks_upserted': 0,
+            'chunks_metadata_updated': 0,
+            'chunks_unchanged': 0,
+            'chunks_deleted': 0
+        }
+
+        # Leitura em streaming: apenas IDs e hashes ficam em memória (artigos repetidos já descartados)
+        for row in processor.iter_articles():
+            article_id = processor.article_id(row['article_name'], row['article_url'])
+            seen_articles.add(article_id)
+            report['articles_total'] += 1
+
+            article_hash = processor.article_hash(row['article_name'], row['article_url'], row['article_content'])
+
+            # Artigo inalterado: nem divisão em chunks nem embeddings são necessários
+            if indexed_article_hash.get(article_id) == article_hash:
+                report['articles_unchanged'] += 1
+                report['chunks_unchanged'] += len(indexed_ids_by_article[article_id])
+                seen_ids.update(indexed_ids_by_article[article_id])
+                continue
+
+            documents = processor.create_article_documents(
+                row['article_name'], row['article_url'], row['article_content']
+            )
+
+            if article_id in indexed_article_hash:
+                report['articles_updated'] += 1
+            else:
+                report['articles_added'] += 1
+
+            for doc in documents:
+                chunk_id = processor.chunk_id(doc.metadata)
+                seen_ids.add(chunk_id)
+                previous = indexed.get(chunk_id)
+
+                if previous is not None and previous.get('chunk_hash') == doc.metadata['chunk_hash']:
+                    # Texto igual: atualiza metadados sem recalcular o embedding
+                    metadata_ids.append(chunk_id)
+                    metadata_updates.append(doc.metadata)
+                else:
+                    upsert_ids.append(chunk_id)
+                    upsert_docs.append(doc)
+
+            # Envia lotes cheios imediatamente para manter a memória limitada
+            if len(upsert_docs) >= settings.INGESTION_BATCH_SIZE:
+                self.vector_store_manager.upsert_documents(upsert_docs, upsert_ids)
+                report['chunks_upserted'] += len(upsert_ids)
+                upsert_docs, upsert_ids = [], []
+            if len(metadata_ids) >= settings.INGESTION_BATCH_SIZE:
+                self.vector_store_manager.update_metadatas(metadata_ids, metadata_updates)
+                report['chunks_metadata_updated'] += len(metadata_ids)
+                metadata_ids, metadata_updates = [], []
+
+        report['articles_duplicated'] = processor.duplicate_articles
+        removed_ids = [chunk_id for chunk_id in indexed if chunk_id not in seen_ids]
+        report['articles_removed'] = len(set(indexed_article_hash) - seen_articles)
+
+        if removed_ids:
+            self.vector_store_manager.delete_documents(removed_ids)
+        if metadata_ids:
+            self.vector_store_manager.update_metadatas(metadata_ids, metadata_updates)
+        if upsert_docs:
+            self.vector_store_manager.upsert_documents(upsert_docs, upsert_ids)
+
+        report['chunks_upserted'] += len(upsert_ids)
+        report['chunks_metadata_updated'] += len(metadata_ids)
+        report['chunks_deleted'] = len(removed_ids)
+        report['changed'] = bool(removed_ids or report['chunks_metadata_updated'] or report['chunks_upserted'])
+        report['elapsed_seconds'] = round(time.time() - start_time, 3)
+
+        return report
@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+from utils.logger import get_logger
+
+logger = get_logger("rag.numpy_index")
+
+
+class NumpyVectorIndex:
+    """Índice vetorial em memória mapeada (matriz contígua normalizada + sidecar SQLite)
+
+    Textos e metadados ficam no SQLite e são lidos por posição só para os resultados,
+    sem carregar o corpus inteiro em cada processo. Cada construção grava os dois arquivos
+    num diretório próprio, publicado pela troca atômica do arquivo CURRENT: um processo
+    nunca combina a matriz de uma construção com o sidecar de outra. Os scores retornados seguem a mesma convenção do Chroma (distância L2 ao quadrado,
+    menor é melhor), que para vetores normalizados equivale a 2 - 2 * cosseno.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    DOCUMENTS_FILE = "documents.sqlite"
+    # Nome do diretório da construção publicada
+    CURRENT_FILE = "CURRENT"
+    BUILD_PREFIX = "build-"
+    # Construções em andamento: invisíveis para leitores e para a limpeza
+    PENDING_PREFIX = ".pending-"
+    SUPPORTED_DTYPES = ("float32", "float16")
+    # Linhas convertidas por bloco quando a matriz está em float16
+    BLOCK_ROWS = 65536
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.build: Optional[str] = None
+        self.vectors: Optional[np.ndarray] = None
+        self._documents: Optional[sqlite3.Connection] = None
+        self._documents_lock = threading.Lock()
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.directory, self.CURRENT_FILE)
+
+    @property
+    def build_path(self) -> str:
+        return os.path.join(self.directory, self.build or "")
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.build_path, self.VECTORS_FILE)
+
+    @property
+    def documents_path(self) -> str:
+        return os.path.join(self.build_path, self.DOCUMENTS_FILE)
+
+    def _current_build(self) -> Optional[str]:
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def exists(self) -> bool:
+        return self._current_build() is not None
+
+    def load(self) -> "NumpyVectorIndex":
+        """Mapeia a matriz em memória (somente leitura, páginas compartilhadas entre processos)"""
+        build = self._current_build()
+        if build is None:
+            raise Exception("Índice NumPy não encontrado")
+        self.build = build
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        # O arquivo nunca é alterado no lugar (só substituído), então pode ser aberto como imutável
+        self._documents = sqlite3.connect(
+            f"file:{os.path.abspath(self.documents_path)}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False
+        )
+        return self
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    @classmethod
+    def build_from_collection(cls, collection, directory: str, dtype: str = "float32", page_size: int = 5000) -> "NumpyVectorIndex":
+        """Exporta uma coleção Chroma para o formato mapeado, página a página"""
+        if dtype not in cls.SUPPORTED_DTYPES:
+            raise ValueError(f"dtype do índice deve ser um de: {cls.SUPPORTED_DTYPES}")
+
+        os.makedirs(directory, exist_ok=True)
+        index = cls(directory)
+        total = collection.count()
+        matrix = None
+        # Diretório único por construção: construções concorrentes não se sobrescrevem
+        pending_path = tempfile.mkdtemp(dir=directory, prefix=cls.PENDING_PREFIX)
+        index.build = os.path.basename(pending_path)
+        documents = sqlite3.connect(index.documents_path)
+        documents.execute("CREATE TABLE documents (position INTEGER PRIMARY KEY, id TEXT, text TEXT, metadata TEXT)")
+
+        try:
+            for offset in range(0, total, page_size):
+                page = collection.get(
+                    include=["embeddings", "documents", "metadatas"],
+                    limit=page_size,
+                    offset=offset
+                )
+                embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(
+                        index.vectors_path, mode="w+", dtype=dtype, shape=(total, embeddings.shape[1])
+                    )
+                embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+                matrix[offset:offset + len(embeddings)] = embeddings
+                documents.executemany(
+                    "INSERT INTO documents (position, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    (
+                        (offset + i, chunk_id, text, json.dumps(metadata or {}, ensure_ascii=False))
+                        for i, (chunk_id, text, metadata) in enumerate(zip(page["ids"], page["documents"], page["metadatas"]))
+                    )
+                )
+
+            if matrix is None:
+                raise Exception("Coleção vazia: nada para exportar")
+
+            matrix.flush()
+            del matrix
+            documents.commit()
+            documents.close()
+
+            # Nomes em ordem de conclusão: a limpeza nunca apaga uma construção mais nova
+            index.build = f"{cls.BUILD_PREFIX}{time.time_ns():020d}-{os.getpid()}"
+            os.rename(pending_path, index.build_path)
+            pending_path = index.build_path
+
+            # Matriz e sidecar publicados juntos pela troca atômica do ponteiro
+            previous = index._current_build()
+            fd, tmp_current = tempfile.mkstemp(dir=directory, prefix=".current-")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(index.build)
+            os.replace(tmp_current, index.current_path)
+        except BaseException:
+            documents.close()
+            shutil.rmtree(pending_path, ignore_errors=True)
+            raise
+
+        cls._remove_old_builds(directory, oldest_kept=min(filter(None, (index.build, previous))))
+        return index.load()
+
+    @classmethod
+    def _remove_old_builds(cls, directory: str, oldest_kept: str):
+        """Apaga as construções anteriores à publicada e à que ela substituiu
+
+        A anterior fica para quem acabou de ler o ponteiro antigo; processos com a
+        matriz já mapeada continuam válidos mesmo após a remoção.
+        """
+        for name in os.listdir(directory):
+            if name.startswith(cls.BUILD_PREFIX) and name < oldest_kept:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        # Arquivos do formato anterior, gravados direto no diretório do índice
+        for name in (cls.VECTORS_FILE, cls.DOCUMENTS_FILE):
+            if os.path.isfile(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """Similaridade de cosseno entre todas as linhas e as consultas (N x M)"""
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ queries.T
+
+        scores = np.empty((self.vectors.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, self.vectors.shape[0], self.BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + self.BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ queries.T
+        return scores
+
+    @staticmethod
+    def _normalize(queries) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    def search_batch(self, queries, k: int = 5) -> List[List[Tuple[int, float]]]:
+        """Top-k para várias consultas com um único produto matriz-matriz e seleção parcial"""
+        if self.vectors is None:
+            raise Exception("Índice NumPy não carregado")
+
+        queries = self._normalize(queries)
+        k = min(k, len(self))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = self._scores(queries)
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+
+        results = []
+        for column in range(queries.shape[0]):
+            candidates = top[:, column]
+            ordered = candidates[np.argsort(-scores[candidates, column])]
+            results.append([(int(i), float(2.0 - 2.0 * scores[i, column])) for i in ordered])
+        return results
+
+    def search(self, query, k: int = 5) -> List[Tuple[int, float]]:
+        """Top-k para uma consulta"""
+        return self.search_batch(query, k)[0]
+
+    def get_document(self, position: int) -> Optional[Document]:
+        """Documento da posição; None (com aviso) se o sidecar não tiver a linha"""
+        with self._documents_lock:
+            row = self._documents.execute(
+                "SELECT text, metadata FROM documents WHERE position = ?", (position,)
+            ).fetchone()
+        if row is None:
+            logger.warning("Posição %d ausente no sidecar do índice NumPy (%s)", position, self.build)
+            return None
+        text, metadata = row
+        return Document(page_content=text, metadata=json.loads(metadata))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "total_documents": len(self),
+            "dtype": None if self.vectors is None else str(self.vectors.dtype),
+            "dimension": None if self.vectors is None else int(self.vectors.shape[1]),
+            "directory": self.directory,
+            "build": self.build,
+            "vectors_bytes": os.path.getsize(self.vectors_path) if self.build else 0,
+            "documents_bytes": os.path.getsize(self.documents_path) if self.build else 0
+        }
+
+
+class NumpyIndexRetriever(BaseRetriever):
+    """Retriever LangChain sobre o backend NumPy do VectorStoreManager"""
+
+    manager: Any
+    k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return self.manager.search_similar_documents(query, k=self.k)
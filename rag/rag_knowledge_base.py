@@ -1,21 +1,39 @@
 import os
 import sys
-from typing import Dict, Any, List
+import threading
+from typing import Dict, Any, List, Optional
 import json
 
-from rag.document_processor import CSVDocumentProcessor
+from rag.document_processor import CSVDocumentProcessor, DocumentStatistics
 from rag.embeddings_manager import PortugueseEmbeddingsManager
 from rag.vector_store import VectorStoreManager
+from rag.batch_embedder import AsyncBatchEmbedder
+from rag.knowledge_base_sync import KnowledgeBaseSync
+from rag.ingestion_pipeline import IngestionPipeline
+from rag.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from config.settings import settings
+from utils.executors import run_in_retrieval_pool
+from utils.metrics import span, record_event
+from utils.logger import get_logger
+
+logger = get_logger("rag")
 
 class KnowledgeBaseRAG:
     """Sistema RAG principal para base de conhecimento"""
     
-    def __init__(self):
+    def __init__(self, embeddings_manager=None, vector_store_manager=None, batch_embedder=None):
         #self.csv_path = csv_path
         self.doc_processor = None
-        self.embeddings_manager = None
-        self.vector_store_manager = None
+        # Componentes compartilhados podem ser injetados (services/resource_registry.py)
+        self.embeddings_manager = embeddings_manager
+        self.vector_store_manager = vector_store_manager
+        self.batch_embedder = batch_embedder
+        self.lexical_index = None
         self.rag_system = None        
+        self.retrieval_stats = {'vector': 0, 'hybrid': 0, 'lexical_short_circuit': 0}
+        # O planejamento roda no pool de recuperação: contadores atualizados sob lock
+        self._stats_lock = threading.Lock()
+        self._invalidation_listeners = []
         
         self._initialize_components()
     
@@ -23,41 +41,251 @@ class KnowledgeBaseRAG:
         """Inicializa todos os componentes do sistema"""
         try:            
             #self.doc_processor = CSVDocumentProcessor(self.csv_path)
-            self.embeddings_manager = PortugueseEmbeddingsManager()            
-            self.vector_store_manager = VectorStoreManager(self.embeddings_manager)            
+            if self.embeddings_manager is None:
+                self.embeddings_manager = PortugueseEmbeddingsManager()            
+            if self.batch_embedder is None and settings.EMBEDDING_BATCHING_ENABLED:
+                self.batch_embedder = AsyncBatchEmbedder(self.embeddings_manager)
+            if self.vector_store_manager is None:
+                self.vector_store_manager = VectorStoreManager(self.embeddings_manager, batch_embedder=self.batch_embedder)            
             #self.rag_system = RAGSystem(self.vector_store_manager)
             
         except Exception as e:
-            print(f"Erro na inicialização: {str(e)}")
+            logger.error("Erro na inicialização: %s", e)
             raise
     
-    def setup_knowledge_base(self, force_rebuild: bool = False):
+    def setup_knowledge_base(self, force_rebuild: bool = False, csv_path: Optional[str] = None):
         """Configura a base de conhecimento"""
         try:
             # Verifica se já existe um banco vetorial
             if not force_rebuild and self.vector_store_manager.load_vector_store():                 
-                print(f"INFO:     Base de conhecimento carregada.")            
+                self._load_lexical_index()
+                logger.info("Base de conhecimento carregada.")
                 return True          
-          
+            
+            # Reconstrução incremental: apenas chunks novos/alterados são re-embeddados
+            if force_rebuild:
+                report = self.sync_knowledge_base(csv_path or settings.KNOWLEDGE_BASE_CSV)
+                logger.info("Base de conhecimento sincronizada: %s", report)
+                return True
             
         except Exception as e:
-            print(f"INFO:     Erro ao configurar base de conhecimento: {str(e)}")            
+            logger.error("Erro ao configurar base de conhecimento: %s", e)
             return False
+
+    def sync_knowledge_base(self, csv_path: str) -> Dict[str, Any]:
+        """Sincroniza o banco vetorial com o CSV informado e retorna o relatório de mudanças"""
+        if not self.vector_store_manager.vector_store:
+            self.vector_store_manager.load_vector_store()
+
+        report = KnowledgeBaseSync(self.vector_store_manager).sync(csv_path)
+        if report['changed'] or self.lexical_index is None:
+            self.vector_store_manager.refresh_index()
+            self._rebuild_lexical_index()
+        if report['changed']:
+            self._notify_invalidation()
+        
+        return report
+
+    def build_knowledge_base(self, csv_path: str, parallel: bool = settings.INGESTION_PARALLEL) -> Dict[str, Any]:
+        """Indexa o CSV completo em streaming e retorna as estatísticas da mesma passagem"""
+        if parallel:
+            # Divisão, encode e escrita sobrepostos, usando todos os núcleos
+            report = IngestionPipeline(self.vector_store_manager).run(csv_path)
+        else:
+            processor = CSVDocumentProcessor(csv_path)
+            statistics = DocumentStatistics()
+            
+            self.vector_store_manager.create_vector_store_from_batches(
+                processor.iter_document_batches(statistics=statistics)
+            )
+            report = statistics.to_dict()
+        
+        self.vector_store_manager.refresh_index()
+        self._rebuild_lexical_index()
+        self._notify_invalidation()
+        return report
+
+    def add_invalidation_listener(self, callback):
+        """Registra callback chamado quando o conteúdo da base de conhecimento muda"""
+        self._invalidation_listeners.append(callback)
+
+    def _notify_invalidation(self):
+        for callback in self._invalidation_listeners:
+            callback()
+
+    def embed_query(self, question: str) -> List[float]:
+        """Embedding da pergunta (via cache), para reutilização entre etapas da requisição"""
+        with span("query_embedding"):
+            return self.embeddings_manager.get_embeddings().embed_query(question)
+
+    def _load_lexical_index(self):
+        """Carrega o índice BM25 persistido junto ao chroma_db (ou o constrói a partir dos chunks)"""
+        if not settings.HYBRID_SEARCH_ENABLED:
+            return
+        
+        if os.path.exists(settings.BM25_INDEX_PATH):
+            self.lexical_index = BM25Index.load(settings.BM25_INDEX_PATH)
+        else:
+            self._rebuild_lexical_index()
+
+    def _rebuild_lexical_index(self):
+        """Reconstrói o índice BM25 a partir dos mesmos chunks do banco vetorial"""
+        if not settings.HYBRID_SEARCH_ENABLED:
+            return
+        
+        self.lexical_index = BM25Index.build(self.vector_store_manager.iter_stored_documents())
+        self.lexical_index.save(settings.BM25_INDEX_PATH)
+        logger.info("Índice BM25 gerado com %d chunks.", len(self.lexical_index))
     
-    def query_knowledge_base(self, question: str) -> Dict[str, Any]:
-        """Consulta a base de conhecimento"""       
+    def _lexical_candidates(self, question: str) -> List[tuple]:
+        if self.lexical_index is None or len(self.lexical_index) == 0:
+            return []
+        return self.lexical_index.search(question, k=settings.HYBRID_CANDIDATES)
+
+    def _is_lexical_decisive(self, question: str, lexical_hits: List[tuple]) -> bool:
+        """Consulta curta cujo melhor resultado BM25 cobre todos os termos e se destaca dos demais"""
+        if not settings.LEXICAL_SHORT_CIRCUIT_ENABLED or not lexical_hits:
+            return False
+        if len(tokenize(question)) > settings.LEXICAL_SHORT_CIRCUIT_MAX_TERMS:
+            return False
+        
+        _, top_score, coverage = lexical_hits[0]
+        second_score = lexical_hits[1][1] if len(lexical_hits) > 1 else 0.0
+        
+        return (
+            coverage == 1.0
+            and top_score >= settings.LEXICAL_SHORT_CIRCUIT_MIN_SCORE
+            and top_score >= settings.LEXICAL_SHORT_CIRCUIT_MARGIN * second_score
+        )
+
+    @staticmethod
+    def _result_key(doc) -> str:
+        metadata = doc.metadata
+        if 'article_id' in metadata:
+            return f"{metadata['article_id']}-{metadata.get('chunk_index', 0)}"
+        return doc.page_content
+
+    def _fuse_results(self, vector_results: List[tuple], lexical_hits: List[tuple], k: int) -> List[tuple]:
+        """Combina rankings vetorial e lexical com reciprocal rank fusion"""
+        lexical_results = [(self.lexical_index.get_document(position), score) for position, score, _ in lexical_hits]
+        documents = {}
+        rankings = []
+        for results in (vector_results, lexical_results):
+            ranking = []
+            for doc, _ in results:
+                key = self._result_key(doc)
+                documents.setdefault(key, doc)
+                ranking.append((key, doc))
+            rankings.append(ranking)
+        
+        with span("rank_fusion"):
+            fused = reciprocal_rank_fusion(rankings, k=settings.HYBRID_RRF_K)
+        return [(documents[key], score) for key, score in fused[:k]]
+
+    def _count_retrieval(self, mode: str):
+        with self._stats_lock:
+            self.retrieval_stats[mode] += 1
+
+    def get_retrieval_stats(self) -> Dict[str, int]:
+        """Cópia consistente dos contadores por modo de recuperação"""
+        with self._stats_lock:
+            return dict(self.retrieval_stats)
+
+    def _plan_retrieval(self, question: str, k: int):
+        """Decide entre atalho lexical e busca vetorial (híbrida quando há índice BM25)"""
+        with span("lexical_search"):
+            lexical_hits = self._lexical_candidates(question)
+        
+        if self._is_lexical_decisive(question, lexical_hits):
+            # Correspondência lexical decisiva: dispensa o embedding da consulta
+            self._count_retrieval('lexical_short_circuit')
+            record_event("retrieval_lexical_short_circuit")
+            docs = [(self.lexical_index.get_document(position), score) for position, score, _ in lexical_hits[:k]]
+            return lexical_hits, docs, "lexical"
+        
+        if lexical_hits:
+            self._count_retrieval('hybrid')
+            record_event("retrieval_hybrid")
+            return lexical_hits, None, "hybrid"
+        
+        self._count_retrieval('vector')
+        record_event("retrieval_vector")
+        return lexical_hits, None, "vector"
+
+    def _vector_search(self, question: str, k: int, query_embedding: Optional[List[float]] = None) -> List[tuple]:
+        if query_embedding is not None:
+            return self.vector_store_manager.search_with_scores_by_vector(query_embedding, k=k)
+        return self.vector_store_manager.search_with_scores(question, k=k)
+
+    def query_knowledge_base(self, question: str, k: int = 5, query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Consulta a base de conhecimento (reutiliza o embedding da pergunta, se fornecido)"""       
         
         #result = self.rag_system.query(question)
 
-        docs = self.vector_store_manager.search_with_scores(question, k=5)                
+        lexical_hits, docs, mode = self._plan_retrieval(question, k)
+        
+        if mode == "vector":
+            docs = self._vector_search(question, k, query_embedding)
+        elif mode == "hybrid":
+            vector_results = self._vector_search(question, settings.HYBRID_CANDIDATES, query_embedding)
+            docs = self._fuse_results(vector_results, lexical_hits, k)
                     
-        source_documents = self._format_search_results(docs),
+        source_documents = self._format_search_results(docs, mode),
         
         return source_documents # type: ignore
 
-    def _format_search_results(self, results: List[tuple]) -> List[Dict[str, Any]]:
-        """Formata resultados de busca com scores"""
+    async def aembed_query(self, question: str) -> List[float]:
+        """Embedding da pergunta sem bloquear o event loop (micro-batching quando disponível)"""
+        if self.batch_embedder is not None:
+            with span("query_embedding"):
+                return await self.batch_embedder.embed(question)
+        return await run_in_retrieval_pool(self.embed_query, question)
+
+    async def aplan_retrieval(self, question: str, k: int = 5) -> tuple:
+        """Planejamento fora do event loop; o modo ("lexical", "hybrid" ou "vector") fica em plan[2]"""
+        return await run_in_retrieval_pool(self._plan_retrieval, question, k)
+
+    async def aquery_knowledge_base(
+        self,
+        question: str,
+        k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        plan: Optional[tuple] = None
+    ) -> Dict[str, Any]:
+        """Consulta assíncrona: embedding e busca executados fora do event loop (plan: de aplan_retrieval)"""
+
+        lexical_hits, docs, mode = plan or await self.aplan_retrieval(question, k)
+
+        if mode != "lexical" and query_embedding is None:
+            query_embedding = await self.aembed_query(question)
+
+        if mode == "vector":
+            docs = await run_in_retrieval_pool(self._vector_search, question, k, query_embedding)
+        elif mode == "hybrid":
+            vector_results = await run_in_retrieval_pool(
+                self._vector_search, question, settings.HYBRID_CANDIDATES, query_embedding
+            )
+            docs = self._fuse_results(vector_results, lexical_hits, k)
+
+        source_documents = self._format_search_results(docs, mode),
+
+        return source_documents # type: ignore
+
+    # Tipo do score bruto devolvido por cada modo de busca
+    SCORE_TYPES = {"vector": "distance", "hybrid": "rrf", "lexical": "bm25"}
+
+    @staticmethod
+    def _relevance(score: float, score_type: str) -> float:
+        """Converte o score bruto para "maior é melhor" (escala depende do modo)"""
+        if score_type == "distance":
+            # Distância L2 ao quadrado entre vetores normalizados = 2 - 2 * cosseno
+            return 1.0 - score / 2.0
+        return score
+
+    def _format_search_results(self, results: List[tuple], mode: str = "vector") -> List[Dict[str, Any]]:
+        """Formata resultados de busca com relevância (maior é melhor) e score bruto do modo"""
         formatted_results = []
+        score_type = self.SCORE_TYPES[mode]
         
         for doc, score in results:
             formatted_results.append({
@@ -65,8 +293,11 @@ class KnowledgeBaseRAG:
                 "content": doc.page_content,
                 "article_name": doc.metadata.get("article_name", "N/A"),
                 "article_url": doc.metadata.get("article_url", "N/A"),
-                "similarity_score": float(score),
-                "chunk_index": doc.metadata.get("chunk_index", 0)
+                "relevance_score": self._relevance(float(score), score_type),
+                "raw_score": float(score),
+                "score_type": score_type,
+                "chunk_index": doc.metadata.get("chunk_index", 0),
+                "retrieval_mode": mode
             })
         
         return formatted_results
@@ -0,0 +1,128 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import numpy as np
+from config.settings import settings
+
+
+class SemanticAnswerCache:
+    """Cache semântico de respostas: reaproveita respostas de perguntas quase idênticas"""
+
+    def __init__(
+        self,
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        max_size: int = settings.SEMANTIC_CACHE_SIZE,
+        ttl: Optional[float] = settings.SEMANTIC_CACHE_TTL
+    ):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        # Matriz de embeddings reconstruída sob demanda após inserções/remoções
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _expire(self, now: float):
+        if self.ttl is None:
+            return
+        expired = [key for key, entry in self._entries.items() if now - entry['created'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _ensure_matrix(self):
+        if self._matrix is None and self._entries:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[key]['embedding'] for key in self._matrix_keys])
+
+    def lookup(self, embedding) -> Optional[Dict[str, Any]]:
+        """Retorna a entrada mais similar acima do limiar de cosseno, ou None"""
+        query = self._normalize(embedding)
+
+        with self._lock:
+            self._expire(time.time())
+            self._ensure_matrix()
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            key = self._matrix_keys[best]
+            entry = self._entries[key]
+            entry['hits'] += 1
+            entry['last_hit'] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return {
+                'question': entry['question'],
+                'context': entry['context'],
+                'answer': entry['answer'],
+                'similarity': similarity,
+                'hits': entry['hits']
+            }
+
+    def store(self, question: str, embedding, context: str, answer: str):
+        """Armazena (pergunta, contexto recuperado, resposta)"""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[next(self._ids)] = {
+                'question': question,
+                'embedding': self._normalize(embedding),
+                'context': context,
+                'answer': answer,
+                'created': time.time(),
+                'last_hit': None,
+                'hits': 0
+            }
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def invalidate(self):
+        """Descarta todas as respostas (ex.: após re-ingestão da base de conhecimento)"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """Retorna contadores globais e os acertos por entrada mais frequentes"""
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry['hits'], reverse=True)[:top]
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'top_entries': [{'question': entry['question'], 'hits': entry['hits']} for entry in entries]
+            }
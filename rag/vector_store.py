@@ -2,18 +2,40 @@ import chromadb
 from chromadb.config import Settings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
 import os
 from config.settings import settings 
+from rag.document_processor import CSVDocumentProcessor
+from rag.numpy_index import NumpyVectorIndex, NumpyIndexRetriever
+from utils.executors import run_in_retrieval_pool
+from utils.metrics import span
+from utils.logger import get_logger
+
+logger = get_logger("vector_store")
 
 class VectorStoreManager:
-    """Gerencia o banco vetorial usando ChromaDB"""
+    """Gerencia o banco vetorial usando ChromaDB (ou índice NumPy mapeado para consultas)"""
+    
+    SUPPORTED_BACKENDS = ("chroma", "numpy")
     
-    def __init__(self, embeddings_manager, persist_directory: str = settings.CHROMA_PERSIST_DIRECTORY):
+    def __init__(
+        self,
+        embeddings_manager,
+        persist_directory: str = settings.CHROMA_PERSIST_DIRECTORY,
+        batch_embedder=None,
+        backend: str = settings.VECTOR_STORE_BACKEND
+    ):
+        if backend not in self.SUPPORTED_BACKENDS:
+            raise ValueError(f"Backend do banco vetorial deve ser um de: {self.SUPPORTED_BACKENDS}")
+        
         self.embeddings_manager = embeddings_manager
+        self.batch_embedder = batch_embedder
         self.persist_directory = persist_directory
         self.collection_name = settings.CHROMA_COLLECTION_NAME
+        self.backend = backend
         self.vector_store = None
+        # Chroma continua sendo a fonte para ingestão; o índice NumPy atende as consultas
+        self.numpy_index: Optional[NumpyVectorIndex] = None
         
         # Cria diretório se não existir
         os.makedirs(persist_directory, exist_ok=True)
@@ -21,24 +43,57 @@ class VectorStoreManager:
     def create_vector_store(self, documents: List[Document]) -> Chroma:
         """Cria banco vetorial a partir dos documentos"""
         try:
-            print(f"Criando banco vetorial com {len(documents)} documentos...")
+            logger.info("Criando banco vetorial com %d documentos...", len(documents))
+            
+            # IDs estáveis permitem sincronizações incrementais posteriores
+            ids = None
+            if all('article_id' in doc.metadata for doc in documents):
+                documents, ids = self._dedupe_by_chunk_id(documents)
             
             self.vector_store = Chroma.from_documents(
                 documents=documents,
                 embedding=self.embeddings_manager.get_embeddings(),
+                ids=ids,
                 persist_directory=self.persist_directory,
                 collection_name=self.collection_name
             )
             
             # Persiste o banco
             self.vector_store.persist()
-            print("Banco vetorial criado e persistido com sucesso!")
+            self.refresh_index()
+            logger.info("Banco vetorial criado e persistido com sucesso!")
             
             return self.vector_store
             
         except Exception as e:
             raise Exception(f"Erro ao criar banco vetorial: {str(e)}")
     
+    def create_vector_store_from_batches(self, document_batches: Iterable[List[Document]]) -> Chroma:
+        """Cria/alimenta o banco vetorial a partir de lotes de documentos (memória limitada)"""
+        try:
+            if not self.vector_store:
+                self.load_vector_store()
+            
+            total = 0
+            for batch in document_batches:
+                batch, ids = self._dedupe_by_chunk_id(batch)
+                self.vector_store.add_documents(batch, ids=ids)
+                total += len(batch)
+            
+            logger.info("Banco vetorial alimentado com %d documentos em streaming.", total)
+            return self.vector_store
+            
+        except Exception as e:
+            raise Exception(f"Erro ao criar banco vetorial: {str(e)}")
+    
+    @staticmethod
+    def _dedupe_by_chunk_id(documents: List[Document]) -> Tuple[List[Document], List[str]]:
+        """Remove chunks com ID repetido (o Chroma rejeita IDs duplicados num mesmo envio)"""
+        positions = CSVDocumentProcessor.unique_chunk_positions(documents)
+        if len(positions) < len(documents):
+            logger.warning("%d chunks com ID repetido descartados (prevalece o primeiro)", len(documents) - len(positions))
+        return [documents[position] for position in positions.values()], list(positions)
+    
     def load_vector_store(self) -> Optional[Chroma]:
         """Carrega banco vetorial existente"""
         try:
@@ -48,17 +103,54 @@ class VectorStoreManager:
                     embedding_function=self.embeddings_manager.get_embeddings(),
                     collection_name=self.collection_name
                 )
-                print("Banco vetorial carregado com sucesso!")
+                logger.info("Banco vetorial carregado com sucesso!")
+                
+                if self.backend == "numpy":
+                    self._load_numpy_index()
+                
                 return self.vector_store
             else:
-                print("Banco vetorial não encontrado.")
+                logger.warning("Banco vetorial não encontrado.")
                 return None
         except Exception as e:
-            print(f"Erro ao carregar banco vetorial: {str(e)}")
+            logger.error("Erro ao carregar banco vetorial: %s", e)
             return None
     
+    def _load_numpy_index(self):
+        """Mapeia o índice NumPy, exportando-o da coleção Chroma se ainda não existir"""
+        index = NumpyVectorIndex(settings.NUMPY_INDEX_DIRECTORY)
+        if index.exists():
+            self.numpy_index = index.load()
+        else:
+            self.refresh_index()
+    
+    def refresh_index(self):
+        """Regera o índice NumPy a partir da coleção (após ingestões)"""
+        if self.backend != "numpy":
+            return
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+        
+        if self.vector_store._collection.count() == 0:
+            self.numpy_index = None
+            return
+        
+        self.numpy_index = NumpyVectorIndex.build_from_collection(
+            self.vector_store._collection,
+            settings.NUMPY_INDEX_DIRECTORY,
+            dtype=settings.NUMPY_INDEX_DTYPE
+        )
+        logger.info("Índice NumPy gerado com %d vetores.", len(self.numpy_index))
+    
+    def _numpy_results(self, hits: List[tuple]) -> List[tuple]:
+        results = [(self.numpy_index.get_document(position), score) for position, score in hits]
+        return [(doc, score) for doc, score in results if doc is not None]
+    
     def search_similar_documents(self, query: str, k: int = 5) -> List[Document]:
         """Busca documentos similares à consulta"""
+        if self.numpy_index is not None:
+            return [doc for doc, _ in self.search_with_scores(query, k=k)]
+        
         if not self.vector_store:
             raise Exception("Banco vetorial não inicializado")
         
@@ -70,17 +162,65 @@ class VectorStoreManager:
     
     def search_with_scores(self, query: str, k: int = 5) -> List[tuple]:
         """Busca documentos com scores de similaridade"""
+        if self.numpy_index is not None:
+            embedding = self.embeddings_manager.get_embeddings().embed_query(query)
+            return self.search_with_scores_by_vector(embedding, k=k)
+        
         if not self.vector_store:
             raise Exception("Banco vetorial não inicializado")
         
         try:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
+            with span("vector_search"):
+                results = self.vector_store.similarity_search_with_score(query, k=k)
             return results
         except Exception as e:
             raise Exception(f"Erro na busca com scores: {str(e)}")
+
+    def search_with_scores_by_vector(self, embedding: List[float], k: int = 5) -> List[tuple]:
+        """Busca documentos com scores a partir de um embedding já calculado"""
+        if self.numpy_index is not None:
+            with span("vector_search"):
+                return self._numpy_results(self.numpy_index.search(embedding, k=k))
+
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+
+        try:
+            with span("vector_search"):
+                return self.vector_store.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+        except Exception as e:
+            raise Exception(f"Erro na busca com scores: {str(e)}")
+
+    async def asearch_with_scores(self, query: str, k: int = 5) -> List[tuple]:
+        """Busca com scores usando o embedder em lote, quando disponível, no lugar de embed_query"""
+        if self.batch_embedder is None:
+            return await run_in_retrieval_pool(self.search_with_scores, query, k)
+
+        embedding = await self.batch_embedder.embed(query)
+        return await run_in_retrieval_pool(self.search_with_scores_by_vector, embedding, k)
+
+    def search_batch_with_scores(self, queries: List[str], k: int = 5) -> List[List[tuple]]:
+        """Busca várias consultas de uma vez (um encode em lote e uma busca vetorizada)"""
+        embeddings = self.embeddings_manager.get_embeddings().embed_documents(queries)
+        
+        if self.numpy_index is not None:
+            return [self._numpy_results(hits) for hits in self.numpy_index.search_batch(embeddings, k=k)]
+        
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+        
+        try:
+            return [self.search_with_scores_by_vector(embedding, k=k) for embedding in embeddings]
+        except Exception as e:
+            raise Exception(f"Erro na busca com scores: {str(e)}")
     
     def get_retriever(self, search_type: str = "similarity", k: int = 5):
         """Retorna retriever configurado"""
+        if self.numpy_index is not None:
+            if search_type != "similarity":
+                raise ValueError("Backend NumPy suporta apenas search_type='similarity'")
+            return NumpyIndexRetriever(manager=self, k=k)
+        
         if not self.vector_store:
             raise Exception("Banco vetorial não inicializado")
         
@@ -89,6 +229,58 @@ class VectorStoreManager:
             search_kwargs={"k": k}
         )
     
+    def get_chunk_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """Retorna metadados de todos os chunks indexados, por ID"""
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+        
+        result = self.vector_store._collection.get(include=["metadatas"])
+        return {
+            chunk_id: metadata or {}
+            for chunk_id, metadata in zip(result["ids"], result["metadatas"])
+        }
+    
+    def iter_stored_documents(self, page_size: int = 5000) -> Iterator[Tuple[str, Document]]:
+        """Percorre todos os chunks indexados, página a página"""
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+        
+        collection = self.vector_store._collection
+        for offset in range(0, collection.count(), page_size):
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                yield chunk_id, Document(page_content=text, metadata=metadata or {})
+    
+    def upsert_documents(self, documents: List[Document], ids: List[str], batch_size: int = settings.INGESTION_BATCH_SIZE):
+        """Insere ou atualiza documentos por ID (somente estes são re-embeddados)"""
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+        
+        for start in range(0, len(documents), batch_size):
+            self.vector_store.add_documents(
+                documents[start:start + batch_size],
+                ids=ids[start:start + batch_size]
+            )
+    
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]], batch_size: int = settings.INGESTION_BATCH_SIZE):
+        """Atualiza apenas metadados, sem recalcular embeddings"""
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+        
+        for start in range(0, len(ids), batch_size):
+            self.vector_store._collection.update(
+                ids=ids[start:start + batch_size],
+                metadatas=metadatas[start:start + batch_size]
+            )
+    
+    def delete_documents(self, ids: List[str], batch_size: int = settings.INGESTION_BATCH_SIZE):
+        """Remove documentos por ID"""
+        if not self.vector_store:
+            raise Exception("Banco vetorial não inicializado")
+        
+        for start in range(0, len(ids), batch_size):
+            self.vector_store.delete(ids=ids[start:start + batch_size])
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas da coleção"""
         if not self.vector_store:
@@ -99,10 +291,15 @@ class VectorStoreManager:
             collection = self.vector_store._collection
             count = collection.count()
             
-            return {
+            stats = {
                 "total_documents": count,
                 "collection_name": self.collection_name,
-                "persist_directory": self.persist_directory
+                "persist_directory": self.persist_directory,
+                "backend": self.backend
             }
+            if self.numpy_index is not None:
+                stats["numpy_index"] = self.numpy_index.get_stats()
+            
+            return stats
         except Exception as e:
             return {"error": str(e)}
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional
+from config.settings import settings
+from utils.logger import get_logger, get_logging_stats
+
+logger = get_logger("startup")
+
+
+class ResourceRegistry:
+    """Recursos pesados do processo (modelos, banco vetorial, clientes LLM, coordenador)
+
+    Criados uma única vez no lifespan da aplicação e injetados nos agentes, em vez de
+    cada módulo construir os seus na importação.
+    """
+
+    # Coletores de /metrics que referenciam componentes deste registro (removidos no shutdown)
+    RESOURCE_COLLECTORS = (
+        "embedding_cache", "embedding_batcher", "answer_cache", "retrieval_mode",
+        "single_flight", "llm_backends", "hf_http_pool", "startup_ms"
+    )
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        """Estado inicial: nenhum componente carregado"""
+        self.embeddings_manager = None
+        self.batch_embedder = None
+        self.vector_store_manager = None
+        self.knowledge_base = None
+        self.llama_client = None
+        self.hf_agent = None
+        self.coordinator = None
+        self.startup_timings: Dict[str, float] = {}
+        self.initialized = False
+
+    def _timed(self, component: str, factory):
+        """Executa factory() registrando quanto tempo o componente levou para iniciar"""
+        started = time.perf_counter()
+        result = factory()
+        self._record(component, started)
+        return result
+
+    def _record(self, component: str, started: float):
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.startup_timings[component] = elapsed_ms
+        logger.info("[startup] %s: %s ms", component, elapsed_ms)
+
+    async def initialize(self, warmup: bool = settings.STARTUP_WARMUP):
+        """Carrega todos os componentes (chamado uma vez no lifespan)"""
+        if self.initialized:
+            return
+
+        # Importações locais: carregar este módulo não deve carregar modelos
+        from rag.embeddings_manager import PortugueseEmbeddingsManager
+        from rag.batch_embedder import AsyncBatchEmbedder
+        from rag.vector_store import VectorStoreManager
+        from rag.rag_knowledge_base import KnowledgeBaseRAG
+        from models.llama3_client import Llama3Client
+        from agents.hf_agent import HFAgent
+        from agents.coordinator import AgentCoordinator
+        from utils.hf_client import hf_client
+
+        started = time.perf_counter()
+
+        self.embeddings_manager = self._timed("embeddings", PortugueseEmbeddingsManager)
+        if settings.EMBEDDING_BATCHING_ENABLED:
+            self.batch_embedder = AsyncBatchEmbedder(self.embeddings_manager)
+            await self.batch_embedder.start()
+
+        self.vector_store_manager = VectorStoreManager(self.embeddings_manager, batch_embedder=self.batch_embedder)
+        self.knowledge_base = KnowledgeBaseRAG(
+            embeddings_manager=self.embeddings_manager,
+            vector_store_manager=self.vector_store_manager,
+            batch_embedder=self.batch_embedder
+        )
+        # Banco vetorial, índice NumPy e índice BM25
+        self._timed("knowledge_base", self.knowledge_base.setup_knowledge_base)
+
+        llm_started = time.perf_counter()
+        self.llama_client = Llama3Client()
+        # Sessão HTTP compartilhada (pool de conexões keep-alive) dos backends remotos
+        if settings.LLM_BACKEND != "stub":
+            await hf_client.start()
+        self._record("llm_clients", llm_started)
+
+        self.hf_agent = self._timed(
+            "hf_agent", lambda: HFAgent(rag_engine=self.knowledge_base, llama_client=self.llama_client)
+        )
+        self.coordinator = self._timed("coordinator", lambda: AgentCoordinator(hf_agent=self.hf_agent))
+
+        if warmup:
+            await self._warmup()
+
+        self.initialized = True
+        self._record("total", started)
+        self._register_collectors()
+
+    def _register_collectors(self):
+        """Expõe em /metrics as estatísticas já mantidas por caches, pools e coalescência"""
+        from utils.hf_client import hf_client
+        from utils.session_store import session_store
+        from utils.metrics import metrics
+
+        metrics.register_collector("embedding_cache", self.embeddings_manager.get_cache_stats)
+        if self.batch_embedder is not None:
+            metrics.register_collector("embedding_batcher", self.batch_embedder.get_stats)
+        if self.hf_agent.answer_cache is not None:
+            metrics.register_collector("answer_cache", self.hf_agent.answer_cache.get_stats)
+        metrics.register_collector("retrieval_mode", self.knowledge_base.get_retrieval_stats)
+        metrics.register_collector("single_flight", self.coordinator.get_coalescing_stats)
+        metrics.register_collector("llm_backends", self.llama_client.get_stats)
+        metrics.register_collector("hf_http_pool", hf_client.get_pool_stats)
+        metrics.register_collector("sessions", session_store.get_stats)
+        metrics.register_collector("startup_ms", lambda: dict(self.startup_timings))
+        metrics.register_collector("logging", get_logging_stats)
+
+    async def _warmup(self):
+        """Consulta de aquecimento: primeira inferência do modelo, páginas do índice e tokenizer"""
+        started = time.perf_counter()
+        try:
+            result = await self.knowledge_base.aquery_knowledge_base(settings.STARTUP_WARMUP_QUERY)
+            self.hf_agent._assemble_context(result[0])
+        except Exception as e:
+            logger.warning("Falha na consulta de aquecimento: %s", e)
+        self._record("warmup", started)
+
+    async def shutdown(self):
+        """Libera os recursos que mantêm conexões ou tarefas em segundo plano"""
+        from utils.hf_client import hf_client
+        from utils.session_store import session_store
+        from utils.metrics import metrics
+
+        if self.batch_embedder is not None:
+            await self.batch_embedder.stop()
+        if self.embeddings_manager is not None:
+            self.embeddings_manager.query_cache.flush()
+        # Sessões descarregadas ainda na fila de gravação
+        await asyncio.get_running_loop().run_in_executor(None, session_store.flush)
+        await hf_client.close()
+
+        for prefix in self.RESOURCE_COLLECTORS:
+            metrics.unregister_collector(prefix)
+        # Referências liberadas: get_coordinator() volta a falhar e initialize() recarrega tudo
+        self._reset()
+
+    def get_coordinator(self):
+        """Coordenador compartilhado; exige que initialize() já tenha sido executado"""
+        if self.coordinator is None:
+            raise RuntimeError("Recursos não inicializados: o lifespan da aplicação ainda não executou")
+        return self.coordinator
+
+    def get_llm_client(self):
+        """Cliente de geração compartilhado pelos agentes"""
+        if self.llama_client is None:
+            raise RuntimeError("Recursos não inicializados: o lifespan da aplicação ainda não executou")
+        return self.llama_client
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'initialized': self.initialized,
+            'startup_timings_ms': dict(self.startup_timings)
+        }
+
+
+# Instância global do registro de recursos
+resource_registry = ResourceRegistry()
@@ -0,0 +1,122 @@
+import random
+import string
+import time
+
+# dentro de project -> python -m tests.keyword_matcher_benchmark
+from agents.keyword_matcher import KeywordMatcher, DEFAULT_KEYWORD_SETS
+
+CHAT_MESSAGES = [
+    "Quero saber sobre os benefícios do programa Hotmart Journey, como faço para ser elegível?",
+    "oi",
+    "Preciso falar com humano, o sistema não funciona!!!",
+    "Qual o meu tier e status no programa de stars?"
+]
+
+# Subcadeias que uma busca por palavras inteiras perderia
+SUBSTRING_MESSAGES = [
+    "quero reembolsos", "vários erros no app", "bugs no app", "urgentemente preciso",
+    "programas de benefícios", "Hotmart Journey???!!!", "debug", "bug crítico no erro grave"
+]
+
+
+def random_keyword(rng: random.Random) -> str:
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(rng.randint(1, 3))]
+    return " ".join(words)
+
+
+def build_message(rng: random.Random, keywords, length: int = 400) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        if rng.random() < 0.05:
+            words.append(rng.choice(keywords))
+        else:
+            words.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 8))))
+    return " ".join(words)
+
+
+def naive_score(message: str, keywords, weight: float = 0.2) -> float:
+    message_lower = message.lower()
+    score = 0.0
+    for keyword in keywords:
+        if keyword in message_lower:
+            score += weight
+    return min(score, 1.0)
+
+
+def check_default_sets(rng: random.Random, samples: int = 5000):
+    """Cada grupo padrão deve dar o mesmo resultado do laço `keyword in message` original"""
+    keywords = [k for config in DEFAULT_KEYWORD_SETS.values() for k in config["keywords"]]
+    alphabet = "".join(sorted(set("".join(keywords)))) + "ABCÉ?!."
+    # Pedaços de palavras-chave colados entre si geram sobreposições e prefixos
+    messages = CHAT_MESSAGES + SUBSTRING_MESSAGES + [
+        "".join(
+            rng.choice(keywords)[rng.randint(0, 3):] if rng.random() < 0.5
+            else "".join(rng.choices(alphabet, k=rng.randint(0, 4)))
+            for _ in range(rng.randint(1, 8))
+        )
+        for _ in range(samples)
+    ]
+
+    # Os conjuntos padrão usam o laço de `in`; a expressão é forçada para ser verificada também
+    regex_matcher = KeywordMatcher(cache_size=0)
+    regex_matcher.REGEX_MIN_PATTERNS = 0
+    regex_matcher.reload(DEFAULT_KEYWORD_SETS)
+
+    for matcher in (KeywordMatcher(cache_size=0), regex_matcher):
+        for message in messages:
+            found = matcher.find(message)
+            scores = matcher.score(message)
+            for group, config in DEFAULT_KEYWORD_SETS.items():
+                expected = [keyword for keyword in config["keywords"] if keyword in message.lower()]
+                assert sorted(found[group]) == sorted(expected), (group, message, found[group], expected)
+                expected_score = min(len(expected) * config["weight"], config.get("max_score", 1.0))
+                assert abs(scores[group] - expected_score) < 1e-9, (group, message)
+    print(f"Conjuntos padrão: {len(messages)} mensagens iguais à busca por subcadeia (laço e expressão)")
+
+
+def main():
+    rng = random.Random(42)
+    iterations = 2000
+    check_default_sets(rng)
+
+    print(f"{'padrões':>8} | {'naive (µs)':>11} | {'matcher (µs)':>12} | {'speedup':>8}")
+    print("-" * 50)
+
+    for size in (10, 100, 1000, 5000, 10000):
+        keywords = list({random_keyword(rng) for _ in range(size)})
+        # Cache desativado para medir apenas a varredura
+        matcher = KeywordMatcher({"bench": {"keywords": keywords, "weight": 0.2}}, cache_size=0)
+        messages = [build_message(rng, keywords) for _ in range(iterations)]
+
+        started = time.perf_counter()
+        expected = [naive_score(message, keywords) for message in messages]
+        naive_us = (time.perf_counter() - started) / iterations * 1e6
+
+        started = time.perf_counter()
+        found = [matcher.score(message)["bench"] for message in messages]
+        matcher_us = (time.perf_counter() - started) / iterations * 1e6
+
+        assert all(abs(a - b) < 1e-9 for a, b in zip(expected, found)), "resultados divergentes"
+        print(f"{len(keywords):>8} | {naive_us:>11.1f} | {matcher_us:>12.1f} | {naive_us / matcher_us:>7.1f}x")
+
+    # Conjuntos reais de palavras-chave sobre mensagens de chat curtas
+    keywords = sorted({k.lower() for config in DEFAULT_KEYWORD_SETS.values() for k in config["keywords"]})
+    matcher = KeywordMatcher(cache_size=0)
+    messages = CHAT_MESSAGES * (iterations // len(CHAT_MESSAGES))
+
+    started = time.perf_counter()
+    for message in messages:
+        message_lower = message.lower()
+        [keyword for keyword in keywords if keyword in message_lower]
+    naive_us = (time.perf_counter() - started) / len(messages) * 1e6
+
+    started = time.perf_counter()
+    for message in messages:
+        matcher.find_pattern_ids(message)
+    matcher_us = (time.perf_counter() - started) / len(messages) * 1e6
+
+    print(f"{'padrão':>8} | {naive_us:>11.1f} | {matcher_us:>12.1f} | {naive_us / matcher_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
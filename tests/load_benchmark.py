@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from aiohttp import web
+
+# dentro de project -> python -m tests.load_benchmark --rps 10 --duration 30 --output resultados.json
+# Sobe a aplicação no próprio processo (lifespan incluso) e troca o endpoint de inferência
+# do Hugging Face por um stub local com latência e tokens/s configuráveis.
+
+DEFAULT_MESSAGES = [
+    "O que é o Hotmart Journey?",
+    "Como faço para criar um produto?",
+    "Quais formas de pagamento estão disponíveis?",
+    "Como funciona o saque dos valores recebidos?",
+    "Como configuro meu programa de afiliados?",
+    "Onde vejo o relatório das minhas vendas?"
+]
+
+STUB_WORDS = "Para resolver isso acesse a sua conta na Hotmart e siga as instruções da central de ajuda".split()
+
+_EVENT_LINE = re.compile(r'^chat_events_total\{event="([^"]+)"\} ([0-9.eE+-]+)$')
+
+
+class InferenceStub:
+    """Servidor compatível com /v1/chat/completions (com e sem streaming)
+
+    Espera `latency_ms` antes do primeiro token e depois gera `tokens_per_second`.
+    Roda em uma thread com event loop próprio para não disputar o loop da aplicação.
+    """
+
+    def __init__(self, latency_ms: float = 300.0, tokens_per_second: float = 50.0, response_tokens: int = 50):
+        self.latency = latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.url: Optional[str] = None
+        self.requests = 0
+        self._loop = asyncio.new_event_loop()
+        self._runner: Optional[web.AppRunner] = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def _tokens(self, max_tokens: int) -> List[str]:
+        count = min(max_tokens, self.response_tokens)
+        return [STUB_WORDS[i % len(STUB_WORDS)] + " " for i in range(count)]
+
+    @staticmethod
+    def _envelope(obj: str, choice: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": "stub",
+            "object": obj,
+            "created": int(time.time()),
+            "model": "stub",
+            "system_fingerprint": "stub",
+            "choices": [choice]
+        }
+
+    async def _chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        tokens = self._tokens(body.get("max_tokens") or self.response_tokens)
+        await asyncio.sleep(self.latency)
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            payload = self._envelope("chat.completion", {
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "length",
+                "logprobs": None
+            })
+            payload["usage"] = {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            return web.json_response(payload)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = self._envelope("chat.completion.chunk", {
+                "index": 0,
+                "delta": {"role": "assistant", "content": token},
+                "finish_reason": None,
+                "logprobs": None
+            })
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def _start(self, host: str, port: int) -> str:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        return f"http://{bound_host}:{bound_port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._thread.start()
+        self.url = asyncio.run_coroutine_threadsafe(self._start(host, port), self._loop).result()
+        return self.url
+
+    def stop(self):
+        if self._runner is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil pelo método nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(-(-q * len(ordered) // 100)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(max(values), 2) if values else 0.0
+    }
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """"routing;dur=1.2, llm_call;dur=310.5" -> {"routing": 1.2, "llm_call": 310.5}"""
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, params = entry.partition(";")
+        match = re.search(r"dur=([0-9.]+)", params)
+        if match:
+            stages[name] = float(match.group(1))
+    return stages
+
+
+def parse_events(metrics_text: str) -> Dict[str, float]:
+    events = {}
+    for line in metrics_text.splitlines():
+        match = _EVENT_LINE.match(line)
+        if match:
+            events[match.group(1)] = float(match.group(2))
+    return events
+
+
+class LoadGenerator:
+    """Dispara requisições a /chat em taxa fixa (malha aberta) ou concorrência fixa (malha fechada)"""
+
+    def __init__(
+        self, client, path: str, messages: List[str], unique: bool = True, sessions: int = 0, background_every: int = 0
+    ):
+        self.client = client
+        self.path = path
+        self.messages = messages
+        self.unique = unique
+        self.sessions = sessions
+        self.background_every = background_every
+        self.samples: List[Dict[str, Any]] = []
+
+    def _payload(self, index: int) -> Dict[str, Any]:
+        message = self.messages[index % len(self.messages)]
+        if self.unique:
+            # Evita a coalescência de perguntas iguais (o cache semântico é desativado em main)
+            message = f"{message} (#{index})"
+        payload = {"message": message}
+        if self.sessions:
+            payload["session_id"] = f"bench-{index % self.sessions}"
+        if self.is_background(index):
+            payload["background"] = True
+        return payload
+
+    def is_background(self, index: int) -> bool:
+        """A cada N requisições, uma é não interativa e cede a vez no LLM"""
+        return bool(self.background_every) and index % self.background_every == self.background_every - 1
+
+    async def _send(self, index: int, scheduled: float):
+        loop = asyncio.get_running_loop()
+        sample: Dict[str, Any] = {"index": index, "ok": False, "stages": {}, "background": self.is_background(index)}
+        try:
+            response = await self.client.post(self.path, json=self._payload(index))
+            sample["status"] = response.status_code
+            sample["stages"] = parse_server_timing(response.headers.get("server-timing", ""))
+            if response.status_code == 200:
+                agent = response.json().get("agent_used")
+                sample["agent"] = agent
+                sample["ok"] = agent != "error_handler"
+        except Exception as e:
+            sample["status"] = 0
+            sample["error"] = type(e).__name__
+        # Latência a partir do horário agendado: atrasos do gerador também contam
+        sample["latency_ms"] = (loop.time() - scheduled) * 1000
+        self.samples.append(sample)
+
+    async def run_rate(self, rps: float, duration: float):
+        loop = asyncio.get_running_loop()
+        interval = 1 / rps
+        started = loop.time()
+        tasks = []
+        index = 0
+        while index * interval < duration:
+            scheduled = started + index * interval
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._send(index, scheduled)))
+            index += 1
+        await asyncio.gather(*tasks)
+
+    async def run_concurrency(self, concurrency: int, duration: float):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        counter = iter(range(10 ** 9))
+
+        async def worker():
+            while loop.time() < deadline:
+                await self._send(next(counter), loop.time())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def build_report(samples: List[Dict[str, Any]], elapsed: float, events_delta: Dict[str, float]) -> Dict[str, Any]:
+    ok = [s for s in samples if s["ok"]]
+    stage_values: Dict[str, List[float]] = {}
+    for sample in ok:
+        for name, duration in sample["stages"].items():
+            stage_values.setdefault(name, []).append(duration)
+
+    status_counts: Dict[str, int] = {}
+    for sample in samples:
+        key = sample.get("error") or str(sample["status"])
+        status_counts[key] = status_counts.get(key, 0) + 1
+
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize([s["latency_ms"] for s in ok]),
+        # Só com --background-every: quanto as conversas ganham ao passar à frente na fila do LLM
+        "latency_by_priority": {
+            name: summarize([s["latency_ms"] for s in ok if s["background"] == background])
+            for name, background in (("interactive", False), ("background", True))
+        } if any(s["background"] for s in samples) else {},
+        "stages": {name: summarize(values) for name, values in sorted(stage_values.items())},
+        "status": status_counts,
+        # Requisições que não chegaram ao LLM: os percentis acima só valem para o caminho completo se forem poucas
+        "short_circuited": {
+            "answer_cache_hits": int(events_delta.get("answer_cache_hit", 0)),
+            "single_flight_shared": int(events_delta.get("single_flight_shared", 0)),
+            "share_of_requests": round(
+                (events_delta.get("answer_cache_hit", 0) + events_delta.get("single_flight_shared", 0)) / len(samples), 4
+            ) if samples else 0.0
+        },
+        # Erros e fallbacks por etapa (llm_error, retrieval_*, coordinator_error_fallback...)
+        "events": {name: value for name, value in sorted(events_delta.items()) if value}
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\nRequisições: {report['requests']} | sucesso: {report['succeeded']} | "
+          f"erro: {report['error_rate']:.2%} | vazão: {report['throughput_rps']} req/s")
+    print(f"\n{'etapa':<22} | {'n':>6} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'p99 (ms)':>9}")
+    print("-" * 66)
+    rows = [("total", report["latency"])] + list(report["stages"].items())
+    for name, stats in rows:
+        print(f"{name:<22} | {stats['count']:>6} | {stats['p50_ms']:>9.1f} | {stats['p95_ms']:>9.1f} | {stats['p99_ms']:>9.1f}")
+    for name, stats in report["latency_by_priority"].items():
+        print(f"{name:<22} | {stats['count']:>6} | {stats['p50_ms']:>9.1f} | {stats['p95_ms']:>9.1f} | {stats['p99_ms']:>9.1f}")
+    short = report["short_circuited"]
+    print(f"\nSem passar pelo LLM: cache de respostas={short['answer_cache_hits']}, "
+          f"coalescidas={short['single_flight_shared']} ({short['share_of_requests']:.1%} das requisições)")
+    if report["events"]:
+        print("\nEventos:", ", ".join(f"{name}={int(value)}" for name, value in report["events"].items()))
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    # Importações após configurar o ambiente: as settings são lidas na importação
+    import httpx
+    from main import app
+    from config.settings import settings
+
+    transport = httpx.ASGITransport(app=app)
+    # O ASGITransport não executa o lifespan: ele é aberto aqui, como faria o uvicorn
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=args.timeout) as client:
+            path = f"/api/{settings.API_VERSION}/chat"
+            generator = LoadGenerator(
+                client, path, DEFAULT_MESSAGES,
+                unique=not args.repeat, sessions=args.sessions, background_every=args.background_every
+            )
+
+            # Aquecimento não é conversa de usuário: vai com prioridade de segundo plano
+            for index in range(args.warmup):
+                await client.post(path, json={**generator._payload(-index - 1), "background": True})
+
+            events_before = parse_events((await client.get("/metrics")).text)
+            started = time.perf_counter()
+            if args.concurrency:
+                await generator.run_concurrency(args.concurrency, args.duration)
+            else:
+                await generator.run_rate(args.rps, args.duration)
+            elapsed = time.perf_counter() - started
+            events_after = parse_events((await client.get("/metrics")).text)
+
+    events_delta = {name: value - events_before.get(name, 0.0) for name, value in events_after.items()}
+    return build_report(generator.samples, elapsed, events_delta)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de carga de /api/v1/chat com LLM simulado")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, default=5.0, help="Taxa fixa de chegada (malha aberta)")
+    mode.add_argument("--concurrency", type=int, default=0, help="Usuários simultâneos (malha fechada)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duração da medição em segundos")
+    parser.add_argument("--warmup", type=int, default=3, help="Requisições descartadas antes da medição")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--repeat", action="store_true",
+        help="Repete as mensagens padrão com o cache de respostas ativo (mede acertos de cache e coalescência)"
+    )
+    parser.add_argument("--sessions", type=int, default=0, help="Quantidade de session_id distintos")
+    parser.add_argument(
+        "--background-every", type=int, default=0,
+        help="Envia 1 a cada N requisições com prioridade de segundo plano (0 = todas interativas)"
+    )
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0, help="Tempo até o primeiro token")
+    parser.add_argument("--stub-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--stub-response-tokens", type=int, default=50)
+    parser.add_argument("--output", default="load_benchmark.json", help="Arquivo JSON com os resultados")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    stub = InferenceStub(args.stub_latency_ms, args.stub_tokens_per_second, args.stub_response_tokens)
+    os.environ["LLM_BACKEND"] = "openai"
+    os.environ["LLM_ENDPOINT_URL"] = stub.start()
+    os.environ["SERVER_TIMING_HEADER"] = "true"
+    os.environ.setdefault("STARTUP_WARMUP", "false")
+    if not args.repeat:
+        # Mensagens distintas só diferem pelo sufixo: o cache semântico ainda as consideraria iguais
+        os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+
+    try:
+        report = asyncio.run(run_benchmark(args))
+    finally:
+        stub.stop()
+
+    report["config"] = {
+        "mode": "concurrency" if args.concurrency else "rps",
+        "rps": None if args.concurrency else args.rps,
+        "concurrency": args.concurrency or None,
+        "duration_s": args.duration,
+        "unique_messages": not args.repeat,
+        "sessions": args.sessions,
+        "background_every": args.background_every,
+        "stub": {
+            "latency_ms": args.stub_latency_ms,
+            "tokens_per_second": args.stub_tokens_per_second,
+            "response_tokens": args.stub_response_tokens,
+            "requests": stub.requests
+        }
+    }
+    report["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    print_report(report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,8 +14,8 @@ def main():
     # Exibe fontes se disponíveis
     for i, doc in enumerate(result[0][:3], 1):
         print(f"  {i}. {doc['article_name']}")
-        if doc.get('similarity_score'):
-            print(f"     Similaridade: {doc['similarity_score']:.3f}")   
+        if doc.get('relevance_score') is not None:
+            print(f"     Relevância: {doc['relevance_score']:.3f} ({doc['score_type']}: {doc['raw_score']:.3f})")   
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+# dentro de project -> python -m tests.retrieval_benchmark --sizes 10000,100000 --output retrieval.json
+from rag.numpy_index import NumpyVectorIndex
+from rag.vector_store import VectorStoreManager
+from rag.rag_knowledge_base import KnowledgeBaseRAG
+
+# Backends e conjuntos de parâmetros comparados
+BACKEND_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "numpy-float32": {"backend": "numpy", "dtype": "float32"},
+    "numpy-float16": {"backend": "numpy", "dtype": "float16"},
+    "chroma-default": {"backend": "chroma", "hnsw": {}},
+    "chroma-m32-ef128": {"backend": "chroma", "hnsw": {"hnsw:M": 32, "hnsw:construction_ef": 200, "hnsw:search_ef": 128}}
+}
+
+BLOCK_ROWS = 50000
+CHUNKS_PER_ARTICLE = 10
+
+
+class SyntheticCorpus:
+    """Vetores normalizados agrupados em clusters (gravados em disco) e consultas próximas a eles"""
+
+    def __init__(self, directory: str, size: int, dim: int, num_queries: int, seed: int = 42):
+        rng = np.random.default_rng(seed)
+        clusters = max(size // 200, 16)
+        centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+
+        self.size = size
+        self.vectors = np.lib.format.open_memmap(
+            os.path.join(directory, f"corpus_{size}.npy"), mode="w+", dtype=np.float32, shape=(size, dim)
+        )
+        for start in range(0, size, BLOCK_ROWS):
+            count = min(BLOCK_ROWS, size - start)
+            block = centroids[rng.integers(0, clusters, count)] + rng.standard_normal((count, dim)).astype(np.float32)
+            self.vectors[start:start + count] = self._normalize(block)
+        self.vectors.flush()
+
+        # Consultas: pontos do corpus com ruído, para que os vizinhos exatos sejam significativos
+        base = np.asarray(self.vectors[rng.integers(0, size, num_queries)])
+        self.queries = self._normalize(base + 0.5 * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(dim))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    @staticmethod
+    def text(row: int) -> str:
+        return f"chunk {row}"
+
+    @staticmethod
+    def metadata(row: int) -> Dict[str, Any]:
+        return {
+            "article_id": row // CHUNKS_PER_ARTICLE,
+            "chunk_index": row % CHUNKS_PER_ARTICLE,
+            "article_name": f"Artigo {row // CHUNKS_PER_ARTICLE}",
+            "article_url": f"synthetic://{row}",
+            "row": row
+        }
+
+    def ground_truth(self, k: int) -> np.ndarray:
+        """Top-k exato por força bruta, bloco a bloco (consultas x k)"""
+        best_rows = np.empty((len(self.queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(self.queries), 0), dtype=np.float32)
+
+        for start in range(0, self.size, BLOCK_ROWS):
+            scores = self.queries @ np.asarray(self.vectors[start:start + BLOCK_ROWS]).T
+            rows = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            top = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+
+        return best_rows
+
+    def documents(self, batch_size: int = 5000):
+        for start in range(0, self.size, batch_size):
+            yield [
+                Document(page_content=self.text(row), metadata=self.metadata(row))
+                for row in range(start, min(start + batch_size, self.size))
+            ]
+
+
+class SyntheticCollection:
+    """Interface mínima de coleção Chroma usada por NumpyVectorIndex.build_from_collection"""
+
+    def __init__(self, corpus: SyntheticCorpus):
+        self.corpus = corpus
+
+    def count(self) -> int:
+        return self.corpus.size
+
+    def get(self, include=None, limit: int = 5000, offset: int = 0) -> Dict[str, Any]:
+        rows = range(offset, min(offset + limit, self.corpus.size))
+        return {
+            "ids": [f"{row // CHUNKS_PER_ARTICLE}-{row % CHUNKS_PER_ARTICLE}" for row in rows],
+            "embeddings": np.array(self.corpus.vectors[rows.start:rows.stop]),
+            "documents": [self.corpus.text(row) for row in rows],
+            "metadatas": [self.corpus.metadata(row) for row in rows]
+        }
+
+
+class SyntheticEmbeddings(Embeddings):
+    """Devolve os vetores pré-gerados a partir do texto ("chunk N" ou "query N")"""
+
+    def __init__(self, corpus: SyntheticCorpus):
+        self.corpus = corpus
+
+    def _lookup(self, text: str) -> List[float]:
+        kind, _, number = text.partition(" ")
+        vectors = self.corpus.queries if kind == "query" else self.corpus.vectors
+        return np.asarray(vectors[int(number)]).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._lookup(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._lookup(text)
+
+
+class SyntheticEmbeddingsManager:
+    """Substitui o PortugueseEmbeddingsManager: nenhuma inferência entra na medição"""
+
+    def __init__(self, corpus: SyntheticCorpus):
+        self._embeddings = SyntheticEmbeddings(corpus)
+
+    def get_embeddings(self) -> Embeddings:
+        return self._embeddings
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(int(-(-q * len(ordered) // 100)), 1) - 1] if ordered else 0.0
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = [s * 1000 for s in seconds]
+    total = sum(seconds)
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "qps": round(len(seconds) / total, 1) if total else 0.0
+    }
+
+
+def recall_at_k(retrieved: List[List[int]], truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(rows[:k]) & set(truth[i, :k].tolist())) for i, rows in enumerate(retrieved))
+    return round(hits / (len(retrieved) * k), 4)
+
+
+def rss_bytes() -> int:
+    """Memória residente atual (Linux) ou o pico, onde /proc não existe"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def build_manager(name: str, config: Dict[str, Any], corpus: SyntheticCorpus, directory: str) -> VectorStoreManager:
+    embeddings_manager = SyntheticEmbeddingsManager(corpus)
+    manager = VectorStoreManager(embeddings_manager, persist_directory=directory, backend=config["backend"])
+
+    if config["backend"] == "numpy":
+        manager.numpy_index = NumpyVectorIndex.build_from_collection(
+            SyntheticCollection(corpus), os.path.join(directory, "numpy_index"), dtype=config["dtype"]
+        )
+    else:
+        from langchain_community.vectorstores import Chroma
+        manager.vector_store = Chroma(
+            collection_name=manager.collection_name,
+            embedding_function=embeddings_manager.get_embeddings(),
+            persist_directory=directory,
+            collection_metadata=config["hnsw"] or None
+        )
+        manager.create_vector_store_from_batches(corpus.documents())
+    return manager
+
+
+def measure(name: str, config: Dict[str, Any], corpus: SyntheticCorpus, truth: np.ndarray, args) -> Dict[str, Any]:
+    directory = tempfile.mkdtemp(prefix=f"{name}_", dir=args.workdir)
+    queries = [f"query {i}" for i in range(len(corpus.queries))]
+    k = args.k
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    manager = build_manager(name, config, corpus, directory)
+    build_s = time.perf_counter() - started
+
+    # Consulta única, direto no VectorStoreManager
+    latencies, retrieved = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results = manager.search_with_scores(query, k=k)
+        latencies.append(time.perf_counter() - started)
+        retrieved.append([doc.metadata["row"] for doc, _ in results])
+
+    # Consultas em lote (um encode e uma busca por lote)
+    batched = {}
+    for batch_size in args.batch_sizes:
+        elapsed = 0.0
+        for start in range(0, len(queries), batch_size):
+            started = time.perf_counter()
+            manager.search_batch_with_scores(queries[start:start + batch_size], k=k)
+            elapsed += time.perf_counter() - started
+        batched[str(batch_size)] = {
+            "per_query_ms": round(elapsed / len(queries) * 1000, 3),
+            "qps": round(len(queries) / elapsed, 1)
+        }
+
+    # Caminho completo da base de conhecimento (sem índice BM25: busca vetorial pura)
+    knowledge_base = KnowledgeBaseRAG(
+        embeddings_manager=manager.embeddings_manager,
+        vector_store_manager=manager
+    )
+    kb_latencies, kb_retrieved = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results = knowledge_base.query_knowledge_base(query, k=k)[0]
+        kb_latencies.append(time.perf_counter() - started)
+        kb_retrieved.append([int(r["article_url"].rpartition("/")[2]) for r in results])
+
+    report = {
+        "backend": name,
+        "params": {key: value for key, value in config.items() if key != "backend"},
+        "corpus_size": corpus.size,
+        "build_s": round(build_s, 2),
+        "disk_bytes": directory_bytes(directory),
+        "rss_delta_bytes": rss_bytes() - rss_before,
+        f"recall@{k}": recall_at_k(retrieved, truth, k),
+        "single_query": latency_summary(latencies),
+        "batched": batched,
+        "knowledge_base": {f"recall@{k}": recall_at_k(kb_retrieved, truth, k), **latency_summary(kb_latencies)}
+    }
+
+    del knowledge_base, manager
+    shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+def print_row(report: Dict[str, Any], k: int):
+    single = report["single_query"]
+    print(
+        f"{report['corpus_size']:>9} | {report['backend']:<17} | {report[f'recall@{k}']:>8.3f} | "
+        f"{single['p50_ms']:>8.2f} | {single['p99_ms']:>8.2f} | {single['qps']:>8.1f} | "
+        f"{report['build_s']:>8.1f} | {report['disk_bytes'] / 2 ** 20:>9.1f}"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperação: recall@k, latência e custo de índice")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Tamanhos do corpus (chunks)")
+    parser.add_argument("--dim", type=int, default=384, help="Dimensão dos vetores (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--batch-sizes", default="8,32,128")
+    parser.add_argument("--backends", default=",".join(BACKEND_CONFIGS), help="Subconjunto de: " + ", ".join(BACKEND_CONFIGS))
+    parser.add_argument("--chroma-max-size", type=int, default=100000, help="Acima disso o Chroma é ignorado")
+    parser.add_argument("--workdir", default=None, help="Diretório temporário (padrão: do sistema)")
+    parser.add_argument("--output", default="retrieval_benchmark.json")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    args.batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    args.backends = [name for name in args.backends.split(",") if name]
+    return args
+
+
+def main():
+    args = parse_args()
+    unknown = set(args.backends) - set(BACKEND_CONFIGS)
+    if unknown:
+        raise SystemExit(f"Backends desconhecidos: {sorted(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="retrieval_benchmark_", dir=args.workdir)
+    args.workdir = workdir
+    results: List[Dict[str, Any]] = []
+    skipped: List[Dict[str, Any]] = []
+
+    print(f"{'chunks':>9} | {'backend':<17} | {'recall@' + str(args.k):>8} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | "
+          f"{'qps':>8} | {'build (s)':>8} | {'disco (MB)':>9}")
+    print("-" * 100)
+
+    try:
+        for size in args.sizes:
+            corpus = SyntheticCorpus(workdir, size, args.dim, args.queries)
+            truth = corpus.ground_truth(args.k)
+
+            for name in args.backends:
+                config = BACKEND_CONFIGS[name]
+                if config["backend"] == "chroma" and size > args.chroma_max_size:
+                    skipped.append({"backend": name, "corpus_size": size, "reason": "acima de --chroma-max-size"})
+                    continue
+                try:
+                    report = measure(name, config, corpus, truth, args)
+                except Exception as e:
+                    skipped.append({"backend": name, "corpus_size": size, "reason": str(e)})
+                    print(f"{size:>9} | {name:<17} | falhou: {e}")
+                    continue
+                results.append(report)
+                print_row(report, args.k)
+
+            del corpus, truth
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"dim": args.dim, "queries": args.queries, "k": args.k, "batch_sizes": args.batch_sizes},
+        "results": results,
+        "skipped": skipped
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
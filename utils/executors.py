@@ -0,0 +1,19 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import settings
+
+# Pool limitado para trabalho bloqueante do caminho de requisição (embedding, busca vetorial)
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=settings.RETRIEVAL_WORKERS,
+    thread_name_prefix="retrieval"
+)
+
+
+async def run_in_retrieval_pool(func, *args, **kwargs):
+    """Executa função síncrona no pool de recuperação sem bloquear o event loop"""
+    loop = asyncio.get_running_loop()
+    # Copia o contexto para que os spans da thread entrem no trace da requisição
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(retrieval_executor, functools.partial(context.run, func, *args, **kwargs))
@@ -1,32 +1,173 @@
 import aiohttp
 import asyncio
-from typing import Dict, Any, Optional
-from project.config.settings import settings
+from typing import Dict, Any, Optional, AsyncIterator
+from config.settings import settings
 import json
 
+
+class HFHTTPError(Exception):
+    """Resposta HTTP diferente de 200; `status` permite classificar a falha (429/5xx são repetidas)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status} - {message}")
+        self.status = status
+
+
 class HuggingFaceClient:
-    """Cliente para API do Hugging Face"""
+    """Cliente para API do Hugging Face (sessão HTTP única com pool de conexões)
+
+    A mesma sessão atende os backends de geração (API hospedada e servidores
+    compatíveis com OpenAI): URL e autenticação vão em cada requisição.
+    """
 
     def __init__(self):
         self.api_key = settings.HUGGINGFACE_API_KEY
         self.model = settings.HUGGINGFACE_MODEL
         self.base_url = settings.HUGGINGFACE_BASE_URL
 
-        if not self.api_key:
-            raise ValueError("HUGGINGFACE_API_KEY não configurada")
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._start_lock = asyncio.Lock()
+        self.total_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def start(self):
+        """Cria a sessão compartilhada (chamado no lifespan da aplicação)"""
+        async with self._start_lock:
+            if self._session is not None and not self._session.closed:
+                return
+
+            self._connector = aiohttp.TCPConnector(
+                limit=settings.HF_HTTP_POOL_LIMIT,
+                limit_per_host=settings.HF_HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=settings.HF_HTTP_KEEPALIVE_TIMEOUT,
+                use_dns_cache=True,
+                ttl_dns_cache=settings.HF_HTTP_DNS_CACHE_TTL
+            )
+            self._session = aiohttp.ClientSession(
+                connector=self._connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    connect=settings.HF_HTTP_CONNECT_TIMEOUT,
+                    sock_read=settings.HF_HTTP_READ_TIMEOUT
+                ),
+                headers={"Content-Type": "application/json"}
+            )
+
+    async def close(self):
+        """Fecha a sessão e as conexões mantidas no pool"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._connector = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Retorna utilização do pool de conexões"""
+        connector = self._connector
+        if connector is None or connector.closed:
+            return {"active": False, "total_requests": self.total_requests}
+
+        acquired = len(getattr(connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return {
+            "active": True,
+            "limit": connector.limit,
+            "limit_per_host": connector.limit_per_host,
+            "connections_in_use": acquired,
+            "connections_idle": idle,
+            "utilization": acquired / connector.limit if connector.limit else 0.0,
+            "in_flight_requests": self.in_flight,
+            "max_in_flight_requests": self.max_in_flight,
+            "total_requests": self.total_requests
+        }
+
+    def _request_started(self):
+        self.total_requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    @staticmethod
+    def _headers(api_key: Optional[str]) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    @staticmethod
+    async def _raise_for_status(response: aiohttp.ClientResponse):
+        if response.status != 200:
+            error_text = await response.text()
+            raise HFHTTPError(response.status, error_text[:500])
+
+    async def chat_completion(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        api_key: Optional[str] = None
+    ) -> str:
+        """POST em /v1/chat/completions; devolve o texto da primeira escolha"""
+        session = await self._get_session()
+        self._request_started()
+        try:
+            async with session.post(url, json={**payload, "stream": False}, headers=self._headers(api_key)) as response:
+                await self._raise_for_status(response)
+                result = await response.json()
+                return result["choices"][0]["message"].get("content") or ""
+        finally:
+            self.in_flight -= 1
+
+    async def open_chat_stream(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        api_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Abre o stream (SSE) e devolve o iterador de tokens; a conexão volta ao pool ao final"""
+        session = await self._get_session()
+        self._request_started()
+        response = None
+        try:
+            response = await session.post(url, json={**payload, "stream": True}, headers=self._headers(api_key))
+            await self._raise_for_status(response)
+        except BaseException:
+            if response is not None:
+                response.release()
+            self.in_flight -= 1
+            raise
+        return self._stream_tokens(response)
+
+    async def _stream_tokens(self, response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+        try:
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:"):].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if not chunk.get("choices"):
+                    continue
+                token = chunk["choices"][0].get("delta", {}).get("content")
+                if token:
+                    yield token
+        finally:
+            response.release()
+            self.in_flight -= 1
 
     async def generate_text(
-        self, 
-        prompt: str, 
+        self,
+        prompt: str,
         max_length: int = 512,
         temperature: float = 0.7,
         top_p: float = 0.9
     ) -> str:
         """Gerar texto usando o modelo Llama"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        if not self.api_key:
+            raise ValueError("HUGGINGFACE_API_KEY não configurada")
 
         payload = {
             "inputs": prompt,
@@ -41,9 +182,12 @@ class HuggingFaceClient:
 
         url = f"{self.base_url}/models/{self.model}"
 
-        async with aiohttp.ClientSession() as session:
+        session = await self._get_session()
+        self._request_started()
+
+        try:
             try:
-                async with session.post(url, headers=headers, json=payload) as response:
+                async with session.post(url, json=payload, headers=self._headers(self.api_key)) as response:
                     if response.status == 200:
                         result = await response.json()
                         if isinstance(result, list) and len(result) > 0:
@@ -56,6 +200,8 @@ class HuggingFaceClient:
                 raise Exception("Timeout na requisição para Hugging Face")
             except Exception as e:
                 raise Exception(f"Erro ao conectar com Hugging Face: {str(e)}")
+        finally:
+            self.in_flight -= 1
 
     async def health_check(self) -> bool:
         """Verificar se a API está funcionando"""
@@ -66,4 +212,4 @@ class HuggingFaceClient:
             return False
 
 # Instância global do cliente
-hf_client = HuggingFaceClient()
\ No newline at end of file
+hf_client = HuggingFaceClient()
@@ -0,0 +1,176 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+from typing import Dict, Any, Optional, Tuple
+from config.settings import settings
+
+ROOT_LOGGER = "hotmart"
+
+# Tokens de data no estilo do LOG_FORMAT (loguru) e seus equivalentes em strftime
+_DATE_TOKENS = (("YYYY", "%Y"), ("MM", "%m"), ("DD", "%d"), ("HH", "%H"), ("mm", "%M"), ("ss", "%S"))
+_TIME_PATTERN = re.compile(r"\{time(?::([^}]*))?\}")
+_FIELD_ALIASES = {"{level}": "{levelname}", "{name}": "{name}", "{message}": "{message}"}
+
+
+def convert_log_format(log_format: str) -> Tuple[str, Optional[str]]:
+    """Converte o LOG_FORMAT (ex.: "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}") para o logging"""
+    datefmt = None
+    match = _TIME_PATTERN.search(log_format)
+    if match and match.group(1):
+        datefmt = match.group(1)
+        for token, directive in _DATE_TOKENS:
+            datefmt = datefmt.replace(token, directive)
+
+    converted = _TIME_PATTERN.sub("{asctime}", log_format)
+    for alias, field in _FIELD_ALIASES.items():
+        converted = converted.replace(alias, field)
+    return converted, datefmt
+
+
+class Truncated:
+    """Adia e limita a formatação de payloads grandes (prompts, respostas)
+
+    Só é convertido em texto se o registro passar pelo nível e pela amostragem.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = settings.LOG_MAX_PAYLOAD_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = str(self.value)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}... [+{len(text) - self.limit} caracteres]"
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    """Amostragem por categoria; avisos e erros nunca são descartados"""
+
+    def __init__(self, sample_rates: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.sampled_out = 0
+
+    def _rate(self, logger_name: str) -> float:
+        category = logger_name[len(ROOT_LOGGER) + 1:] if logger_name.startswith(ROOT_LOGGER + ".") else logger_name
+        # Categoria mais específica primeiro: "llm.prompt" antes de "llm"
+        while category:
+            if category in self.sample_rates:
+                return self.sample_rates[category]
+            category = category.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enfileira sem bloquear: com a fila cheia o registro é descartado e contabilizado
+
+    O registro vai para a fila sem formatação; mensagem, argumentos e traceback são
+    formatados na thread de escrita, fora do caminho da requisição.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_stream_handler: Optional[logging.Handler] = None
+_sampling_filter: Optional[SamplingFilter] = None
+
+
+def setup_logging(
+    level: str = settings.LOG_LEVEL,
+    log_format: str = settings.LOG_FORMAT,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = settings.LOG_QUEUE_SIZE
+):
+    """Configura o logger raiz da aplicação: fila em memória e escrita em thread de fundo"""
+    global _listener, _queue_handler, _stream_handler, _sampling_filter
+
+    with _lock:
+        if _listener is not None:
+            return
+
+        root = logging.getLogger(ROOT_LOGGER)
+        if _stream_handler is not None:
+            # Reconfiguração após shutdown_logging(): substitui a escrita direta
+            root.removeHandler(_stream_handler)
+
+        fmt, datefmt = convert_log_format(log_format)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter(fmt, datefmt=datefmt, style="{"))
+        _stream_handler = stream_handler
+
+        log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        _sampling_filter = SamplingFilter(sample_rates if sample_rates is not None else settings.LOG_SAMPLE_RATES)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(_sampling_filter)
+
+        root.setLevel(level.upper())
+        root.addHandler(_queue_handler)
+        # Não repassa ao logger raiz do Python (evita saída duplicada com o uvicorn)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Esvazia a fila e encerra a thread de escrita
+
+    Registros posteriores (ex.: no encerramento do processo) são escritos diretamente,
+    em vez de ficarem numa fila que ninguém mais consome.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            root = logging.getLogger(ROOT_LOGGER)
+            root.removeHandler(_queue_handler)
+            _listener.stop()
+            _listener = None
+            _stream_handler.addFilter(_sampling_filter)
+            root.addHandler(_stream_handler)
+
+
+def get_logger(category: str) -> logging.Logger:
+    """Logger da categoria (ex.: "rag", "llm.prompt"); a configuração é feita na primeira chamada"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Registros descartados por fila cheia ou por amostragem"""
+    return {
+        'queue_size': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped': _queue_handler.dropped if _queue_handler else 0,
+        'sampled_out': _sampling_filter.sampled_out if _sampling_filter else 0
+    }
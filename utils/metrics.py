@@ -0,0 +1,219 @@
+import bisect
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from utils.logger import get_logger
+
+logger = get_logger("metrics")
+
+# Limites (segundos) adequados do embedding em milissegundos até a geração do 70B
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NAME_PATTERN = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Contador monotônico com rótulos"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Histograma cumulativo com rótulos (formato Prometheus)"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        # rótulos -> (contagem por bucket, soma, total)
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total_sum, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total_sum}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Trace:
+    """Spans de uma requisição (nome, início relativo e duração, em segundos)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, started: float, duration: float):
+        # list.append é atômico: spans podem chegar de threads do pool de recuperação
+        self.spans.append((name, started - self.started, duration))
+
+    def totals(self) -> Dict[str, float]:
+        """Duração acumulada por nome de span"""
+        totals: Dict[str, float] = {}
+        for name, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def server_timing(self) -> str:
+        """Valor do cabeçalho Server-Timing (durações em ms)"""
+        return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in self.totals().items())
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+
+class MetricsRegistry:
+    """Métricas do processo: histogramas, contadores e coletores das estatísticas existentes"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+        self.span_seconds = self.histogram(
+            "chat_span_duration_seconds", "Duração de cada etapa da requisição", ("span",)
+        )
+        self.request_seconds = self.histogram(
+            "http_request_duration_seconds", "Duração das requisições HTTP", ("method", "path", "status")
+        )
+        self.events = self.counter(
+            "chat_events_total", "Eventos do caminho de requisição (cache, erros, fallbacks)", ("event",)
+        )
+
+    def histogram(self, name: str, documentation: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, label_names, buckets)
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, documentation, label_names)
+            return self._metrics[name]
+
+    def register_collector(self, prefix: str, collect: Callable[[], Dict[str, Any]]):
+        """Expõe como gauges os valores numéricos de um get_stats() existente"""
+        self._collectors[prefix] = collect
+
+    def unregister_collector(self, prefix: str):
+        self._collectors.pop(prefix, None)
+
+    @staticmethod
+    def _flatten(prefix: str, stats: Dict[str, Any]) -> List[Tuple[str, float]]:
+        values = []
+        for key, value in stats.items():
+            name = _NAME_PATTERN.sub("_", f"{prefix}_{key}").lower()
+            if isinstance(value, (bool, int, float)):
+                values.append((name, float(value)))
+            elif isinstance(value, dict):
+                values.extend(MetricsRegistry._flatten(name, value))
+        return values
+
+    def render_prometheus(self) -> str:
+        """Todas as métricas no formato texto do Prometheus"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        for prefix, collect in collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning("Falha ao coletar métricas de %s: %s", prefix, e)
+                continue
+            for name, value in self._flatten(prefix, stats):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Instância global das métricas
+metrics = MetricsRegistry()
+
+
+def start_trace() -> Trace:
+    """Inicia o trace da requisição atual (propagado às tarefas e ao pool de recuperação)"""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str):
+    """Mede uma etapa: alimenta o histograma e o trace da requisição, se houver"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        metrics.span_seconds.observe(duration, span=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, started, duration)
+
+
+def record_event(event: str, amount: float = 1.0):
+    """Incrementa o contador de eventos (ex.: answer_cache_hit, llm_error, fallback)"""
+    metrics.events.inc(amount, event=event)
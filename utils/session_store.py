@@ -0,0 +1,355 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Tuple
+from config.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger("sessions")
+
+ROLES = ("user", "assistant")
+
+
+class SessionHistory:
+    """Buffer circular de mensagens de uma sessão: (papel, texto), limitado em turnos e bytes"""
+
+    __slots__ = ("messages", "size_bytes", "last_access")
+
+    def __init__(self, max_messages: int):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.size_bytes = 0
+        self.last_access = time.time()
+
+    @staticmethod
+    def message_bytes(message: Tuple[int, str]) -> int:
+        return len(message[1].encode("utf-8"))
+
+    def append(self, message: Tuple[int, str], max_bytes: int):
+        if len(self.messages) == self.messages.maxlen:
+            self.size_bytes -= self.message_bytes(self.messages[0])
+        self.messages.append(message)
+        self.size_bytes += self.message_bytes(message)
+
+        # Descarta os turnos mais antigos até caber no limite de bytes (mantém a última mensagem)
+        while self.size_bytes > max_bytes and len(self.messages) > 1:
+            self.size_bytes -= self.message_bytes(self.messages.popleft())
+
+
+class SessionStore:
+    """Histórico de conversação por session_id
+
+    Cada sessão é um buffer circular compacto. Sessões ociosas expiram por TTL e, acima do
+    limite global de memória, as menos usadas são removidas (ou descarregadas em SQLite).
+    As gravações no SQLite ficam com uma thread própria, fora do event loop; sessões ainda
+    na fila de gravação são restauradas direto da memória. Os IDs gravados ficam num índice
+    em memória: sessões novas nunca consultam o disco, e a leitura de uma sessão descarregada
+    acontece fora do lock.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = settings.SESSION_MAX_TURNS,
+        max_bytes_per_session: int = settings.SESSION_MAX_BYTES,
+        idle_ttl: Optional[float] = settings.SESSION_IDLE_TTL,
+        max_total_bytes: int = settings.SESSION_STORE_MAX_BYTES,
+        spill_dir: Optional[str] = settings.SESSION_SPILL_DIR
+    ):
+        self.max_messages = max(1, max_turns) * 2
+        self.max_bytes_per_session = max_bytes_per_session
+        self.idle_ttl = idle_ttl
+        self.max_total_bytes = max_total_bytes
+        # Ordem de acesso: primeiras entradas são as menos usadas recentemente
+        self._sessions: "OrderedDict[str, SessionHistory]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._disk = None
+        # Operações de disco em ordem (spill/delete/delete_all) e sessões ainda não gravadas
+        self._disk_ops: deque = deque()
+        self._pending_spills: Dict[str, tuple] = {}
+        # Sessões gravadas no disco: session_id -> last_access
+        self._spilled: Dict[str, float] = {}
+        self._read_lock = threading.Lock()
+        self._disk_wakeup = threading.Condition(self._lock)
+        self._writer: Optional[threading.Thread] = None
+
+        self.expirations = 0
+        self.evictions = 0
+        self.spills = 0
+        self.restores = 0
+        self.disk_errors = 0
+
+        if spill_dir:
+            self._open_disk_tier(spill_dir)
+
+    def _open_disk_tier(self, spill_dir: str):
+        """Abre (ou cria) o arquivo SQLite que recebe as sessões removidas da memória"""
+        os.makedirs(spill_dir, exist_ok=True)
+        path = os.path.join(spill_dir, "sessions.sqlite")
+        writer = sqlite3.connect(path, check_same_thread=False)
+        # WAL: leituras de restauração não esperam as gravações da thread de escrita
+        writer.execute("PRAGMA journal_mode=WAL")
+        writer.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, messages TEXT, last_access REAL)"
+        )
+        writer.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON sessions (last_access)")
+        writer.commit()
+        self._prune_disk(writer)
+        self._spilled = dict(writer.execute("SELECT session_id, last_access FROM sessions"))
+
+        # Conexão de leitura (restauração); a de escrita pertence à thread
+        self._disk = sqlite3.connect(path, check_same_thread=False)
+        self._writer = threading.Thread(target=self._write_loop, args=(writer,), name="session-spill", daemon=True)
+        self._writer.start()
+
+    def _is_idle(self, last_access: float, now: float) -> bool:
+        return self.idle_ttl is not None and now - last_access > self.idle_ttl
+
+    def add_turn(self, session_id: str, user_message: str, assistant_message: str):
+        """Registra um turno (pergunta e resposta) na sessão"""
+        now = time.time()
+        row = self._read_spilled(session_id)
+        with self._lock:
+            self._expire_idle(now)
+            session = self._get_or_restore(session_id, now, create=True, row=row)
+            self._total_bytes -= session.size_bytes
+            session.append((0, user_message), self.max_bytes_per_session)
+            session.append((1, assistant_message), self.max_bytes_per_session)
+            self._total_bytes += session.size_bytes
+            self._enforce_memory_cap()
+
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        """Mensagens da sessão no formato {"role", "content"}"""
+        now = time.time()
+        row = self._read_spilled(session_id)
+        with self._lock:
+            self._expire_idle(now)
+            session = self._get_or_restore(session_id, now, create=False, row=row)
+            if session is None:
+                return []
+            history = [{"role": ROLES[role], "content": content} for role, content in session.messages]
+            # Uma sessão restaurada do disco pode ultrapassar o limite global
+            self._enforce_memory_cap()
+            return history
+
+    def clear(self, session_id: Optional[str] = None):
+        """Limpa uma sessão ou, sem session_id, todas"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                self._total_bytes = 0
+                if self._disk is not None:
+                    self._pending_spills.clear()
+                    self._spilled.clear()
+                    self._enqueue_disk_op(("delete_all",))
+                return
+
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_bytes -= session.size_bytes
+            if self._disk is not None:
+                self._pending_spills.pop(session_id, None)
+                self._spilled.pop(session_id, None)
+                self._enqueue_disk_op(("delete", session_id))
+
+    def _get_or_restore(
+        self, session_id: str, now: float, create: bool, row: Optional[tuple] = None
+    ) -> Optional[SessionHistory]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._restore(session_id, now, row)
+            if session is None:
+                if not create:
+                    return None
+                session = SessionHistory(self.max_messages)
+            self._sessions[session_id] = session
+            self._total_bytes += session.size_bytes
+
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _expire_idle(self, now: float):
+        """Remove sessões ociosas a partir das menos usadas (para na primeira ainda ativa)"""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if not self._is_idle(session.last_access, now):
+                return
+            del self._sessions[session_id]
+            self._total_bytes -= session.size_bytes
+            self.expirations += 1
+
+    def _enforce_memory_cap(self):
+        """Remove (ou descarrega em disco) as sessões menos usadas acima do limite global"""
+        while self._total_bytes > self.max_total_bytes and len(self._sessions) > 1:
+            session_id, session = self._sessions.popitem(last=False)
+            self._total_bytes -= session.size_bytes
+            self.evictions += 1
+            if self._disk is not None:
+                self._spill(session_id, session)
+
+    def _enqueue_disk_op(self, op: tuple):
+        """Agenda uma operação para a thread de escrita (chamado com _lock adquirido)"""
+        self._disk_ops.append(op)
+        self._disk_wakeup.notify()
+
+    def _spill(self, session_id: str, session: SessionHistory):
+        op = ("spill", session_id, session, list(session.messages), session.last_access)
+        self._pending_spills[session_id] = op
+        self._enqueue_disk_op(op)
+        self.spills += 1
+
+    def _write_loop(self, writer: sqlite3.Connection):
+        """Thread de escrita: aplica as operações pendentes em lote, um commit por lote"""
+        written = 0
+        while True:
+            with self._lock:
+                while not self._disk_ops:
+                    self._disk_wakeup.wait()
+                ops = list(self._disk_ops)
+                self._disk_ops.clear()
+
+            try:
+                for op in ops:
+                    if op[0] == "spill":
+                        _, session_id, _, messages, last_access = op
+                        writer.execute(
+                            "INSERT OR REPLACE INTO sessions (session_id, messages, last_access) VALUES (?, ?, ?)",
+                            (session_id, json.dumps(messages, ensure_ascii=False), last_access)
+                        )
+                        written += 1
+                    elif op[0] == "delete":
+                        writer.execute("DELETE FROM sessions WHERE session_id = ?", (op[1],))
+                    else:
+                        writer.execute("DELETE FROM sessions")
+                writer.commit()
+                failed = False
+            except Exception as e:
+                # Uma falha não derruba a thread: o lote é descartado e as próximas operações seguem
+                failed = True
+                logger.error("Falha ao gravar %d operações de sessão: %s", len(ops), e)
+                try:
+                    writer.rollback()
+                except sqlite3.Error:
+                    pass
+
+            if written >= 1000:
+                written = 0
+                try:
+                    self._prune_disk(writer)
+                except sqlite3.Error as e:
+                    logger.error("Falha ao limpar sessões expiradas do disco: %s", e)
+
+            with self._lock:
+                if failed:
+                    self.disk_errors += 1
+                for op in ops:
+                    if op[0] == "spill":
+                        # Gravadas: a restauração passa a ler do disco (a menos que já tenham voltado à memória)
+                        if self._pending_spills.get(op[1]) is op:
+                            del self._pending_spills[op[1]]
+                            if not failed:
+                                self._spilled[op[1]] = op[4]
+                    elif op[0] == "delete" and not failed:
+                        self._spilled.pop(op[1], None)
+                self._disk_wakeup.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Aguarda a thread de escrita esvaziar a fila (ex.: no desligamento)"""
+        if self._writer is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._disk_ops or self._pending_spills:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._disk_wakeup.wait(remaining)
+        return True
+
+    def _read_spilled(self, session_id: str) -> Optional[tuple]:
+        """Lê do disco, fora do _lock, uma sessão que só existe lá; None sem consulta nos demais casos"""
+        with self._lock:
+            if (
+                session_id not in self._spilled
+                or session_id in self._sessions
+                or session_id in self._pending_spills
+            ):
+                return None
+        with self._read_lock:
+            return self._disk.execute(
+                "SELECT messages, last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+
+    def _restore(self, session_id: str, now: float, row: Optional[tuple] = None) -> Optional[SessionHistory]:
+        """Traz de volta para a memória uma sessão descarregada em disco"""
+        if self._disk is None:
+            return None
+
+        pending = self._pending_spills.pop(session_id, None)
+        if pending is not None:
+            # Ainda na fila de gravação: volta direto, e a linha gravada depois é removida
+            self._enqueue_disk_op(("delete", session_id))
+            session = pending[2]
+            if self._is_idle(session.last_access, now):
+                return None
+            self.restores += 1
+            return session
+
+        last_access = self._spilled.pop(session_id, None)
+        if last_access is None:
+            return None
+
+        self._enqueue_disk_op(("delete", session_id))
+        if self._is_idle(last_access, now):
+            return None
+        if row is None:
+            # Gravada entre a leitura sem lock e agora (raro): lê aqui mesmo
+            with self._read_lock:
+                row = self._disk.execute(
+                    "SELECT messages, last_access FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            if row is None:
+                return None
+
+        session = SessionHistory(self.max_messages)
+        for role, content in json.loads(row[0]):
+            session.append((role, content), self.max_bytes_per_session)
+        self.restores += 1
+        return session
+
+    def _prune_disk(self, writer: sqlite3.Connection):
+        """Remove sessões ociosas da camada em disco"""
+        if self.idle_ttl is not None:
+            cutoff = time.time() - self.idle_ttl
+            writer.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+            writer.commit()
+            with self._lock:
+                for session_id in [sid for sid, last_access in self._spilled.items() if last_access < cutoff]:
+                    del self._spilled[session_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna ocupação e contadores de expiração/remoção"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'total_bytes': self._total_bytes,
+                'max_total_bytes': self.max_total_bytes,
+                'max_turns': self.max_messages // 2,
+                'idle_ttl': self.idle_ttl,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'spills': self.spills,
+                'restores': self.restores,
+                'spilled_sessions': len(self._spilled),
+                'pending_disk_ops': len(self._disk_ops),
+                'disk_errors': self.disk_errors,
+                'disk_enabled': self._disk is not None
+            }
+
+
+# Instância global do histórico de sessões
+session_store = SessionStore()
@@ -0,0 +1,47 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Compartilha uma única execução entre chamadas concorrentes com a mesma chave"""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.total_calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Executa factory() ou aguarda a execução em andamento; retorna (resultado, compartilhado)"""
+        self.total_calls += 1
+        task = self._in_flight.get(key)
+        shared = task is not None
+
+        if shared:
+            self.coalesced += 1
+        else:
+            # Tarefa independente: o cancelamento de quem a iniciou não afeta os demais
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+            self.executions += 1
+
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Marca a exceção como observada mesmo se todos os interessados desistiram
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna contadores e a taxa de coalescência"""
+        return {
+            'total_calls': self.total_calls,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'coalescing_ratio': self.coalesced / self.total_calls if self.total_calls else 0.0,
+            'in_flight': len(self._in_flight)
+        }